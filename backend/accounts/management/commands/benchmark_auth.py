@@ -0,0 +1,35 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from config.authentication.benchmark import AuthBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark token verification and request authentication against a local "
+        "JWKS stub and seeded users, under cold-cache, warm-cache and key-rotation scenarios."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Timed calls per scenario.')
+        parser.add_argument('--users', type=int, default=100,
+                            help='Users seeded for the run (and deleted afterwards).')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['users'] < 1:
+            raise CommandError('iterations and users must be positive.')
+
+        report = AuthBenchmark(iterations=options['iterations'], users=options['users']).run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('config'))
+        for key, value in report.pop('config').items():
+            self.stdout.write(f"  {key}: {value}")
+        for target, scenarios in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(target))
+            for scenario, summary in scenarios.items():
+                row = ', '.join(f"{key}={value}" for key, value in summary.items())
+                self.stdout.write(f"  {scenario:<9} {row}")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="identity_provider_id",
+            field=models.CharField(blank=True, max_length=200, null=True, unique=True),
+        ),
+    ]
@@ -50,7 +50,7 @@ class User(AbstractUser, TimeStampedUUIDModel):
     email = models.EmailField(_('email address'), unique=True)
     is_email_verified = models.BooleanField(default=False)
     is_signed_up = models.BooleanField(default=False)
-    identity_provider_id = models.CharField(max_length=200, blank=True, null=True)
+    identity_provider_id = models.CharField(max_length=200, blank=True, null=True, unique=True)
     profile_image_url = models.URLField(blank=True, null=True)
 
     USERNAME_FIELD = 'email'
@@ -1,11 +1,31 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from accounts.models import Profile
+from config import settings
+from config.authentication.user_cache import invalidate_user
 
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_identity_provider_id(sender, instance, **kwargs):
+    # The cache is keyed by identity provider id; a changed id must drop the old entry too
+    instance._previous_identity_provider_id = (
+        sender.objects.filter(pk=instance.pk).values_list("identity_provider_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.identity_provider_id)
+    previous = getattr(instance, "_previous_identity_provider_id", None)
+    if previous != instance.identity_provider_id:
+        invalidate_user(previous)
@@ -1,13 +1,16 @@
+import time
 import traceback
 from urllib.parse import urlparse
 
-from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.authentication import get_authorization_header
 
 from config.authentication.auth_backend import verify_better_auth_token
+from config.authentication.token_cache import verified_token_cache
+from config.authentication.user_cache import get_user_by_identity_provider_id
+from config.metrics import observe, record
 
 
 class JWTAuthenticationMiddleware(BaseAuthentication):
@@ -43,16 +46,23 @@ class JWTAuthenticationMiddleware(BaseAuthentication):
                 )
                 raise exceptions.AuthenticationFailed(msg)
 
-            payload = verify_better_auth_token(auth[1])
+            payload = verified_token_cache.get(auth[1])
+            record("auth_token_cache_total", {"outcome": "miss" if payload is None else "hit"})
+            if payload is None:
+                started = time.perf_counter()
+                payload = verify_better_auth_token(auth[1])
+                observe(
+                    "auth_verify_duration_seconds",
+                    time.perf_counter() - started,
+                    {"result": "error" if "error" in payload else "ok"},
+                )
 
-            if "error" in payload:
-                raise Exception(payload["error"])
+                if "error" in payload:
+                    raise Exception(payload["error"])
 
-            user = (
-                get_user_model()
-                .objects.filter(identity_provider_id=payload["sub"])
-                .first()
-            )
+                verified_token_cache.set(auth[1], payload)
+
+            user = get_user_by_identity_provider_id(payload["sub"])
             return user, None
 
         except Exception:
@@ -1,6 +1,10 @@
+import threading
+import time
+
 import jwt
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
 import requests
+from requests.adapters import HTTPAdapter
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
 from jwt.utils import base64url_decode
 
@@ -14,32 +18,125 @@ RHOBOTS_AUTH_SIGNUP_URL = f"{RHOBOTS_AUTH_EP}/api/auth/sign-up/email"
 RHOBOTS_AUTH_SIGNIN_URL = f"{RHOBOTS_AUTH_EP}/api/auth/sign-in/email"
 RHOBOTS_AUTH_AUDIENCE = 'http://localhost:10000'
 
+# JWKS cache configuration
+RHOBOTS_AUTH_JWKS_TTL = settings.RHOBOTS_AUTH_JWKS_TTL
+RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL = settings.RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL
+RHOBOTS_AUTH_HTTP_TIMEOUT = settings.RHOBOTS_AUTH_HTTP_TIMEOUT
+
+# One pooled HTTP session shared by every request to the auth service
+_http_session = requests.Session()
+_http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2))
+_http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2))
+
+
 def get_jwks():
-    response = requests.get(RHOBOTS_AUTH_JWKS_URL)
+    response = _http_session.get(RHOBOTS_AUTH_JWKS_URL, timeout=RHOBOTS_AUTH_HTTP_TIMEOUT)
     response.raise_for_status()
     return response.json()
 
-def get_signing_key(jwks, token):
+
+def build_public_keys(jwks):
+    """Parse a JWKS document into a ``{kid: Ed25519PublicKey}`` mapping."""
+    keys = {}
+    for key in jwks.get("keys", []):
+        if key.get("kty") == "OKP" and key.get("crv") == "Ed25519":  # EdDSA key
+            x = base64url_decode(key["x"])
+            keys[key["kid"]] = Ed25519PublicKey.from_public_bytes(x)
+        else:
+            # Remember the kid so the token gets a precise error instead of a refetch
+            keys[key["kid"]] = InvalidTokenError(f"Unsupported key type: {key['kty']}/{key.get('crv')}")
+    return keys
+
+
+class JWKSCache:
+    """
+    Process-wide cache of parsed JWKS signing keys.
+
+    Keys are served from memory for ``ttl`` seconds. Once stale they keep being
+    served while a single background thread refreshes them, so a slow auth
+    service never sits on the request path. An unknown ``kid`` triggers one
+    synchronous refetch shared by all waiting threads, rate-limited by
+    ``min_refresh_interval``.
+    """
+
+    def __init__(self, fetch=get_jwks, ttl=RHOBOTS_AUTH_JWKS_TTL,
+                 min_refresh_interval=RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._background_lock = threading.Lock()
+
+    def _refresh(self):
+        keys = build_public_keys(self.fetch())
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        return keys
+
+    def _background_refresh(self):
+        try:
+            with self._lock:
+                self._refresh()
+        except Exception:
+            # Keep serving the stale keys, the next lookup will try again
+            pass
+        finally:
+            self._background_lock.release()
+
+    def _refresh_if_stale(self):
+        if time.monotonic() - self._fetched_at < self.ttl:
+            return
+        if not self._background_lock.acquire(blocking=False):
+            return  # A refresh is already in flight
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def get_key(self, kid):
+        if not self._keys:
+            # Cold start: nothing to serve, fetch inline once for all callers
+            with self._lock:
+                if not self._keys:
+                    self._refresh()
+        else:
+            self._refresh_if_stale()
+
+        key = self._keys.get(kid)
+        if key is None:
+            fetched_at = self._fetched_at
+            with self._lock:
+                # Another thread may have refetched while we were waiting
+                if self._fetched_at == fetched_at and \
+                        time.monotonic() - self._fetched_at >= self.min_refresh_interval:
+                    self._refresh()
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise InvalidTokenError("No matching key found in JWKS")
+        if isinstance(key, InvalidTokenError):
+            raise key
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = 0.0
+
+
+jwks_cache = JWKSCache()
+
+
+def get_signing_key(token):
     unverified_header = jwt.get_unverified_header(token)
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            if key["kty"] == "OKP" and key["crv"] == "Ed25519":  # EdDSA key
-                x = base64url_decode(key["x"])
-                return Ed25519PublicKey.from_public_bytes(x)
-            else:
-                raise InvalidTokenError(f"Unsupported key type: {key['kty']}/{key.get('crv')}")
-    raise InvalidTokenError("No matching key found in JWKS")
+    return jwks_cache.get_key(unverified_header.get("kid"))
 
 
 def verify_better_auth_token(token):
     try:
-        # 1. Get JWKS
-        jwks = get_jwks()
-
-        # 2. Get the appropriate signing key
-        signing_key = get_signing_key(jwks, token)
+        # 1. Get the appropriate signing key from the cached JWKS
+        signing_key = get_signing_key(token)
 
-        # 3. Verify the token
+        # 2. Verify the token
         payload = jwt.decode(
             token,
             key=signing_key,
@@ -62,4 +159,4 @@ def verify_better_auth_token(token):
     except InvalidTokenError as e:
         return {"error": f"Invalid token: {str(e)}"}
     except Exception as e:
-        return {"error": f"Verification failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Verification failed: {str(e)}"}
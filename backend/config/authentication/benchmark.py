@@ -0,0 +1,261 @@
+"""
+Microbenchmark of the request authentication path.
+
+A local HTTP server stands in for the auth service's JWKS endpoint, serving
+Ed25519 test keys that can be rotated, and tokens are minted for a table of
+seeded users. ``verify_better_auth_token`` and
+``JWTAuthenticationMiddleware.authenticate`` are timed call by call under
+cold-cache, warm-cache and key-rotation scenarios.
+
+Run it with ``python manage.py benchmark_auth``.
+"""
+
+import json
+import statistics
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.contrib.auth import get_user_model
+from jwt.utils import base64url_encode
+from rest_framework.test import APIRequestFactory
+
+from config.authentication import JWTAuthenticationMiddleware
+from config.authentication import auth_backend
+from config.authentication.auth_backend import jwks_cache, verify_better_auth_token
+from config.authentication.token_cache import verified_token_cache
+from config.authentication.user_cache import invalidate_user
+
+JWKS_PATH = "/api/auth/jwks"
+SEEDED_USER_DOMAIN = "auth-benchmark.local"
+TOKEN_LIFETIME = 3600
+
+
+class SigningKey:
+    """An Ed25519 test key pair and its JWK."""
+
+    def __init__(self):
+        self.kid = uuid.uuid4().hex
+        self.private_key = Ed25519PrivateKey.generate()
+        public = self.private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        self.jwk = {"kty": "OKP", "crv": "Ed25519", "alg": "EdDSA", "kid": self.kid,
+                    "x": base64url_encode(public).decode()}
+
+    def mint(self, subject, lifetime=TOKEN_LIFETIME):
+        now = int(time.time())
+        payload = {
+            "sub": subject,
+            "iat": now,
+            "exp": now + lifetime,
+            "aud": auth_backend.RHOBOTS_AUTH_AUDIENCE,
+            "iss": auth_backend.RHOBOTS_AUTH_ISSUER,
+        }
+        return jwt.encode(payload, self.private_key, algorithm="EdDSA", headers={"kid": self.kid})
+
+
+class JWKSStub:
+    """
+    Serves a JWKS document like the auth service. ``rotate()`` publishes a new
+    signing key and keeps the previous one for a grace period of one rotation.
+    """
+
+    def __init__(self):
+        self.keys = [SigningKey()]
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def signing_key(self):
+        return self.keys[-1]
+
+    @property
+    def jwks_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{JWKS_PATH}"
+
+    def rotate(self):
+        with self._lock:
+            self.keys = [self.keys[-1], SigningKey()]
+        return self.signing_key
+
+    def document(self):
+        with self._lock:
+            self.requests += 1
+            return {"keys": [key.jwk for key in self.keys]}
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, as the pooled client session expects
+
+            def do_GET(self):
+                if self.path != JWKS_PATH:
+                    self.send_error(404)
+                    return
+                body = json.dumps(stub.document()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="jwks-stub", daemon=True).start()
+        return self.jwks_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def seed_users(count):
+    """Create ``count`` users with identity provider ids; returns the ids."""
+    batch = uuid.uuid4().hex[:8]
+    users = [
+        get_user_model()(
+            email=f"{batch}-{index}@{SEEDED_USER_DOMAIN}",
+            identity_provider_id=f"benchmark-{batch}-{index}",
+        )
+        for index in range(count)
+    ]
+    get_user_model().objects.bulk_create(users)
+    return [user.identity_provider_id for user in users]
+
+
+def delete_seeded_users(identity_provider_ids):
+    for identity_provider_id in identity_provider_ids:
+        invalidate_user(identity_provider_id)
+    get_user_model().objects.filter(identity_provider_id__in=identity_provider_ids).delete()
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles (ms) of timed calls."""
+    ordered = sorted(latencies)
+
+    def pick(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 3)
+
+    return {
+        "calls": len(ordered),
+        "errors": errors,
+        # Calls per second of time spent in the measured call, excluding scenario setup
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pick(0.5),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class AuthBenchmark:
+    """
+    Times ``verify_better_auth_token`` and ``JWTAuthenticationMiddleware.authenticate``.
+
+    Scenarios, each measured ``iterations`` times:
+    - cold: every cache is emptied before each call, so the call fetches the
+      JWKS, verifies the signature and (authenticate) loads the user
+    - warm: keys, verified tokens and users are cached, as for a client's
+      repeated requests
+    - rotation: before each call the auth service publishes a new key and
+      the token is signed with it, so the call refetches the JWKS for the
+      unknown ``kid``
+    """
+
+    def __init__(self, iterations=1000, users=100):
+        self.iterations = iterations
+        self.users = users
+        self.stub = JWKSStub()
+        self.factory = APIRequestFactory()
+        self.authentication = JWTAuthenticationMiddleware()
+
+    def _clear_caches(self, subjects=()):
+        jwks_cache.clear()
+        verified_token_cache.clear()
+        for subject in subjects:
+            invalidate_user(subject)
+
+    def _rotate(self):
+        key = self.stub.rotate()
+        # As if the current keys had been fetched long enough ago for an unknown kid to refetch them
+        jwks_cache._fetched_at -= jwks_cache.min_refresh_interval
+        return key
+
+    def _verify(self, token):
+        payload = verify_better_auth_token(token)
+        return "error" not in payload
+
+    def _authenticate(self, token):
+        request = self.factory.get("/api/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.authentication.authenticate(request) is not None
+
+    def _measure(self, call, prepare):
+        """Time ``call(token)`` for each token ``prepare(index)`` returns; setup is not timed."""
+        latencies, errors = [], 0
+        for index in range(self.iterations):
+            token = prepare(index)
+            started = time.perf_counter()
+            ok = call(token)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+        return summarize(latencies, errors, sum(latencies))
+
+    def _scenarios(self, subjects):
+        tokens = [self.stub.signing_key.mint(subject) for subject in subjects]
+
+        def cold(index):
+            token = tokens[index % len(tokens)]
+            self._clear_caches([subjects[index % len(subjects)]])
+            return token
+
+        def warm(index):
+            return tokens[index % len(tokens)]
+
+        def rotated(index):
+            key = self._rotate()
+            return key.mint(subjects[index % len(subjects)])
+
+        results = {}
+        for name, call in (("verify_better_auth_token", self._verify),
+                           ("JWTAuthenticationMiddleware.authenticate", self._authenticate)):
+            self._clear_caches(subjects)
+            results[name] = {"cold": self._measure(call, cold)}
+
+            # Prime every cache once before the warm run
+            for token in tokens:
+                call(token)
+            results[name]["warm"] = self._measure(call, warm)
+
+            results[name]["rotation"] = self._measure(call, rotated)
+            tokens = [self.stub.signing_key.mint(subject) for subject in subjects]
+        return results
+
+    def run(self):
+        original_url = auth_backend.RHOBOTS_AUTH_JWKS_URL
+        auth_backend.RHOBOTS_AUTH_JWKS_URL = self.stub.start()
+        subjects = seed_users(self.users)
+        try:
+            results = self._scenarios(subjects)
+        finally:
+            delete_seeded_users(subjects)
+            self._clear_caches()
+            auth_backend.RHOBOTS_AUTH_JWKS_URL = original_url
+            self.stub.stop()
+        return {
+            "config": {
+                "iterations": self.iterations,
+                "users": self.users,
+                "jwks_fetches": self.stub.requests,
+                "token_cache_size": verified_token_cache.max_size,
+            },
+            **results,
+        }
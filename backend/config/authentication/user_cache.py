@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from config import settings
+from config.metrics import record
+
+USER_CACHE_KEY_PREFIX = "auth_user"
+
+
+def _cache_key(identity_provider_id):
+    return f"{USER_CACHE_KEY_PREFIX}:{identity_provider_id}"
+
+
+def get_user_by_identity_provider_id(identity_provider_id):
+    """Resolve the user for a token subject, served from cache when possible."""
+    key = _cache_key(identity_provider_id)
+    user = cache.get(key)
+    if user is not None:
+        record("auth_user_cache_total", {"outcome": "hit"})
+        return user
+    record("auth_user_cache_total", {"outcome": "miss"})
+
+    user = (
+        get_user_model()
+        .objects.filter(identity_provider_id=identity_provider_id)
+        .first()
+    )
+    if user is not None:
+        cache.set(key, user, settings.RHOBOTS_AUTH_USER_CACHE_TTL)
+    return user
+
+
+def invalidate_user(identity_provider_id):
+    if identity_provider_id:
+        cache.delete(_cache_key(identity_provider_id))
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -17,6 +18,21 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def reset_db_connection_pools(**kwargs):
+    """Drop database pools inherited from the parent process after a fork.
+
+    The inherited pool's sockets belong to the parent, so they are forgotten
+    rather than closed; the child opens its own pool on first use.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        pools = getattr(type(connections[alias]), '_connection_pools', None)
+        if pools:
+            pools.pop(alias, None)
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -0,0 +1,322 @@
+import bisect
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = getattr(settings, "METRICS_SAMPLE_RATE", 0.0)
+REDIS_URL = getattr(settings, "METRICS_REDIS_URL", "redis://redis:6379/1")
+FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+REDIS_KEY = "metrics:series"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help); histograms are stored as their _bucket/_sum/_count series
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Request latency by route, method and status."),
+    "http_db_queries_total": ("counter", "Database queries executed by sampled requests, by route."),
+    "http_db_query_seconds_total": ("counter", "Time spent in database queries by sampled requests, by route."),
+    "auth_token_cache_total": ("counter", "Verified token cache lookups by outcome."),
+    "auth_user_cache_total": ("counter", "Authenticated user cache lookups by outcome."),
+    "auth_verify_duration_seconds": ("histogram", "JWT signature verification time by result."),
+    "automation_step_duration_seconds": ("histogram", "Automation step duration by plan, step, type and outcome."),
+}
+
+# Set for the duration of a sampled request; instrumentation outside requests is not recorded
+_sampled = contextvars.ContextVar("metrics_sampled", default=False)
+# Query count and time of the sampled request; context variables follow it into
+# the threads sync_to_async runs its database work on
+_queries = contextvars.ContextVar("metrics_queries", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def _format_value(value):
+    # Full precision: counters past ~1e6 must not round (as :g does) or rate() goes flat
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def parse_series(series):
+    """Split a series key back into its metric name and (unescaped) labels."""
+    if "{" not in series:
+        return series, {}
+    name, rendered = series[:-1].split("{", 1)
+    labels = {}
+    position = 0
+    while position < len(rendered):
+        equals = rendered.index('="', position)
+        key, position = rendered[position:equals], equals + 2
+        value = []
+        while rendered[position] != '"':
+            if rendered[position] == "\\":
+                position += 1
+                value.append("\n" if rendered[position] == "n" else rendered[position])
+            else:
+                value.append(rendered[position])
+            position += 1
+        labels[key] = "".join(value)
+        position += 2  # Closing quote and comma
+    return name, labels
+
+
+def _count_queries(execute, sql, params, many, context):
+    queries = _queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries["count"] += 1
+        queries["seconds"] += time.perf_counter() - started
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    # Once per connection wrapper; it survives reconnects
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+connection_created.connect(_install_query_counter)
+
+
+class MetricsRegistry:
+    """
+    Process-local counters flushed into a Redis hash shared by every process.
+
+    Recording only touches an in-memory dict; a background thread adds the
+    accumulated deltas to Redis every ``flush_interval`` seconds, so the
+    metrics endpoint of any process reports totals for all of them. Without a
+    ``redis_url`` totals are kept in this process only.
+    """
+
+    def __init__(self, redis_url=REDIS_URL, flush_interval=FLUSH_INTERVAL):
+        self.redis_url = redis_url
+        self.flush_interval = flush_interval
+        self._deltas = defaultdict(float)
+        self._local_totals = defaultdict(float)
+        self._lock = threading.Lock()
+        self._redis = None
+        self._thread = None
+        self._pid = None
+
+    def inc(self, name, labels=None, value=1):
+        series = _series(name, labels)
+        with self._lock:
+            self._deltas[series] += value
+        self._ensure_flusher()
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        labels = labels or {}
+        # Cumulative buckets: the observation counts towards every bucket >= value
+        first = bisect.bisect_left(buckets, value)
+        series = [_series(f"{name}_bucket", {**labels, "le": le}) for le in buckets[first:]]
+        series.append(_series(f"{name}_bucket", {**labels, "le": "+Inf"}))
+        with self._lock:
+            for bucket in series:
+                self._deltas[bucket] += 1
+            self._deltas[_series(f"{name}_sum", labels)] += value
+            self._deltas[_series(f"{name}_count", labels)] += 1
+        self._ensure_flusher()
+
+    def _get_redis(self):
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    def _ensure_flusher(self):
+        # Restart after a fork: threads don't survive it
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._redis = None
+            self._thread = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Add the deltas recorded since the last flush to the shared totals."""
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(float)
+        if not deltas:
+            return
+        if not self.redis_url:
+            with self._lock:
+                for series, delta in deltas.items():
+                    self._local_totals[series] += delta
+            return
+        try:
+            pipe = self._get_redis().pipeline(transaction=False)
+            for series, delta in deltas.items():
+                pipe.hincrbyfloat(REDIS_KEY, series, delta)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to flush {len(deltas)} metric series: {str(e)}")
+
+    def totals(self):
+        """Current totals of every series across processes."""
+        self.flush()
+        if not self.redis_url:
+            with self._lock:
+                return dict(self._local_totals)
+        return {series: float(value) for series, value in self._get_redis().hgetall(REDIS_KEY).items()}
+
+    def render(self):
+        """All shared series in the Prometheus text exposition format."""
+        totals = self.totals()
+
+        by_metric = defaultdict(list)
+        for series, value in totals.items():
+            name = series.split("{", 1)[0]
+            for suffix in ("_bucket", "_sum", "_count"):
+                base = name[: -len(suffix)]
+                if name.endswith(suffix) and METRICS.get(base, ("",))[0] == "histogram":
+                    name = base
+                    break
+            by_metric[name].append((series, value))
+
+        lines = [
+            "# HELP metrics_sample_rate Fraction of requests instrumented by this process.",
+            "# TYPE metrics_sample_rate gauge",
+            f"metrics_sample_rate {SAMPLE_RATE}",
+        ]
+        for name in sorted(by_metric):
+            metric_type, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for series, value in sorted(by_metric[name], key=_bucket_order):
+                lines.append(f"{series} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._deltas.clear()
+            self._local_totals.clear()
+        if self.redis_url:
+            self._get_redis().delete(REDIS_KEY)
+
+
+def _bucket_order(item):
+    # Keep buckets in ascending le order within each label set
+    series = item[0]
+    if 'le="' not in series:
+        return (series, 0.0)
+    head, le = series.rsplit('le="', 1)
+    le = le.split('"', 1)[0]
+    return (head, float("inf") if le == "+Inf" else float(le))
+
+
+metrics = MetricsRegistry()
+
+
+def is_sampled():
+    return _sampled.get()
+
+
+def record(name, labels=None, value=1):
+    """Increment a counter when the current request is sampled."""
+    if _sampled.get():
+        metrics.inc(name, labels, value)
+
+
+def observe(name, value, labels=None):
+    """Record a histogram observation when the current request is sampled."""
+    if _sampled.get():
+        metrics.observe(name, value, labels)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, status and database query count/time per route for a
+    METRICS_SAMPLE_RATE fraction of requests. With sampling off the
+    middleware only compares one float per request. Runs natively on both
+    the sync and async request paths, so it adds no thread hop under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = SAMPLE_RATE
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _should_sample(self):
+        return self.sample_rate and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._should_sample():
+            return self.get_response(request)
+
+        queries = {"count": 0, "seconds": 0.0}
+        sampled, counted = _sampled.set(True), _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _sampled.reset(sampled)
+            _queries.reset(counted)
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not self._should_sample():
+            return await self.get_response(request)
+
+        queries = {"count": 0, "seconds": 0.0}
+        sampled, counted = _sampled.set(True), _queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sampled.reset(sampled)
+            _queries.reset(counted)
+        # Streaming responses are timed to their headers
+        self._record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def _record(request, response, elapsed, queries):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        metrics.observe(
+            "http_request_duration_seconds",
+            elapsed,
+            {"route": route, "method": request.method, "status": response.status_code},
+        )
+        if queries["count"]:
+            metrics.inc("http_db_queries_total", {"route": route}, queries["count"])
+            metrics.inc("http_db_query_seconds_total", {"route": route}, queries["seconds"])
@@ -1,6 +1,21 @@
+import hmac
+
+from django.conf import settings
 from rest_framework import permissions
+from rest_framework.authentication import get_authorization_header
 
 
 class IsSelf(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.id == request.user.id
+
+
+class HasMetricsToken(permissions.BasePermission):
+    """Allows requests bearing METRICS_TOKEN; denies everything while it is unset."""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        auth = get_authorization_header(request).split()
+        if not token or len(auth) != 2 or auth[0].lower() != b"bearer":
+            return False
+        return hmac.compare_digest(auth[1], token.encode())
@@ -1,6 +1,26 @@
+import json
+
 from rest_framework import renderers
 
 
+def format_sse(data=None, event: str = None, id=None, retry: int = None, comment: str = None) -> str:
+    """Encode one Server-Sent Events message; non-string data is sent as JSON."""
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if id is not None:
+        lines.append(f'id: {id}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if retry is not None:
+        lines.append(f'retry: {retry}')
+    if data is not None:
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
 class SSERenderer(renderers.BaseRenderer):
     media_type = 'text/event-stream'
     format = 'sse'
@@ -8,4 +28,7 @@ class SSERenderer(renderers.BaseRenderer):
     render_style = 'binary'
 
     def render(self, data, media_type=None, renderer_context=None):
-        return data
+        # Streams are returned as-is; error responses become a single "error" event
+        if data is None or isinstance(data, (bytes, str)):
+            return data
+        return format_sse(data, event='error').encode()
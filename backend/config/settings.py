@@ -29,10 +29,23 @@ env = environ.Env(
     CSRF_TRUSTED_ORIGINS=(list, []),
     HOST_NAME=str,
     RHOBOTS_AUTH_EP=str,
+    RHOBOTS_AUTH_JWKS_TTL=(int, 300),
+    RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL=(int, 30),
+    RHOBOTS_AUTH_HTTP_TIMEOUT=(float, 5.0),
+    RHOBOTS_AUTH_TOKEN_CACHE_SIZE=(int, 1024),
+    RHOBOTS_AUTH_USER_CACHE_TTL=(int, 60),
     DB_HOST=str,
     DB_USER=str,
     DB_PASSWORD=str,
     DB_NAME=str,
+    DB_POOL=(bool, True),
+    DB_POOL_MIN_SIZE=(int, 2),
+    DB_POOL_MAX_SIZE=(int, 10),
+    DB_POOL_TIMEOUT=(float, 10.0),
+    DB_CONN_MAX_AGE=(int, 60),
+    METRICS_SAMPLE_RATE=(float, 0.0),
+    METRICS_REDIS_URL=(str, 'redis://redis:6379/1'),
+    METRICS_TOKEN=(str, ''),
     AWS_S3_ENDPOINT_URL=str,
     AWS_S3_PUBLIC_ENDPOINT_URL=str,
     AWS_ACCESS_KEY_ID=str,
@@ -41,7 +54,11 @@ env = environ.Env(
     AWS_S3_REGION_NAME=str,
     CELERY_RESULT_BACKEND=str,
     CELERY_CACHE_BACKEND=str,
-    CELERY_BROKER_URL=str
+    CELERY_BROKER_URL=str,
+    CACHE_REDIS_URL=(str, 'redis://redis:6379/2'),
+    AUTOMATION_ENGINE=(str, 'sync'),
+    AUTOMATION_LIVE_VIEW=(bool, False),
+    AUTOMATION_TRACE=(bool, False)
 )
 environ.Env.read_env(os.path.join(BASE_DIR, '.env'))
 
@@ -67,6 +84,24 @@ HOST_NAME = env('HOST_NAME')
 
 RHOBOTS_AUTH_EP = env('RHOBOTS_AUTH_EP')
 
+# Seconds the parsed JWKS is served before a background refresh
+RHOBOTS_AUTH_JWKS_TTL = env('RHOBOTS_AUTH_JWKS_TTL')
+# Minimum seconds between refetches triggered by an unknown `kid`
+RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL = env('RHOBOTS_AUTH_JWKS_MIN_REFRESH_INTERVAL')
+RHOBOTS_AUTH_HTTP_TIMEOUT = env('RHOBOTS_AUTH_HTTP_TIMEOUT')
+# Number of verified token payloads kept in memory, 0 disables the cache
+RHOBOTS_AUTH_TOKEN_CACHE_SIZE = env('RHOBOTS_AUTH_TOKEN_CACHE_SIZE')
+# Seconds an authenticated user is cached by token subject
+RHOBOTS_AUTH_USER_CACHE_TTL = env('RHOBOTS_AUTH_USER_CACHE_TTL')
+
+# Request metrics: fraction of requests instrumented (0 disables), aggregated in Redis
+# across processes and served at /api/metrics/
+METRICS_SAMPLE_RATE = env('METRICS_SAMPLE_RATE')
+METRICS_REDIS_URL = env('METRICS_REDIS_URL')
+METRICS_FLUSH_INTERVAL = 5
+# Bearer token Prometheus presents to /api/metrics/; the endpoint is disabled while unset
+METRICS_TOKEN = env('METRICS_TOKEN')
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -93,6 +128,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -132,10 +168,28 @@ DATABASES = {
         'NAME': env('DB_NAME'),
         'HOST': env('DB_HOST'),
         'USER': env('DB_USER'),
-        'PASSWORD': env('DB_PASSWORD')
+        'PASSWORD': env('DB_PASSWORD'),
+        # Validate connections before reuse so a restarted Postgres doesn't surface as request errors
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Server-side pooling through psycopg_pool: one pool per process, shared by every thread.
+# Pooling replaces persistent connections, so CONN_MAX_AGE only applies with DB_POOL off.
+if env('DB_POOL'):
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env('DB_POOL_MIN_SIZE'),
+            'max_size': env('DB_POOL_MAX_SIZE'),
+            # Seconds a request waits for a free connection before failing
+            'timeout': env('DB_POOL_TIMEOUT'),
+            'max_idle': 300,
+            'max_lifetime': 1800,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env('DB_CONN_MAX_AGE')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -321,6 +375,23 @@ CELERY_RESULT_EXTENDED = True
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_RESULT_EXPIRES = 2592000
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Paused automations can run for hours; keep unacked (acks_late) tasks from being
+# redelivered to another worker while still running
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 6 * 60 * 60}
+
+# =====================================
+# CACHE
+# =====================================
+
+# Shared by every daphne and celery process, so cached users and learned
+# selectors are invalidated everywhere at once
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env('CACHE_REDIS_URL'),
+    }
+}
 
 # =====================================
 # CHANNELS CONFIGURATION FOR WEBSOCKETS
@@ -341,4 +412,60 @@ CHANNEL_LAYERS = {
 
 # Interactive Browser Automation Settings
 PLAYWRIGHT_BROWSER_CDP_ENDPOINT = 'http://playwright-vnc:9222'
-PLAYWRIGHT_VNC_URL = 'ws://localhost:7900'
\ No newline at end of file
+PLAYWRIGHT_VNC_URL = 'ws://localhost:7900'
+PLAYWRIGHT_CONNECT_TIMEOUT = 30000  # ms
+# Warm pages kept open per pooled browser connection
+PLAYWRIGHT_POOL_IDLE_PAGES = 2
+# Seconds between background CDP health probes
+PLAYWRIGHT_HEALTH_PROBE_INTERVAL = 10
+# CDP screencast of each session's page over the automation WebSocket, a per-session
+# alternative to the VNC display stream
+AUTOMATION_LIVE_VIEW = env('AUTOMATION_LIVE_VIEW')
+AUTOMATION_LIVE_VIEW_MAX_FPS = 10
+AUTOMATION_LIVE_VIEW_MAX_WIDTH = 1280
+AUTOMATION_LIVE_VIEW_MAX_HEIGHT = 800
+# Playwright trace (screenshots and DOM snapshots) of each session, streamed to object
+# storage when the session ends; traces of long runs reach hundreds of MB
+AUTOMATION_TRACE = env('AUTOMATION_TRACE')
+
+# Automation scheduler
+# 'sync' runs sessions on worker threads, 'async' runs them as coroutines on one event loop,
+# 'celery' queues them as tasks for dedicated automation workers
+AUTOMATION_ENGINE = env('AUTOMATION_ENGINE')
+# Browsers reachable over CDP, by name. Celery routes each session to the
+# `automation.<name>` queue, consumed only by workers bound to that browser.
+AUTOMATION_BROWSERS = {
+    'default': PLAYWRIGHT_BROWSER_CDP_ENDPOINT,
+}
+# Worker threads running automations, each owning one pooled browser connection
+AUTOMATION_WORKERS = 4
+# Sessions allowed to wait for a worker before starts are rejected with 429
+AUTOMATION_QUEUE_SIZE = 50
+# Queued plus running sessions allowed per user
+AUTOMATION_PER_USER_LIMIT = 3
+# Celery deliveries of one session's task (redeliveries after a lost worker included)
+# before the session is marked errored
+AUTOMATION_TASK_MAX_DELIVERIES = 3
+# Seconds a paused session waits for Resume before it is ended with an error, freeing
+# its worker; a plan's pause step may set its own "timeout" (ms)
+AUTOMATION_PAUSE_TIMEOUT = 1800
+# Concurrent sessions on the async engine's event loop
+AUTOMATION_ASYNC_MAX_SESSIONS = 100
+# Seconds status updates are buffered before being flushed to the channel layer
+AUTOMATION_STATUS_FLUSH_INTERVAL = 0.05
+# Seconds a learned fallback selector is remembered per site and plan step
+AUTOMATION_SELECTOR_CACHE_TTL = 86400
+
+# Shared automation session state: 'redis' across processes, 'local' for tests
+AUTOMATION_STATE_BACKEND = 'redis'
+AUTOMATION_STATE_REDIS_URL = 'redis://redis:6379/1'
+# Seconds a finished session's state stays available to status lookups
+AUTOMATION_STATE_TTL = 86400
+# Recent status events kept per session for clients that reconnect
+AUTOMATION_STATUS_REPLAY_SIZE = 200
+# Seconds between keep-alive comments on idle status event streams
+AUTOMATION_SSE_HEARTBEAT_INTERVAL = 15
+# Seconds an SSE status stream stays open before it is closed and the client reconnects
+AUTOMATION_SSE_MAX_LIFETIME = 3600
+# Seconds a session ticket (?ticket= on SSE and WebSocket URLs) stays valid
+AUTOMATION_SESSION_TICKET_TTL = 60
\ No newline at end of file
@@ -18,13 +18,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from core.views.health import HealthCheckView
+from core.views.health import HealthCheckView, DatabasePoolView
+from core.views.metrics import MetricsView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/health/", HealthCheckView.as_view(), name="health-check"),
+    path("api/health/db/", DatabasePoolView.as_view(), name="health-db-pool"),
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
 
     path('api/', include('accounts.urls')),
     path("api/core/", include("core.urls")),
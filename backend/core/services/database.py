@@ -0,0 +1,14 @@
+from django.db import connections
+
+
+def get_db_pool_stats() -> dict:
+    """Connection pool statistics per database alias, or None where pooling is off.
+
+    Counters are psycopg_pool's (pool_size, pool_available, requests_waiting,
+    requests_wait_ms, connections_lost, ...) and cover this process only.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        stats[alias] = pool.get_stats() if pool is not None else None
+    return stats
@@ -1,3 +1,47 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from config.metrics import MetricsRegistry, parse_series
+
+
+class MetricsRenderingTests(SimpleTestCase):
+
+    def setUp(self):
+        # Without a Redis URL the totals stay in this registry
+        self.metrics = MetricsRegistry(redis_url=None)
+
+    def rendered(self):
+        return {
+            line.rsplit(" ", 1)[0]: line.rsplit(" ", 1)[1]
+            for line in self.metrics.render().splitlines()
+            if not line.startswith("#")
+        }
+
+    def test_large_counters_keep_every_digit(self):
+        self.metrics.inc("http_db_queries_total", {"route": "api/"}, 1234567)
+        self.metrics.inc("http_db_queries_total", {"route": "api/"}, 1)
+
+        self.assertEqual(self.rendered()['http_db_queries_total{route="api/"}'], "1234568")
+
+    def test_fractional_values_keep_full_precision(self):
+        self.metrics.inc("http_db_query_seconds_total", {"route": "api/"}, 1234567.125)
+
+        self.assertEqual(self.rendered()['http_db_query_seconds_total{route="api/"}'], "1234567.125")
+
+    def test_histogram_buckets_are_cumulative_and_ordered(self):
+        self.metrics.observe("auth_verify_duration_seconds", 0.02, {"result": "ok"}, buckets=(0.01, 0.05, 0.1))
+
+        lines = [line for line in self.metrics.render().splitlines() if line.startswith("auth_verify")]
+        self.assertEqual(lines, [
+            'auth_verify_duration_seconds_bucket{le="0.05",result="ok"} 1',
+            'auth_verify_duration_seconds_bucket{le="0.1",result="ok"} 1',
+            'auth_verify_duration_seconds_bucket{le="+Inf",result="ok"} 1',
+            'auth_verify_duration_seconds_count{result="ok"} 1',
+            'auth_verify_duration_seconds_sum{result="ok"} 0.02',
+        ])
+
+    def test_label_values_are_escaped_and_parsed_back(self):
+        labels = {"route": 'a"b\\c\nd', "method": "GET"}
+        self.metrics.inc("http_db_queries_total", labels)
+
+        [series] = [s for s in self.metrics.totals() if s.startswith("http_db_queries_total")]
+        self.assertEqual(parse_series(series), ("http_db_queries_total", labels))
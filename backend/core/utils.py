@@ -1,11 +1,191 @@
+import io
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Optional, Sequence, Tuple, Union
 from uuid import uuid4
 from mimetypes import guess_extension
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_PART_CONCURRENCY = 4
+
+_s3_client = None
+_s3_settings = None
+_s3_lock = threading.Lock()
+_upload_executor = None
+
+
+def _int_from_env(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    if raw:
+        try:
+            return int(raw)
+        except ValueError:
+            pass
+    return default
+
+
+def _load_s3_settings() -> dict:
+    settings = {
+        "endpoint_url": os.environ.get("AWS_S3_ENDPOINT_URL"),
+        "access_key": os.environ.get("AWS_ACCESS_KEY_ID"),
+        "secret_key": os.environ.get("AWS_SECRET_ACCESS_KEY"),
+        "bucket_name": os.environ.get("AWS_STORAGE_BUCKET_NAME"),
+        "region_name": os.environ.get("AWS_REGION"),
+        "public_base": (os.environ.get("AWS_S3_PUBLIC_ENDPOINT_URL") or "").rstrip("/"),
+        "presign_expires": _int_from_env("AWS_S3_PRESIGN_EXPIRES", 604800),  # 7 days
+    }
+    if not all([settings["endpoint_url"], settings["access_key"], settings["secret_key"], settings["bucket_name"]]):
+        raise ValueError(
+            "Missing MinIO configuration. Ensure MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, and MINIO_BUCKET are set."
+        )
+    return settings
+
+
+def get_s3_client():
+    """Return the process-wide S3 client and its settings, creating them on first use.
+
+    boto3 clients are thread-safe, so every upload shares one client and its
+    connection pool. Tuning via environment variables:
+    - AWS_S3_MAX_POOL_CONNECTIONS (optional). Default: 50
+    - AWS_S3_MAX_ATTEMPTS (optional). Default: 5
+    """
+    global _s3_client, _s3_settings
+    if _s3_client is None:
+        with _s3_lock:
+            if _s3_client is None:
+                settings = _load_s3_settings()
+                _s3_client = boto3.client(
+                    "s3",
+                    endpoint_url=settings["endpoint_url"],
+                    aws_access_key_id=settings["access_key"],
+                    aws_secret_access_key=settings["secret_key"],
+                    region_name=settings["region_name"],
+                    config=Config(
+                        signature_version="s3v4",
+                        s3={"addressing_style": "path"},
+                        max_pool_connections=_int_from_env("AWS_S3_MAX_POOL_CONNECTIONS", 50),
+                        tcp_keepalive=True,
+                        connect_timeout=5,
+                        read_timeout=60,
+                        retries={"max_attempts": _int_from_env("AWS_S3_MAX_ATTEMPTS", 5), "mode": "standard"},
+                    ),
+                )
+                _s3_settings = settings
+    return _s3_client, _s3_settings
+
+
+def _infer_extension_from_content_type(ct: str) -> str:
+    # Handle common cases explicitly
+    if ct == "image/jpeg":
+        return ".jpg"
+    inferred = guess_extension(ct) or ""
+    if inferred == ".jpe":
+        return ".jpg"
+    if inferred:
+        return inferred
+    subtype = ct.split("/", 1)[-1]
+    return f".{subtype}" if subtype.isalnum() else ".bin"
+
+
+def _build_object_key(content_type: str, object_key: Optional[str], object_key_prefix: str) -> str:
+    ext = _infer_extension_from_content_type(content_type)
+
+    if object_key:
+        # Append extension if missing
+        if "." not in object_key.rsplit("/", 1)[-1]:
+            return f"{object_key}{ext}"
+        return object_key
+    return f"{object_key_prefix}{uuid4()}{ext}"
+
+
+class PresignedUrlCache:
+    """
+    Bounded LRU cache of presigned GET URLs per object key.
+
+    A URL is reused until ``refresh_margin`` of its lifetime is left, so callers
+    never receive a URL that is about to expire.
+    """
+
+    def __init__(self, max_size=10000, refresh_margin=0.1):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                reuse_until, url = entry
+                if reuse_until > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return url
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, url, expires_in):
+        if self.max_size <= 0:
+            return
+        reuse_until = time.monotonic() + expires_in * (1 - self.refresh_margin)
+        with self._lock:
+            self._entries[key] = (reuse_until, url)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+presigned_url_cache = PresignedUrlCache()
+
+
+def _object_url(s3_client, settings: dict, key: str) -> str:
+    # Build public URL if base provided, else presigned URL
+    if settings["public_base"]:
+        return f"{settings['public_base']}/{settings['bucket_name']}/{key}"
+
+    url = presigned_url_cache.get(key)
+    if url is None:
+        url = s3_client.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": settings["bucket_name"], "Key": key},
+            ExpiresIn=settings["presign_expires"],
+        )
+        presigned_url_cache.set(key, url, settings["presign_expires"])
+    return url
+
+
+def get_object_url(key: str) -> str:
+    """Return the public or presigned URL of an existing object; presigned URLs are cached."""
+    s3_client, settings = get_s3_client()
+    return _object_url(s3_client, settings, key)
+
 
 def upload_bytes_to_minio_and_get_url(
     data: bytes,
@@ -23,75 +203,123 @@ def upload_bytes_to_minio_and_get_url(
     - AWS_REGION (optional)
     - AWS_S3_PUBLIC_ENDPOINT_URL (optional). If not provided, a presigned URL is returned
     - AWS_S3_PRESIGN_EXPIRES (optional, seconds). Default: 604800 (7 days)
+
+    The configuration is read once per process, see get_s3_client.
     """
 
-    endpoint_url = os.environ.get("AWS_S3_ENDPOINT_URL")
-    access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-    secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-    bucket_name = os.environ.get("AWS_STORAGE_BUCKET_NAME")
-    region_name = os.environ.get("AWS_REGION")
-    public_base = os.environ.get("AWS_S3_PUBLIC_ENDPOINT_URL")
-    presign_expires_raw = os.environ.get("AWS_S3_PRESIGN_EXPIRES")
+    s3_client, settings = get_s3_client()
+    key = _build_object_key(content_type, object_key, object_key_prefix)
 
-    if not all([endpoint_url, access_key, secret_key, bucket_name]):
-        raise ValueError(
-            "Missing MinIO configuration. Ensure MINIO_ENDPOINT, MINIO_ACCESS_KEY, MINIO_SECRET_KEY, and MINIO_BUCKET are set."
-        )
+    s3_client.put_object(
+        Bucket=settings["bucket_name"],
+        Key=key,
+        Body=data,
+        ContentType=content_type,
+    )
 
-    presign_expires = 604800  # 7 days
-    if presign_expires_raw:
-        try:
-            presign_expires = int(presign_expires_raw)
-        except ValueError:
-            pass
+    return _object_url(s3_client, settings, key)
 
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=endpoint_url,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region_name,
-        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
-    )
 
-    # Determine file extension from content type
-    def _infer_extension_from_content_type(ct: str) -> str:
-        # Handle common cases explicitly
-        if ct == "image/jpeg":
-            return ".jpg"
-        inferred = guess_extension(ct) or ""
-        if inferred == ".jpe":
-            return ".jpg"
-        if inferred:
-            return inferred
-        subtype = ct.split("/", 1)[-1]
-        return f".{subtype}" if subtype.isalnum() else ".bin"
+class _IterableReader(io.RawIOBase):
+    """Read-only file object over an iterable of byte chunks."""
 
-    ext = _infer_extension_from_content_type(content_type)
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
 
-    if object_key:
-        # Append extension if missing
-        if "." not in object_key.rsplit("/", 1)[-1]:
-            key = f"{object_key}{ext}"
-        else:
-            key = object_key
-    else:
-        key = f"{object_key_prefix}{uuid4()}{ext}"
+    def readable(self) -> bool:
+        return True
 
-    s3_client.put_object(
-        Bucket=bucket_name,
-        Key=key,
-        Body=data,
-        ContentType=content_type,
-    )
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = bytes(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
 
-    # Build public URL if base provided, else presigned URL
-    public_base = public_base.rstrip("/") if public_base else ""
-    if public_base:
-        return f"{public_base}/{bucket_name}/{key}"
-
-    return s3_client.generate_presigned_url(
-        ClientMethod="get_object",
-        Params={"Bucket": bucket_name, "Key": key},
-        ExpiresIn=presign_expires,
+
+def upload_stream_to_minio_and_get_url(
+    source: Union[BinaryIO, Iterable[bytes]],
+    content_type: str,
+    object_key: Optional[str] = None,
+    object_key_prefix: str = "artifacts/",
+    part_size: int = DEFAULT_PART_SIZE,
+    max_concurrency: int = DEFAULT_PART_CONCURRENCY,
+) -> str:
+    """Stream a file-like object or an iterable of byte chunks to MinIO/S3 and return its URL.
+
+    Large sources are sent as a multipart upload of ``part_size`` byte parts,
+    up to ``max_concurrency`` parts at a time, so memory stays bounded by
+    roughly ``part_size * max_concurrency`` whatever the artifact size.
+    Sources smaller than one part are sent with a single request. Uses the same
+    configuration as upload_bytes_to_minio_and_get_url.
+    """
+
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes.")
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+
+    s3_client, settings = get_s3_client()
+    key = _build_object_key(content_type, object_key, object_key_prefix)
+
+    fileobj = source if hasattr(source, "read") else io.BufferedReader(_IterableReader(source), part_size)
+    transfer_config = TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+    )
+    # Parts buffered ahead of the uploading threads; s3transfer defaults to 10
+    transfer_config.max_in_memory_upload_chunks = max_concurrency
+    s3_client.upload_fileobj(
+        fileobj,
+        settings["bucket_name"],
+        key,
+        ExtraArgs={"ContentType": content_type},
+        Config=transfer_config,
     )
+
+    return _object_url(s3_client, settings, key)
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for batch uploads. Size: AWS_S3_UPLOAD_WORKERS (optional). Default: 8"""
+    global _upload_executor
+    if _upload_executor is None:
+        with _s3_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(
+                    max_workers=_int_from_env("AWS_S3_UPLOAD_WORKERS", 8),
+                    thread_name_prefix="s3-upload",
+                )
+    return _upload_executor
+
+
+def upload_many_to_minio_and_get_urls(
+    payloads: Sequence[Tuple],
+    object_key_prefix: str = "gpt-images/",
+) -> list:
+    """Upload many payloads concurrently and return their URLs in the same order.
+
+    Each payload is ``(data, content_type)`` or ``(data, content_type, object_key)``.
+    Uploads run on a bounded process-wide thread pool sharing the pooled S3
+    client; the first failed upload raises once every upload has finished.
+    """
+
+    get_s3_client()  # Fail fast on missing configuration
+
+    def _upload(payload):
+        data, content_type, *rest = payload
+        object_key = rest[0] if rest else None
+        return upload_bytes_to_minio_and_get_url(data, content_type, object_key, object_key_prefix)
+
+    futures = [_get_upload_executor().submit(_upload, payload) for payload in payloads]
+    errors = [f.exception() for f in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [f.result() for f in futures]
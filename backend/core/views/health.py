@@ -1,9 +1,19 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+
+from core.services.database import get_db_pool_stats
 
 class HealthCheckView(APIView):
     permission_classes = [AllowAny]  # No authentication required
 
     def get(self, request):
-        return Response({"status": "ok"})
\ No newline at end of file
+        return Response({"status": "ok"})
+
+
+class DatabasePoolView(APIView):
+    """Database connection pool size, usage and wait statistics for this process."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({"pools": get_db_pool_stats()})
\ No newline at end of file
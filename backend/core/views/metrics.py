@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from rest_framework.views import APIView
+
+from config.metrics import metrics
+from config.permissions import HasMetricsToken
+
+
+class MetricsView(APIView):
+    """Request, database and auth metrics of every process in Prometheus text format."""
+    permission_classes = [HasMetricsToken]  # Scraped by Prometheus with METRICS_TOKEN as bearer token
+    authentication_classes = []
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -16,6 +16,16 @@ elif [ "$1" = "dev" ]; then
 elif [ "$1" = "celery" ]; then
   echo "📦 Starting Celery worker..."
   exec celery -A config worker --loglevel=INFO
+elif [ "$1" = "automation" ]; then
+  # Threads keep one pooled browser connection each; prefetch 1 with acks_late
+  # so a lost worker's sessions are redelivered instead of piling up
+  echo "🤖 Starting automation worker for browser ${AUTOMATION_BROWSER:-default}..."
+  exec celery -A config worker --loglevel=INFO \
+    -Q "automation.${AUTOMATION_BROWSER:-default}" \
+    --pool=threads \
+    --concurrency="${AUTOMATION_WORKER_CONCURRENCY:-4}" \
+    --prefetch-multiplier=1 \
+    -n "automation-${AUTOMATION_BROWSER:-default}@%h"
 elif [ "$1" = "beat" ]; then
   echo "⏰ Starting Celery beat..."
   exec celery -A config beat --loglevel=INFO
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from system.models import AutomationPlan
+
+
+@admin.register(AutomationPlan)
+class AutomationPlanAdmin(admin.ModelAdmin):
+    list_display = ('name', 'description', 'updated_at')
+    search_fields = ('name', 'description')
+    ordering = ('name',)
@@ -0,0 +1,94 @@
+"""
+Automation session artifacts.
+
+Screenshots taken by plan steps are uploaded to object storage together when
+the session ends. With AUTOMATION_TRACE set, a Playwright trace of the session
+is saved to a temporary file and streamed up in parts, so its size is never
+held in memory. The session state keeps only the object keys; URLs are
+resolved when the state is read, so presigned URLs are reused from the
+core.utils cache instead of being signed again on every status poll.
+"""
+
+import json
+import logging
+import os
+import tempfile
+from django.conf import settings
+from core.utils import get_object_url, upload_many_to_minio_and_get_urls, upload_stream_to_minio_and_get_url
+from .consumers import update_session_state
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENABLED = getattr(settings, 'AUTOMATION_TRACE', False)
+TRACE_OPTIONS = {'screenshots': True, 'snapshots': True}
+
+
+def artifact_key(session_id: str, filename: str) -> str:
+    return f'automation/{session_id}/{filename}'
+
+
+def new_trace_path(session_id: str) -> str:
+    """Temporary file to save a session's trace to; upload_session_artifacts removes it."""
+    fd, path = tempfile.mkstemp(prefix=f'trace-{session_id}-', suffix='.zip')
+    os.close(fd)
+    return path
+
+
+def _upload_screenshots(session_id: str, screenshots: list[tuple[str, bytes]]) -> dict:
+    payloads = [(data, 'image/png', artifact_key(session_id, f'{name}.png')) for name, data in screenshots]
+    upload_many_to_minio_and_get_urls(payloads)
+    return {name: key for (name, _), (_, _, key) in zip(screenshots, payloads)}
+
+
+def _upload_trace(session_id: str, trace_path: str) -> str:
+    key = artifact_key(session_id, 'trace.zip')
+    try:
+        with open(trace_path, 'rb') as trace:
+            upload_stream_to_minio_and_get_url(trace, 'application/zip', object_key=key)
+    finally:
+        os.remove(trace_path)
+    return key
+
+
+def upload_session_artifacts(session_id: str, screenshots: list[tuple[str, bytes]], trace_path: str = None) -> dict:
+    """
+    Upload a session's (name, png) screenshots concurrently and its trace file,
+    then record their object keys in its state. Returns the recorded keys;
+    upload failures are logged, not raised, so they never fail the run.
+    """
+    artifacts = {}
+    if screenshots:
+        try:
+            artifacts['screenshots'] = _upload_screenshots(session_id, screenshots)
+        except Exception as e:
+            logger.warning(f"Failed to upload screenshots of {session_id}: {str(e)}")
+    if trace_path:
+        try:
+            artifacts['trace'] = _upload_trace(session_id, trace_path)
+        except Exception as e:
+            logger.warning(f"Failed to upload trace of {session_id}: {str(e)}")
+    if not artifacts:
+        return {}
+    try:
+        update_session_state(session_id, artifacts=json.dumps(artifacts))
+    except Exception as e:
+        logger.warning(f"Failed to record artifacts of {session_id}: {str(e)}")
+        return {}
+    return artifacts
+
+
+def artifact_urls(state: dict) -> dict:
+    """URLs of the artifacts recorded in a session state, or None."""
+    if not state.get('artifacts'):
+        return None
+    try:
+        artifacts = json.loads(state['artifacts'])
+        urls = {}
+        if 'screenshots' in artifacts:
+            urls['screenshots'] = {name: get_object_url(key) for name, key in artifacts['screenshots'].items()}
+        if 'trace' in artifacts:
+            urls['trace'] = get_object_url(artifacts['trace'])
+        return urls
+    except Exception as e:
+        logger.warning(f"Failed to resolve artifact URLs: {str(e)}")
+        return None
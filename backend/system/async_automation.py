@@ -0,0 +1,470 @@
+"""
+Asyncio-native browser automation engine using playwright.async_api.
+Runs many automation sessions as coroutines on one event loop that shares a
+single Playwright driver and CDP connection.
+"""
+
+import asyncio
+import os
+import threading
+import logging
+from collections import defaultdict
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .artifacts import TRACE_ENABLED, TRACE_OPTIONS, new_trace_path, upload_session_artifacts
+from .browser_pool import BROWSER_CDP_ENDPOINT, BROWSER_CONNECT_TIMEOUT, POOL_IDLE_PAGES, DEFAULT_VIEWPORT
+from .consumers import set_pause_flag, wait_for_resume_async, clear_session, update_session_state
+from .live_view import LIVE_VIEW_ENABLED, page_target_id_async
+from .plans import EXTRACT_SCRIPT, CompiledPlan, ExtractBatch, Step, StepFailed, get_compiled_plan
+from .scheduler import SchedulerFull, UserConcurrencyLimit
+from .selector_cache import resolve_selector_async
+from .status_emitter import StatusEmitter, send_session_error
+from .step_timing import StepSpan
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_SESSIONS = getattr(settings, 'AUTOMATION_ASYNC_MAX_SESSIONS', 100)
+AUTOMATION_PER_USER_LIMIT = getattr(settings, 'AUTOMATION_PER_USER_LIMIT', 3)
+
+
+class AsyncBrowserPool:
+    """
+    Shared Playwright driver and CDP connection for one event loop.
+
+    All sessions on the loop lease pages from the same connection; the
+    connection is health-checked on every lease and rebuilt if lost. Each
+    leased page lives in its own browser context, closed on release, so no
+    cookies, storage or auth state carry over from one session to the next.
+    """
+
+    def __init__(self, endpoint: str = BROWSER_CDP_ENDPOINT, idle_pages: int = POOL_IDLE_PAGES,
+                 connect_timeout: int = BROWSER_CONNECT_TIMEOUT):
+        self.endpoint = endpoint
+        self.idle_pages = idle_pages
+        self.connect_timeout = connect_timeout
+        self.playwright: Playwright = None
+        self.browser: Browser = None
+        self._idle: list[Page] = []  # Unused pages, each in its own fresh context
+        self._lock = asyncio.Lock()
+
+    def _is_healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    async def _connect(self):
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.connect_over_cdp(
+            self.endpoint,
+            timeout=self.connect_timeout
+        )
+        self._idle.clear()
+        logger.info(f"Opened shared async browser connection to {self.endpoint}")
+
+    async def ensure_connected(self):
+        if self._is_healthy():
+            return
+        async with self._lock:
+            if not self._is_healthy():
+                await self._connect()
+
+    async def _new_page(self) -> Page:
+        context = await self.browser.new_context(viewport=DEFAULT_VIEWPORT)
+        try:
+            return await context.new_page()
+        except Exception:
+            await context.close()
+            raise
+
+    async def _fill(self):
+        while len(self._idle) < self.idle_pages:
+            self._idle.append(await self._new_page())
+
+    async def warm(self):
+        await self.ensure_connected()
+        await self._fill()
+
+    async def lease_page(self) -> tuple[BrowserContext, Page]:
+        await self.ensure_connected()
+        while self._idle:
+            page = self._idle.pop()
+            if not page.is_closed():
+                return page.context, page
+        page = await self._new_page()
+        return page.context, page
+
+    async def release_page(self, page: Page):
+        if page is None:
+            return
+        try:
+            await page.context.close()
+        except Exception as e:
+            logger.debug(f"Error closing async pooled browser context: {str(e)}")
+        if not self._is_healthy():
+            return
+        try:
+            await self._fill()
+        except Exception as e:
+            logger.debug(f"Error refilling async idle pages: {str(e)}")
+
+    async def close(self):
+        try:
+            if self._is_healthy():
+                await self.browser.close()
+        finally:
+            self._idle.clear()
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+
+class AsyncAutomationEngine:
+    """
+    Coroutine counterpart of AutomationEngine.
+
+    Sessions never hold an OS thread: browser calls, status updates and
+    pause/resume waits are all awaited on the runner's event loop, and status
+    messages are buffered by a StatusEmitter instead of awaited one by one.
+    """
+
+    def __init__(self, session_id: str, pool: AsyncBrowserPool, plan: CompiledPlan):
+        self.session_id = session_id
+        self.pool = pool
+        self.plan = plan
+        self.extracted = {}
+        self.spans = []
+        # (name, png) pairs, uploaded together when the run ends
+        self.screenshots = []
+        self.tracing = False
+        self.channel_layer = get_channel_layer()
+        self.status_emitter = StatusEmitter(session_id, self.channel_layer)
+        self.browser: Browser = None
+        self.context: BrowserContext = None
+        self.page: Page = None
+
+    async def send_status(self, status: str, message: str, step_info: dict = None):
+        """Queue a status update for the WebSocket without waiting on the channel layer."""
+        self.status_emitter.emit(status, message, step_info)
+        logger.debug(f"Status queued for {self.session_id}: {status} - {message}")
+
+    async def wait_for_resume(self, timeout: float):
+        """Wait for user to resume automation; raises StepFailed after ``timeout`` seconds."""
+        logger.info(f"Automation paused for session: {self.session_id}")
+        if not await wait_for_resume_async(self.session_id, timeout=timeout):
+            raise StepFailed(f'Not resumed within {round(timeout / 60)} minutes; automation stopped.')
+        logger.info(f"Automation resumed for session: {self.session_id}")
+
+    async def connect_to_browser(self) -> bool:
+        """Lease a page from the shared browser connection."""
+        try:
+            await self.send_status('connecting', 'Connecting to browser...')
+            self.context, self.page = await self.pool.lease_page()
+            self.browser = self.context.browser
+            if TRACE_ENABLED:
+                await self.start_trace()
+            if LIVE_VIEW_ENABLED:
+                await self.publish_live_view_target()
+
+            await self.send_status('connected', 'Browser connected successfully.')
+            return True
+
+        except Exception as e:
+            error_msg = f"Failed to connect to browser: {str(e)}"
+            await self.send_status('error', error_msg)
+            logger.error(f"Browser connection failed for {self.session_id}: {error_msg}")
+            return False
+
+    async def start_trace(self):
+        """Record a Playwright trace of the leased context; the run goes on without one on failure."""
+        try:
+            await self.context.tracing.start(**TRACE_OPTIONS)
+            self.tracing = True
+        except Exception as e:
+            logger.warning(f"Trace unavailable for {self.session_id}: {str(e)}")
+
+    async def stop_trace(self):
+        """Save the trace to a temporary file and return its path, or None without a trace."""
+        if not self.tracing:
+            return None
+        self.tracing = False
+        path = new_trace_path(self.session_id)
+        try:
+            await self.context.tracing.stop(path=path)
+            return path
+        except Exception as e:
+            os.remove(path)
+            logger.warning(f"Failed to save trace for {self.session_id}: {str(e)}")
+            return None
+
+    async def publish_live_view_target(self):
+        """Record the page's CDP target so the WebSocket consumer can screencast it."""
+        try:
+            target_id = await page_target_id_async(self.context, self.page)
+            await asyncio.to_thread(
+                update_session_state, self.session_id, target_id=target_id, cdp_endpoint=self.pool.endpoint
+            )
+        except Exception as e:
+            logger.warning(f"Live view unavailable for {self.session_id}: {str(e)}")
+
+    async def disconnect_browser(self):
+        """Release the leased page, closing its browser context."""
+        try:
+            if self.page:
+                if LIVE_VIEW_ENABLED:
+                    # The page is closed with its context; stop pointing viewers at it
+                    await asyncio.to_thread(update_session_state, self.session_id, target_id=None, cdp_endpoint=None)
+                await self.pool.release_page(self.page)
+                self.page = None
+                await self.send_status('disconnected', 'Browser disconnected.')
+                logger.info(f"Browser released for session: {self.session_id}")
+        except Exception as e:
+            logger.error(f"Error disconnecting browser for {self.session_id}: {str(e)}")
+        finally:
+            # Deliver any buffered updates before the session ends
+            try:
+                await self.status_emitter.flush_async()
+            except Exception as e:
+                logger.error(f"Failed to flush status for {self.session_id}: {str(e)}")
+            # Clean up session data
+            await asyncio.to_thread(clear_session, self.session_id)
+
+    async def wait_for_element(self, step: Step, state: str = 'visible') -> bool:
+        """Wait until any of the step's candidate selectors reaches ``state``; False on timeout."""
+        candidates = [self.page.locator(selector).first for selector in step.selectors]
+        any_candidate = candidates[0]
+        for candidate in candidates[1:]:
+            any_candidate = any_candidate.or_(candidate)
+        try:
+            await any_candidate.first.wait_for(state=state, timeout=step.timeout)
+        except PlaywrightTimeoutError:
+            return False
+        return True
+
+    async def resolve_element(self, step: Step):
+        """
+        Wait until any of the step's candidate selectors is visible and return
+        (selector, locator) for the preferred visible one, or (None, None).
+        """
+        if not await self.wait_for_element(step):
+            return None, None
+        if len(step.selectors) == 1:
+            return step.selectors[0], self.page.locator(step.selectors[0]).first
+        # Learned selector first, then every candidate in as few round trips as possible
+        return await resolve_selector_async(self.page, step, self.plan.name)
+
+    async def run_step(self, step: Step, total: int):
+        """Execute one compiled plan step."""
+        info = step.info(total)
+
+        if step.type == 'navigate':
+            await self.send_status('running', step.message or f'Navigating to {step.url}...', info)
+            await self.page.goto(step.url, timeout=step.timeout)
+
+        elif step.type == 'wait':
+            if step.message:
+                await self.send_status('running', step.message, info)
+            if step.ms is not None:
+                await asyncio.sleep(step.ms / 1000)
+                return
+            if step.load_state:
+                try:
+                    await self.page.wait_for_load_state(step.load_state, timeout=step.timeout)
+                    return
+                except PlaywrightTimeoutError:
+                    message = f'Page did not reach "{step.load_state}" for step {step.index}'
+            elif await self.wait_for_element(step, step.state):
+                return
+            else:
+                message = f'Element did not become {step.state} for step {step.index}: {step.selectors[0]}'
+            if not step.optional:
+                raise StepFailed(message)
+            await self.send_status('warning', message, info)
+            return 'skipped'
+
+        elif step.type in ('click', 'fill'):
+            if step.message:
+                await self.send_status('running', step.message, info)
+            selector, element = await self.resolve_element(step)
+            if element is None:
+                message = f'Could not find element for step {step.index}: {step.selectors[0]}'
+                if not step.optional:
+                    raise StepFailed(message)
+                await self.send_status('warning', message, info)
+                return 'skipped'
+            if step.type == 'click':
+                await element.click(timeout=step.timeout)
+                await self.send_status('running', f'Clicked element using selector: {selector}', info)
+            else:
+                await element.fill(step.value, timeout=step.timeout)
+                await self.send_status('running', f'Filled element using selector: {selector}', info)
+
+        elif step.type == 'screenshot':
+            await self.send_status('running', step.message or f'Taking screenshot {step.name}...', info)
+            self.screenshots.append(
+                (step.name, await self.page.screenshot(full_page=step.full_page, timeout=step.timeout))
+            )
+
+        elif step.type == 'pause':
+            await self.send_status('paused', step.message or 'Automation paused. Click Resume to continue.', info)
+            await asyncio.to_thread(set_pause_flag, self.session_id, True)
+            await self.wait_for_resume(step.timeout / 1000)
+            await self.send_status('running', 'Resuming automation...', info)
+            return 'resumed'
+
+    async def run_extract_batch(self, batch: ExtractBatch, total: int):
+        """Resolve consecutive extract steps in a single page round trip."""
+        await self.send_status('running', f'Extracting {", ".join(s.name for s in batch.steps)}...',
+                               batch.info(total))
+        self.extracted.update(await self.page.evaluate(EXTRACT_SCRIPT, batch.script_args()))
+
+    async def run_operation(self, operation, total: int):
+        """Run one plan operation as a timed span and report the span in a running update."""
+        info = operation.info(total)
+        span = StepSpan(self.plan.name, operation.index, info['type'])
+        try:
+            if isinstance(operation, ExtractBatch):
+                await self.run_extract_batch(operation, total)
+                outcome = 'ok'
+            else:
+                outcome = await self.run_step(operation, total) or 'ok'
+        except Exception:
+            self.spans.append(span.finish('error'))
+            raise
+        self.spans.append(span.finish(outcome))
+        await self.send_status(
+            'running',
+            f"Step {operation.index} ({info['type']}) {outcome} in {self.spans[-1]['duration_ms']} ms",
+            {**info, 'span': self.spans[-1]}
+        )
+
+    async def upload_artifacts(self):
+        """Upload the screenshots and trace taken so far and record them in the session state."""
+        screenshots, self.screenshots = self.screenshots, []
+        trace_path = await self.stop_trace()
+        await asyncio.to_thread(upload_session_artifacts, self.session_id, screenshots, trace_path)
+
+    async def execute_automation_script(self):
+        """Execute the session's compiled step plan."""
+        try:
+            span = StepSpan(self.plan.name, 'connect', 'connect')
+            connected = await self.connect_to_browser()
+            self.spans.append(span.finish('ok' if connected else 'error'))
+            if not connected:
+                return
+
+            total = len(self.plan)
+            for operation in self.plan.operations:
+                await self.run_operation(operation, total)
+            await self.upload_artifacts()
+
+            # Final status, with every span of the run
+            result = {'plan': self.plan.name, 'spans': self.spans}
+            if self.extracted:
+                result['extracted'] = self.extracted
+            await self.send_status('completed', 'Automation completed successfully!', result)
+
+        except Exception as e:
+            # Screenshots taken before the failure help explain it
+            await self.upload_artifacts()
+            error_msg = f"Automation error: {str(e)}"
+            await self.send_status('error', error_msg, {'plan': self.plan.name, 'spans': self.spans})
+            logger.error(f"Automation failed for {self.session_id}: {error_msg}")
+
+        finally:
+            # Always disconnect
+            await self.disconnect_browser()
+
+
+class AsyncAutomationRunner:
+    """
+    Background event loop running AsyncAutomationEngine sessions.
+
+    Admission control matches AutomationScheduler: at most ``max_sessions``
+    concurrent sessions and ``per_user_limit`` per user, with the same
+    SchedulerFull/UserConcurrencyLimit errors for backpressure.
+    """
+
+    def __init__(self, max_sessions: int = ASYNC_MAX_SESSIONS, per_user_limit: int = AUTOMATION_PER_USER_LIMIT):
+        self.max_sessions = max_sessions
+        self.per_user_limit = per_user_limit
+        self.pool: AsyncBrowserPool = None
+        self._loop: asyncio.AbstractEventLoop = None
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._active_per_user = defaultdict(int)
+        self._completed = 0
+        self._rejected = 0
+
+    def _ensure_loop(self):
+        # Called with self._lock held
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='automation-async-loop', daemon=True)
+        self._thread.start()
+        self.pool = AsyncBrowserPool()
+        asyncio.run_coroutine_threadsafe(self._warm(), self._loop)
+
+    async def _warm(self):
+        try:
+            await self.pool.warm()
+        except Exception as e:
+            logger.warning(f"Failed to warm async browser connection: {str(e)}")
+
+    async def _run(self, session_id: str, user_key, plan_name: str = None, plan: CompiledPlan = None):
+        logger.info(f"Starting async automation for session: {session_id}")
+        try:
+            # Closes the thread's DB connection afterwards, returning it to the pool
+            if plan is None:
+                plan = await database_sync_to_async(get_compiled_plan)(plan_name)
+            engine = AsyncAutomationEngine(session_id, self.pool, plan)
+            await engine.execute_automation_script()
+        except Exception as e:
+            logger.error(f"Critical error in async automation for {session_id}: {str(e)}")
+            # Off the loop: it waits on the store and the channel layer
+            await asyncio.to_thread(send_session_error, session_id, f"Critical automation error: {str(e)}")
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                if user_key is not None:
+                    self._active_per_user[user_key] -= 1
+                    if self._active_per_user[user_key] <= 0:
+                        del self._active_per_user[user_key]
+        logger.info(f"Async automation completed for session: {session_id}")
+
+    def submit(self, session_id: str, user_key=None, plan_name: str = None, plan: CompiledPlan = None) -> int:
+        """Start a session on the event loop. Returns its queue position, always 0."""
+        with self._lock:
+            if user_key is not None and self.per_user_limit \
+                    and self._active_per_user[user_key] >= self.per_user_limit:
+                self._rejected += 1
+                raise UserConcurrencyLimit(
+                    f"At most {self.per_user_limit} automations may be active per user."
+                )
+            if self._active >= self.max_sessions:
+                self._rejected += 1
+                raise SchedulerFull(f"Async automation runner is full ({self.max_sessions} active).")
+            self._active += 1
+            if user_key is not None:
+                self._active_per_user[user_key] += 1
+            self._ensure_loop()
+        asyncio.run_coroutine_threadsafe(self._run(session_id, user_key, plan_name, plan), self._loop)
+        return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'engine': 'async',
+                'running': self._active,
+                'capacity': self.max_sessions,
+                'per_user_limit': self.per_user_limit,
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+
+async_automation_runner = AsyncAutomationRunner()
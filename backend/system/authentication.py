@@ -0,0 +1,48 @@
+"""
+Short-lived session tickets for clients that cannot send an Authorization header.
+Browsers' EventSource and WebSocket APIs only take a URL, so those clients first
+request a signed ticket for one automation session and pass it as ``?ticket=``.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication
+
+TICKET_SALT = 'system.session-ticket'
+TICKET_TTL = getattr(settings, 'AUTOMATION_SESSION_TICKET_TTL', 60)
+# Session of tickets for the multiplexed socket, which is not bound to one session;
+# session ids are word characters only, so it never names a real session
+MULTIPLEX_TICKET_SESSION = '*'
+
+
+def issue_session_ticket(user, session_id: str) -> str:
+    """Signed ticket letting ``user`` watch ``session_id`` for TICKET_TTL seconds."""
+    return signing.dumps({'user': str(user.pk), 'session': session_id}, salt=TICKET_SALT, compress=True)
+
+
+def read_session_ticket(ticket: str, session_id: str):
+    """User pk of a valid, unexpired ticket for ``session_id``; None otherwise."""
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_TTL)
+    except signing.BadSignature:  # Includes SignatureExpired
+        return None
+    if payload.get('session') != session_id:
+        return None
+    return payload.get('user')
+
+
+class SessionTicketAuthentication(BaseAuthentication):
+    """Authenticates ``?ticket=`` for the session named by the view's ``session_id`` kwarg."""
+
+    def authenticate(self, request):
+        ticket = request.query_params.get('ticket')
+        if not ticket:
+            return None
+        session_id = request.parser_context['kwargs'].get('session_id')
+        user_pk = read_session_ticket(ticket, session_id)
+        user = get_user_model().objects.filter(pk=user_pk).first() if user_pk else None
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed('Invalid or expired session ticket.')
+        return user, None
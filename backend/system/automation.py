@@ -3,19 +3,34 @@ Interactive Browser Automation Engine using Playwright.
 Provides live, interactive browser automation with VNC streaming.
 """
 
+import os
 import time
+import zlib
 import logging
-from datetime import datetime
-from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, Playwright
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from django.conf import settings
-from .consumers import get_pause_flag, set_pause_flag, clear_session
+from django.db import close_old_connections
+from playwright.sync_api import Browser, BrowserContext, Page
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from channels.layers import get_channel_layer
+from .artifacts import TRACE_ENABLED, TRACE_OPTIONS, new_trace_path, upload_session_artifacts
+from .async_automation import async_automation_runner
+from .browser_health import browser_health_prober
+from .browser_pool import BROWSER_CDP_ENDPOINT, get_browser_pool
+from .live_view import LIVE_VIEW_ENABLED, page_target_id
+from .consumers import set_pause_flag, wait_for_resume, clear_session, update_session_state
+from .plans import EXTRACT_SCRIPT, CompiledPlan, ExtractBatch, Step, StepFailed, get_compiled_plan
+from .scheduler import AutomationScheduler
+from .selector_cache import resolve_selector
+from .status_emitter import StatusEmitter, send_session_error
+from .step_timing import StepSpan
 
 logger = logging.getLogger(__name__)
 
-# Browser connection endpoint from settings
-BROWSER_CDP_ENDPOINT = getattr(settings, 'PLAYWRIGHT_BROWSER_CDP_ENDPOINT', 'http://playwright-vnc:9222')
+AUTOMATION_ENGINE = getattr(settings, 'AUTOMATION_ENGINE', 'sync')
+AUTOMATION_WORKERS = getattr(settings, 'AUTOMATION_WORKERS', 4)
+AUTOMATION_QUEUE_SIZE = getattr(settings, 'AUTOMATION_QUEUE_SIZE', 50)
+AUTOMATION_PER_USER_LIMIT = getattr(settings, 'AUTOMATION_PER_USER_LIMIT', 3)
+AUTOMATION_BROWSERS = getattr(settings, 'AUTOMATION_BROWSERS', {'default': BROWSER_CDP_ENDPOINT})
 
 
 class AutomationEngine:
@@ -23,63 +38,52 @@ class AutomationEngine:
     Core automation engine for interactive browser automation.
     
     Features:
-    - Playwright browser control via CDP
+    - Playwright browser control via pooled CDP connections
     - Real-time status updates via WebSocket
     - Interactive pause/resume functionality
+    - Declarative step plans compiled once and cached (see system.plans)
     - Error handling and recovery
     """
     
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, plan: CompiledPlan = None, endpoint: str = BROWSER_CDP_ENDPOINT):
         self.session_id = session_id
+        self.endpoint = endpoint
+        self.plan = plan or get_compiled_plan()
+        self.extracted = {}
+        self.spans = []
+        # (name, png) pairs, uploaded together when the run ends
+        self.screenshots = []
+        self.tracing = False
         self.channel_layer = get_channel_layer()
+        self.status_emitter = StatusEmitter(session_id, self.channel_layer)
         self.browser: Browser = None
         self.context: BrowserContext = None
         self.page: Page = None
         
     def send_status(self, status: str, message: str, step_info: dict = None):
-        """Send status update via WebSocket."""
-        try:
-            async_to_sync(self.channel_layer.group_send)(
-                f'automation_{self.session_id}',
-                {
-                    "type": "automation_status",
-                    "status": status,
-                    "message": message,
-                    "timestamp": datetime.now().isoformat(),
-                    "step_info": step_info
-                }
-            )
-            logger.info(f"Status sent to {self.session_id}: {status} - {message}")
-        except Exception as e:
-            logger.error(f"Failed to send status for {self.session_id}: {str(e)}")
+        """Queue a status update for the WebSocket without waiting on the channel layer."""
+        self.status_emitter.emit(status, message, step_info)
+        logger.debug(f"Status queued for {self.session_id}: {status} - {message}")
     
-    def wait_for_resume(self):
-        """Wait for user to resume automation."""
+    def wait_for_resume(self, timeout: float):
+        """Wait for user to resume automation; raises StepFailed after ``timeout`` seconds."""
         logger.info(f"Automation paused for session: {self.session_id}")
-        while get_pause_flag(self.session_id):
-            time.sleep(1)  # Check every second
+        # Woken by the resume notification
+        if not wait_for_resume(self.session_id, timeout=timeout):
+            raise StepFailed(f'Not resumed within {round(timeout / 60)} minutes; automation stopped.')
         logger.info(f"Automation resumed for session: {self.session_id}")
     
-    def connect_to_browser(self, playwright: Playwright) -> bool:
-        """Connect to the remote browser via CDP."""
+    def connect_to_browser(self) -> bool:
+        """Lease a page from the persistent browser connection pool."""
         try:
             self.send_status('connecting', 'Connecting to browser...')
-            # Connect to existing browser instance
-            self.browser = playwright.chromium.connect_over_cdp(
-                BROWSER_CDP_ENDPOINT,
-                timeout=30000
-            )
-
-            # Get or create context
-            if self.browser.contexts:
-                self.context = self.browser.contexts[0]
-            else:
-                self.context = self.browser.new_context(
-                    viewport={'width': 1920, 'height': 1080}
-                )
-
-            # Create new page
-            self.page = self.context.new_page()
+            pool = get_browser_pool(self.endpoint)
+            self.context, self.page = pool.lease_page()
+            self.browser = self.context.browser
+            if TRACE_ENABLED:
+                self.start_trace()
+            if LIVE_VIEW_ENABLED:
+                self.publish_live_view_target()
 
             self.send_status('connected', 'Browser connected successfully.')
             return True
@@ -90,88 +94,193 @@ class AutomationEngine:
             logger.error(f"Browser connection failed for {self.session_id}: {error_msg}")
             return False
     
+    def start_trace(self):
+        """Record a Playwright trace of the leased context; the run goes on without one on failure."""
+        try:
+            self.context.tracing.start(**TRACE_OPTIONS)
+            self.tracing = True
+        except Exception as e:
+            logger.warning(f"Trace unavailable for {self.session_id}: {str(e)}")
+
+    def stop_trace(self):
+        """Save the trace to a temporary file and return its path, or None without a trace."""
+        if not self.tracing:
+            return None
+        self.tracing = False
+        path = new_trace_path(self.session_id)
+        try:
+            self.context.tracing.stop(path=path)
+            return path
+        except Exception as e:
+            os.remove(path)
+            logger.warning(f"Failed to save trace for {self.session_id}: {str(e)}")
+            return None
+
+    def publish_live_view_target(self):
+        """Record the page's CDP target so the WebSocket consumer can screencast it."""
+        try:
+            target_id = page_target_id(self.context, self.page)
+            update_session_state(self.session_id, target_id=target_id, cdp_endpoint=self.endpoint)
+        except Exception as e:
+            logger.warning(f"Live view unavailable for {self.session_id}: {str(e)}")
+
     def disconnect_browser(self):
-        """Safely disconnect from browser."""
+        """Release the leased page, closing its browser context."""
         try:
-            if self.browser and self.browser.is_connected():
-                self.browser.close()
+            if self.page:
+                if LIVE_VIEW_ENABLED:
+                    # The page is closed with its context; stop pointing viewers at it
+                    update_session_state(self.session_id, target_id=None, cdp_endpoint=None)
+                get_browser_pool(self.endpoint).release_page(self.page)
+                self.page = None
                 self.send_status('disconnected', 'Browser disconnected.')
-                logger.info(f"Browser disconnected for session: {self.session_id}")
+                logger.info(f"Browser released for session: {self.session_id}")
         except Exception as e:
             logger.error(f"Error disconnecting browser for {self.session_id}: {str(e)}")
         finally:
+            # Deliver any buffered updates before the session ends
+            self.status_emitter.flush()
             # Clean up session data
             clear_session(self.session_id)
     
-    def execute_automation_script(self):
-        """Execute the main automation script."""
+    def wait_for_element(self, step: Step, state: str = 'visible') -> bool:
+        """Wait until any of the step's candidate selectors reaches ``state``; False on timeout."""
+        candidates = [self.page.locator(selector).first for selector in step.selectors]
+        any_candidate = candidates[0]
+        for candidate in candidates[1:]:
+            any_candidate = any_candidate.or_(candidate)
         try:
-            # Keep Playwright context alive for the full duration
-            with sync_playwright() as p:
-                if not self.connect_to_browser(p):
+            any_candidate.first.wait_for(state=state, timeout=step.timeout)
+        except PlaywrightTimeoutError:
+            return False
+        return True
+
+    def resolve_element(self, step: Step):
+        """
+        Wait until any of the step's candidate selectors is visible and return
+        (selector, locator) for the preferred visible one, or (None, None).
+        """
+        if not self.wait_for_element(step):
+            return None, None
+        if len(step.selectors) == 1:
+            return step.selectors[0], self.page.locator(step.selectors[0]).first
+        # Learned selector first, then every candidate in as few round trips as possible
+        return resolve_selector(self.page, step, self.plan.name)
+
+    def run_step(self, step: Step, total: int):
+        """Execute one compiled plan step."""
+        info = step.info(total)
+
+        if step.type == 'navigate':
+            self.send_status('running', step.message or f'Navigating to {step.url}...', info)
+            self.page.goto(step.url, timeout=step.timeout)
+
+        elif step.type == 'wait':
+            if step.message:
+                self.send_status('running', step.message, info)
+            if step.ms is not None:
+                time.sleep(step.ms / 1000)
+                return
+            if step.load_state:
+                try:
+                    self.page.wait_for_load_state(step.load_state, timeout=step.timeout)
                     return
-            
-            # Step 1: Navigate to target website
-            self.send_status('running', 'Navigating to target website...')
-            self.page.goto("https://angularformadd.netlify.app/", timeout=30000)
-            self.send_status('running', 'Website loaded successfully.')
-            
-            # Wait a moment for the page to fully load
-            time.sleep(2)
-            
-            # Step 2: Interactive handover
-            self.send_status('paused', 'Handing over control. Please interact with the form and click Resume when ready.')
+                except PlaywrightTimeoutError:
+                    message = f'Page did not reach "{step.load_state}" for step {step.index}'
+            elif self.wait_for_element(step, step.state):
+                return
+            else:
+                message = f'Element did not become {step.state} for step {step.index}: {step.selectors[0]}'
+            if not step.optional:
+                raise StepFailed(message)
+            self.send_status('warning', message, info)
+            return 'skipped'
+
+        elif step.type in ('click', 'fill'):
+            if step.message:
+                self.send_status('running', step.message, info)
+            selector, element = self.resolve_element(step)
+            if element is None:
+                message = f'Could not find element for step {step.index}: {step.selectors[0]}'
+                if not step.optional:
+                    raise StepFailed(message)
+                self.send_status('warning', message, info)
+                return 'skipped'
+            if step.type == 'click':
+                element.click(timeout=step.timeout)
+                self.send_status('running', f'Clicked element using selector: {selector}', info)
+            else:
+                element.fill(step.value, timeout=step.timeout)
+                self.send_status('running', f'Filled element using selector: {selector}', info)
+
+        elif step.type == 'screenshot':
+            self.send_status('running', step.message or f'Taking screenshot {step.name}...', info)
+            self.screenshots.append(
+                (step.name, self.page.screenshot(full_page=step.full_page, timeout=step.timeout))
+            )
+
+        elif step.type == 'pause':
+            self.send_status('paused', step.message or 'Automation paused. Click Resume to continue.', info)
             set_pause_flag(self.session_id, True)
-            
-            # Wait for user interaction
-            self.wait_for_resume()
-            
-            # Step 3: Resume automation
-            self.send_status('running', 'Resuming automation...')
-            
-            try:
-                # Look for and click the "Add Route" button
-                add_route_button = self.page.locator('text=Add Route').first
-                if add_route_button.is_visible():
-                    add_route_button.click()
-                    self.send_status('running', 'Clicked "Add Route" button.')
-                else:
-                    # Try alternative selectors
-                    button_selectors = [
-                        'button:has-text("Add Route")',
-                        'input[value="Add Route"]',
-                        '[onclick*="addRoute"]',
-                        '.btn:has-text("Add")'
-                    ]
-                    
-                    button_clicked = False
-                    for selector in button_selectors:
-                        try:
-                            element = self.page.locator(selector).first
-                            if element.is_visible():
-                                element.click()
-                                self.send_status('running', f'Clicked button using selector: {selector}')
-                                button_clicked = True
-                                break
-                        except Exception:
-                            continue
-                    
-                    if not button_clicked:
-                        self.send_status('warning', 'Could not find "Add Route" button. Please check the form.')
-                
-            except Exception as e:
-                logger.warning(f"Error clicking Add Route button: {str(e)}")
-                self.send_status('warning', f'Could not click Add Route button: {str(e)}')
-            
-            # Step 4: Observe result
-            time.sleep(3)
-            
-            # Final status
-            self.send_status('completed', 'Automation completed successfully!')
+            self.wait_for_resume(step.timeout / 1000)
+            self.send_status('running', 'Resuming automation...', info)
+            return 'resumed'
+
+    def run_extract_batch(self, batch: ExtractBatch, total: int):
+        """Resolve consecutive extract steps in a single page round trip."""
+        self.send_status('running', f'Extracting {", ".join(s.name for s in batch.steps)}...', batch.info(total))
+        self.extracted.update(self.page.evaluate(EXTRACT_SCRIPT, batch.script_args()))
+
+    def run_operation(self, operation, total: int):
+        """Run one plan operation as a timed span and report the span in a running update."""
+        info = operation.info(total)
+        span = StepSpan(self.plan.name, operation.index, info['type'])
+        try:
+            if isinstance(operation, ExtractBatch):
+                self.run_extract_batch(operation, total)
+                outcome = 'ok'
+            else:
+                outcome = self.run_step(operation, total) or 'ok'
+        except Exception:
+            self.spans.append(span.finish('error'))
+            raise
+        self.spans.append(span.finish(outcome))
+        self.send_status(
+            'running',
+            f"Step {operation.index} ({info['type']}) {outcome} in {self.spans[-1]['duration_ms']} ms",
+            {**info, 'span': self.spans[-1]}
+        )
+
+    def upload_artifacts(self):
+        """Upload the screenshots and trace taken so far and record them in the session state."""
+        screenshots, self.screenshots = self.screenshots, []
+        upload_session_artifacts(self.session_id, screenshots, self.stop_trace())
+
+    def execute_automation_script(self):
+        """Execute the session's compiled step plan."""
+        try:
+            span = StepSpan(self.plan.name, 'connect', 'connect')
+            connected = self.connect_to_browser()
+            self.spans.append(span.finish('ok' if connected else 'error'))
+            if not connected:
+                return
+
+            total = len(self.plan)
+            for operation in self.plan.operations:
+                self.run_operation(operation, total)
+            self.upload_artifacts()
+
+            # Final status, with every span of the run
+            result = {'plan': self.plan.name, 'spans': self.spans}
+            if self.extracted:
+                result['extracted'] = self.extracted
+            self.send_status('completed', 'Automation completed successfully!', result)
 
         except Exception as e:
+            # Screenshots taken before the failure help explain it
+            self.upload_artifacts()
             error_msg = f"Automation error: {str(e)}"
-            self.send_status('error', error_msg)
+            self.send_status('error', error_msg, {'plan': self.plan.name, 'spans': self.spans})
             logger.error(f"Automation failed for {self.session_id}: {error_msg}")
         
         finally:
@@ -179,66 +288,120 @@ class AutomationEngine:
             self.disconnect_browser()
 
 
-def run_automation_script(session_id: str):
+def run_automation_script(session_id: str, plan_name: str = None, endpoint: str = BROWSER_CDP_ENDPOINT,
+                          plan: CompiledPlan = None):
     """
     Main entry point for running automation script.
-    This function is called from the API endpoint in a background thread.
+    This function is called on an `automation_scheduler` worker or by `run_automation_task` on Celery.
+    ``plan`` is the plan already compiled by the caller, when it has one.
     """
     logger.info(f"Starting automation for session: {session_id}")
     
     try:
-        engine = AutomationEngine(session_id)
+        plan = plan or get_compiled_plan(plan_name)
+        # Scheduler threads are long-lived: hand the connection back to the pool before the session runs
+        close_old_connections()
+        engine = AutomationEngine(session_id, plan, endpoint)
         engine.execute_automation_script()
     except Exception as e:
         logger.error(f"Critical error in automation for {session_id}: {str(e)}")
-        # Send final error status
-        try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f'automation_{session_id}',
-                {
-                    "type": "automation_status",
-                    "status": "error",
-                    "message": f"Critical automation error: {str(e)}",
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
-        except Exception:
-            pass  # Fail silently if we can't even send error status
+        send_session_error(session_id, f"Critical automation error: {str(e)}")
     
     logger.info(f"Automation completed for session: {session_id}")
 
 
-# Utility functions for testing and development
-def test_browser_connection():
-    """Test function to verify browser connectivity."""
+def _warm_browser_connection():
+    """Open this worker thread's pooled browser connection ahead of its first session."""
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.connect_over_cdp(BROWSER_CDP_ENDPOINT, timeout=5000)
-            version = browser.version
-            browser.close()
-            return True, f"Connected successfully. Browser version: {version}"
+        get_browser_pool().warm()
     except Exception as e:
-        return False, f"Connection failed: {str(e)}"
+        logger.warning(f"Failed to warm browser connection: {str(e)}")
 
 
-def get_browser_status():
-    """Get current browser status for health checks."""
+# Long-lived workers so each thread's pooled browser connection is reused across sessions
+automation_scheduler = AutomationScheduler(
+    max_workers=AUTOMATION_WORKERS,
+    max_queue=AUTOMATION_QUEUE_SIZE,
+    per_user_limit=AUTOMATION_PER_USER_LIMIT,
+    initializer=_warm_browser_connection
+)
+
+
+def submit_automation(session_id: str, user_key=None, plan_name: str = None, plan: CompiledPlan = None) -> int:
+    """
+    Start an automation on the engine selected by AUTOMATION_ENGINE.
+    Returns the queue position (0 = starting now); raises SchedulerFull or
+    UserConcurrencyLimit when the engine is at capacity. An already compiled
+    ``plan`` is reused by the in-process engines; Celery workers compile their own.
+    """
+    if AUTOMATION_ENGINE == 'celery':
+        return submit_automation_task(session_id, plan_name)
+    if AUTOMATION_ENGINE == 'async':
+        return async_automation_runner.submit(session_id, user_key=user_key, plan_name=plan_name, plan=plan)
+    return automation_scheduler.submit(
+        run_automation_script, session_id, plan_name, BROWSER_CDP_ENDPOINT, plan, user_key=user_key
+    )
+
+
+def automation_queue_name(browser: str) -> str:
+    """Celery queue consumed by the workers bound to one browser."""
+    return f'automation.{browser}'
+
+
+def pick_browser(session_id: str) -> str:
+    """Spread sessions over the configured browsers, stable per session."""
+    browsers = sorted(AUTOMATION_BROWSERS)
+    return browsers[zlib.crc32(session_id.encode()) % len(browsers)]
+
+
+def celery_queue_depth(queue: str) -> int:
+    """Messages waiting in a Celery queue on the Redis broker."""
+    from config.celery import app
+
+    with app.connection_for_read() as connection:
+        return connection.default_channel.client.llen(queue)
+
+
+def submit_automation_task(session_id: str, plan_name: str = None) -> int:
+    """Queue the automation as a Celery task on a browser-affine queue."""
+    from .tasks import run_automation_task
+
+    browser = pick_browser(session_id)
+    queue = automation_queue_name(browser)
+    run_automation_task.apply_async(args=[session_id, plan_name, browser], queue=queue)
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.connect_over_cdp(BROWSER_CDP_ENDPOINT, timeout=5000)
-            contexts = len(browser.contexts)
-            pages = sum(len(context.pages) for context in browser.contexts)
-            browser.close()
-            return {
-                'connected': True,
-                'contexts': contexts,
-                'pages': pages,
-                'endpoint': BROWSER_CDP_ENDPOINT
-            }
+        return celery_queue_depth(queue)
     except Exception as e:
-        return {
-            'connected': False,
-            'error': str(e),
-            'endpoint': BROWSER_CDP_ENDPOINT
-        }
+        logger.debug(f"Could not read depth of {queue}: {str(e)}")
+        return 0
+
+
+def get_automation_stats() -> dict:
+    """Capacity and queue metrics for the active automation engine."""
+    if AUTOMATION_ENGINE == 'celery':
+        queues = {}
+        for browser in AUTOMATION_BROWSERS:
+            queue = automation_queue_name(browser)
+            try:
+                queues[queue] = celery_queue_depth(queue)
+            except Exception as e:
+                queues[queue] = None
+                logger.debug(f"Could not read depth of {queue}: {str(e)}")
+        return {'engine': 'celery', 'queue_depth': queues}
+    if AUTOMATION_ENGINE == 'async':
+        return async_automation_runner.stats()
+    return {'engine': 'sync', **automation_scheduler.stats()}
+
+
+# Utility functions for testing and development
+def test_browser_connection():
+    """Test function to verify browser connectivity with a fresh CDP probe."""
+    result = browser_health_prober.probe()
+    if result['connected']:
+        return True, f"Connected successfully. Browser version: {result['browser']} ({result['latency_ms']} ms)"
+    return False, f"Connection failed: {result['error']}"
+
+
+def get_browser_status():
+    """Get current browser status for health checks from the cached probe snapshot."""
+    return browser_health_prober.snapshot()
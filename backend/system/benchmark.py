@@ -0,0 +1,433 @@
+"""
+Load-test harness for the automation path without a real browser.
+
+A local stand-in replaces the playwright-vnc container: a fake browser pool whose
+pages implement the subset of the Playwright page API the engine uses (with a
+configurable per-call latency), plus a tiny HTTP server answering the CDP
+/json/version and /json/list discovery endpoints. Status messages travel over
+an in-memory channel layer and session state lives in a LocalSessionStore, so
+the benchmark needs no browser. The selector cache still uses the configured
+Django cache, which is Redis by default.
+
+Run it with ``python manage.py benchmark_automation``.
+"""
+
+import asyncio
+import json
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from channels.layers import InMemoryChannelLayer
+
+BENCHMARK_PLAN_NAME = 'benchmark'
+BENCHMARK_PLAN = {
+    'name': BENCHMARK_PLAN_NAME,
+    'steps': [
+        {'type': 'navigate', 'url': 'https://benchmark.local/form', 'message': 'Navigating to form...'},
+        {'type': 'wait', 'load_state': 'networkidle'},
+        {'type': 'fill', 'selector': '#email', 'value': 'bench@example.com'},
+        # The first candidate never matches, exercising fallback resolution and the selector cache
+        {'type': 'click', 'selectors': ['text=Submit', 'button[type=submit]', '#submit'],
+         'message': 'Submitting form...'},
+        {'type': 'extract', 'name': 'title', 'selector': 'h1'},
+        {'type': 'extract', 'name': 'items', 'selector': 'li', 'all': True},
+        {'type': 'wait', 'ms': 20},
+    ],
+}
+
+FAKE_BROWSER_VERSION = 'FakeChrome/1.0 (benchmark)'
+
+
+class FakeLocator:
+    """Locator over a FakePage: selectors starting with text= are never visible."""
+
+    def __init__(self, page, selectors: list[str]):
+        self.page = page
+        self.selectors = selectors
+
+    @property
+    def first(self):
+        return self
+
+    def or_(self, other):
+        return FakeLocator(self.page, self.selectors + other.selectors)
+
+    def _visible(self) -> bool:
+        return any(not s.startswith('text=') for s in self.selectors)
+
+    def wait_for(self, state: str = 'visible', timeout: float = None):
+        self.page.round_trip()
+        if not self._visible():
+            from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+            raise PlaywrightTimeoutError(f'Timeout waiting for {self.selectors}')
+
+    def is_visible(self) -> bool:
+        self.page.round_trip()
+        return self._visible()
+
+    def click(self, timeout: float = None):
+        self.page.round_trip()
+
+    def fill(self, value: str, timeout: float = None):
+        self.page.round_trip()
+
+
+class FakePage:
+    """Page stand-in; every call costs ``latency`` seconds, navigations ``navigation_latency``."""
+
+    def __init__(self, context, latency: float, navigation_latency: float):
+        self.context = context
+        self.latency = latency
+        self.navigation_latency = navigation_latency
+        self.url = 'about:blank'
+        self.calls = 0
+        self._closed = False
+
+    def round_trip(self, seconds: float = None):
+        self.calls += 1
+        time.sleep(self.latency if seconds is None else seconds)
+
+    def goto(self, url: str, timeout: float = None):
+        self.round_trip(self.navigation_latency if url != 'about:blank' else None)
+        self.url = url
+
+    def wait_for_load_state(self, state: str = 'load', timeout: float = None):
+        self.round_trip()
+
+    def locator(self, selector: str) -> FakeLocator:
+        return FakeLocator(self, [selector])
+
+    def evaluate(self, script: str, arg=None):
+        from .plans import EXTRACT_SCRIPT
+
+        self.round_trip()
+        if script == EXTRACT_SCRIPT:
+            return {f['name']: (['item 1', 'item 2'] if f['all'] else 'Benchmark') for f in arg}
+        # Visibility script: matches FakeLocator, where text= selectors are never visible
+        return [not s.startswith('text=') for s in arg]
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+
+class FakeBrowserPool:
+    """Drop-in for BrowserPool handing out FakePages."""
+
+    def __init__(self, latency: float = 0.002, navigation_latency: float = 0.02):
+        self.latency = latency
+        self.navigation_latency = navigation_latency
+        self.context = SimpleNamespace(browser=None)
+        self.leased = 0
+        self._idle: list[FakePage] = []
+        self._pages: list[FakePage] = []
+        self._lock = threading.Lock()
+
+    def warm(self):
+        pass
+
+    def lease_page(self):
+        with self._lock:
+            self.leased += 1
+            if self._idle:
+                return self.context, self._idle.pop()
+            page = FakePage(self.context, self.latency, self.navigation_latency)
+            self._pages.append(page)
+            return self.context, page
+
+    def release_page(self, page: FakePage):
+        page.goto('about:blank')
+        with self._lock:
+            self._idle.append(page)
+
+    def close_thread_connection(self):
+        pass
+
+    def pages(self) -> list[FakePage]:
+        with self._lock:
+            return list(self._pages)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'pages': len(self._pages), 'idle_pages': len(self._idle), 'leased': self.leased}
+
+
+class FakeCDPServer:
+    """Serves the CDP HTTP discovery endpoints for a FakeBrowserPool."""
+
+    def __init__(self, pool: FakeBrowserPool):
+        self.pool = pool
+        self._server: ThreadingHTTPServer = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> str:
+        pool = self.pool
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/json/version':
+                    body = {'Browser': FAKE_BROWSER_VERSION, 'Protocol-Version': '1.3'}
+                elif self.path == '/json/list':
+                    body = [
+                        {'id': str(index), 'type': 'page', 'url': page.url}
+                        for index, page in enumerate(pool.pages())
+                    ]
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name='fake-cdp', daemon=True).start()
+        return self.endpoint
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class LoopBoundChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory channel layer usable from several event loops.
+
+    Its queues belong to the loop running the consumers; sends from other loops
+    (the status emitter's, async_to_sync in worker threads) are handed to it.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, **kwargs):
+        super().__init__(**kwargs)
+        self.loop = loop
+
+    async def _on_loop(self, coroutine):
+        if asyncio.get_running_loop() is self.loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self.loop))
+
+    async def send(self, channel, message):
+        return await self._on_loop(super().send(channel, message))
+
+    async def group_send(self, group, message):
+        return await self._on_loop(super().group_send(group, message))
+
+
+def percentiles(values: list[float]) -> dict:
+    """p50/p95/p99/max of seconds, in milliseconds."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered) * 1000, 2),
+        'p50': pick(0.5),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+class BenchmarkUser:
+    """Authenticated principal for StartAutomationView; one per session avoids per-user caps."""
+
+    is_authenticated = True
+
+    def __init__(self, pk: int):
+        self.pk = pk
+
+
+class AutomationBenchmark:
+    """
+    Drives ``sessions`` concurrent automations through StartAutomationView and
+    the sync engine, watched by ``watchers`` WebSocket clients of
+    AutomationConsumer spread round-robin over the sessions.
+    """
+
+    def __init__(self, sessions: int = 20, watchers: int = 40, workers: int = 4, latency: float = 0.002,
+                 navigation_latency: float = 0.02, timeout: float = 120, trace_memory: bool = False):
+        self.sessions = sessions
+        self.watchers = watchers
+        self.workers = workers
+        self.timeout = timeout
+        self.trace_memory = trace_memory
+        self.pool = FakeBrowserPool(latency, navigation_latency)
+        self.cdp_server = FakeCDPServer(self.pool)
+
+    def _install(self, loop: asyncio.AbstractEventLoop):
+        from channels.layers import DEFAULT_CHANNEL_LAYER, channel_layers
+        from config.metrics import metrics
+        from . import automation, browser_pool, plans
+        from .scheduler import AutomationScheduler
+        from .session_store import LocalSessionStore, set_session_store
+
+        channel_layers.set(DEFAULT_CHANNEL_LAYER, LoopBoundChannelLayer(loop, capacity=10000))
+        set_session_store(LocalSessionStore())
+        metrics.redis_url = None
+        plans.BUILTIN_PLANS[BENCHMARK_PLAN_NAME] = BENCHMARK_PLAN
+        with browser_pool._pools_lock:
+            browser_pool._pools[browser_pool.BROWSER_CDP_ENDPOINT] = self.pool
+        automation.AUTOMATION_ENGINE = 'sync'
+        automation.LIVE_VIEW_ENABLED = False
+        automation.automation_scheduler = AutomationScheduler(
+            max_workers=self.workers, max_queue=self.sessions, per_user_limit=self.sessions,
+            initializer=automation._warm_browser_connection, name='benchmark'
+        )
+
+    async def _start(self, session_id: str, user_pk: int) -> float:
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import StartAutomationView
+
+        request = APIRequestFactory().post(
+            '/api/system/automations/start/', {'sessionId': session_id, 'plan': BENCHMARK_PLAN_NAME}, format='json'
+        )
+        force_authenticate(request, user=BenchmarkUser(user_pk))
+        started = time.perf_counter()
+        response = await asyncio.to_thread(StartAutomationView.as_view(), request)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'Start of {session_id} failed: {response.status_code} {response.data}')
+        return elapsed
+
+    async def _watch(self, session_id: str, user_pk: int, connected: asyncio.Event, deliveries: list,
+                     events: list):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from .authentication import issue_session_ticket
+        from .routing import websocket_urlpatterns
+
+        ticket = issue_session_ticket(BenchmarkUser(user_pk), session_id)
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/automation/{session_id}/?ticket={ticket}'
+        )
+        ok, _ = await communicator.connect()
+        connected.set()
+        if not ok:
+            raise RuntimeError(f'Watcher of {session_id} could not connect')
+        try:
+            deadline = time.monotonic() + self.timeout
+            while time.monotonic() < deadline:
+                frame = json.loads(await communicator.receive_from(timeout=deadline - time.monotonic()))
+                if frame.get('type') != 'status_update':
+                    continue
+                events.append(1)
+                if frame.get('timestamp'):
+                    sent_at = datetime.fromisoformat(frame['timestamp'])
+                    deliveries.append((datetime.now() - sent_at).total_seconds())
+                if frame['status'] in ('completed', 'error'):
+                    return
+        finally:
+            await communicator.disconnect()
+
+    async def _wait_finished(self, session_ids: list[str]) -> dict:
+        from .consumers import get_session_states
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            states = await asyncio.to_thread(get_session_states, session_ids)
+            if all(s.get('finished_at') for s in states.values()):
+                return states
+            await asyncio.sleep(0.05)
+        raise TimeoutError(f'Sessions did not finish within {self.timeout}s')
+
+    async def run_async(self) -> dict:
+        self._install(asyncio.get_running_loop())
+        endpoint = self.cdp_server.start()
+        try:
+            return await self._run(endpoint)
+        finally:
+            self.cdp_server.stop()
+
+    async def _run(self, endpoint: str) -> dict:
+        from .browser_health import BrowserHealthProber
+        from .step_timing import step_latency_summary
+
+        probe = BrowserHealthProber(endpoint).probe()
+        session_ids = [f'bench{index}' for index in range(self.sessions)]
+
+        # Watchers join before the sessions start so they see every update
+        deliveries, events = [], []
+        connected = [asyncio.Event() for _ in range(self.watchers)]
+        watch_tasks = [
+            asyncio.ensure_future(self._watch(
+                session_ids[index % self.sessions], index % self.sessions, connected[index], deliveries, events
+            ))
+            for index in range(self.watchers)
+        ]
+        await asyncio.gather(*(event.wait() for event in connected))
+
+        if self.trace_memory:
+            tracemalloc.start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        start_latencies = await asyncio.gather(
+            *(self._start(session_id, index) for index, session_id in enumerate(session_ids))
+        )
+        states = await self._wait_finished(session_ids)
+        elapsed = time.perf_counter() - started
+        await asyncio.gather(*watch_tasks)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        traced_peak = None
+        if self.trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        queue_waits = [
+            (datetime.fromisoformat(s['started_at']) - datetime.fromisoformat(s['queued_at'])).total_seconds()
+            for s in states.values() if s.get('started_at') and s.get('queued_at')
+        ]
+        durations = [
+            (datetime.fromisoformat(s['finished_at']) - datetime.fromisoformat(s['started_at'])).total_seconds()
+            for s in states.values() if s.get('started_at')
+        ]
+        return {
+            'config': {
+                'sessions': self.sessions, 'watchers': self.watchers, 'workers': self.workers,
+                'page_latency_ms': self.pool.latency * 1000,
+                'navigation_latency_ms': self.pool.navigation_latency * 1000,
+            },
+            'outcomes': {status: sum(1 for s in states.values() if s.get('status') == status)
+                         for status in {s.get('status') for s in states.values()}},
+            'start_latency_ms': percentiles(start_latencies),
+            'queue_wait_ms': percentiles(queue_waits),
+            'session_duration_ms': percentiles(durations),
+            'status_delivery_ms': percentiles(deliveries),
+            'throughput': {
+                'wall_seconds': round(elapsed, 3),
+                'sessions_per_second': round(self.sessions / elapsed, 2),
+                'status_updates_delivered': len(events),
+                'status_updates_per_second': round(len(events) / elapsed, 2),
+            },
+            'memory': {
+                # ru_maxrss is in KiB on Linux
+                'peak_rss_growth_kib_per_session': round((rss_after - rss_before) / self.sessions, 2),
+                'traced_peak_kib_per_session': round(traced_peak / 1024 / self.sessions, 2)
+                if traced_peak is not None else None,
+            },
+            'browser': {'probe': probe, 'pool': self.pool.stats()},
+            'slowest_steps': step_latency_summary(BENCHMARK_PLAN_NAME)[:5],
+        }
+
+    def run(self) -> dict:
+        return asyncio.run(self.run_async())
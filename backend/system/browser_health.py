@@ -0,0 +1,90 @@
+"""
+Lightweight browser health probing over the CDP HTTP endpoints.
+A background thread polls /json/version and /json/list; health checks read the
+latest snapshot instead of starting a Playwright driver.
+"""
+
+import threading
+import time
+import logging
+from datetime import datetime
+import requests
+from django.conf import settings
+from .browser_pool import BROWSER_CDP_ENDPOINT
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = getattr(settings, 'PLAYWRIGHT_HEALTH_PROBE_INTERVAL', 10)
+PROBE_TIMEOUT = 2
+
+
+class BrowserHealthProber:
+    """
+    Periodically probes a CDP endpoint and keeps the latest result in memory.
+
+    ``snapshot()`` is O(1): it returns the last probe result, probing inline
+    only for the very first call in the process.
+    """
+
+    def __init__(self, endpoint: str = BROWSER_CDP_ENDPOINT, interval: float = PROBE_INTERVAL,
+                 timeout: float = PROBE_TIMEOUT):
+        self.endpoint = endpoint.rstrip('/')
+        self.interval = interval
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._snapshot: dict = None
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+
+    def probe(self) -> dict:
+        """Probe the endpoint now and store the result."""
+        started = time.monotonic()
+        try:
+            version = self._session.get(f'{self.endpoint}/json/version', timeout=self.timeout)
+            version.raise_for_status()
+            version_latency = time.monotonic() - started
+
+            targets = self._session.get(f'{self.endpoint}/json/list', timeout=self.timeout)
+            targets.raise_for_status()
+            pages = [t for t in targets.json() if t.get('type') == 'page']
+
+            snapshot = {
+                'connected': True,
+                'browser': version.json().get('Browser'),
+                'pages': len(pages),
+                'latency_ms': round(version_latency * 1000, 2),
+                'probe_ms': round((time.monotonic() - started) * 1000, 2),
+            }
+        except Exception as e:
+            snapshot = {
+                'connected': False,
+                'error': str(e),
+                'probe_ms': round((time.monotonic() - started) * 1000, 2),
+            }
+        snapshot['endpoint'] = self.endpoint
+        snapshot['checked_at'] = datetime.now().isoformat()
+        self._snapshot = snapshot
+        return snapshot
+
+    def _run(self):
+        # snapshot() has just probed inline, so start with a sleep
+        while True:
+            time.sleep(self.interval)
+            self.probe()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='browser-health-prober', daemon=True)
+            self._thread.start()
+
+    def snapshot(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.probe()
+            self.start()
+        return snapshot
+
+
+browser_health_prober = BrowserHealthProber()
@@ -0,0 +1,171 @@
+"""
+Persistent CDP browser connection pool.
+Keeps Playwright drivers and CDP connections alive between automation sessions.
+"""
+
+import threading
+import logging
+from playwright.sync_api import sync_playwright, Browser, BrowserContext, Page, Playwright
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BROWSER_CDP_ENDPOINT = getattr(settings, 'PLAYWRIGHT_BROWSER_CDP_ENDPOINT', 'http://playwright-vnc:9222')
+BROWSER_CONNECT_TIMEOUT = getattr(settings, 'PLAYWRIGHT_CONNECT_TIMEOUT', 30000)
+POOL_IDLE_PAGES = getattr(settings, 'PLAYWRIGHT_POOL_IDLE_PAGES', 2)
+DEFAULT_VIEWPORT = {'width': 1920, 'height': 1080}
+
+
+class BrowserConnection:
+    """A live Playwright driver, its CDP browser connection and warm pages."""
+
+    def __init__(self, playwright: Playwright, browser: Browser):
+        self.playwright = playwright
+        self.browser = browser
+        # Unused pages, each in its own fresh context
+        self.idle_pages: list[Page] = []
+        self.connected = True
+        browser.on('disconnected', self._on_disconnected)
+
+    def _on_disconnected(self, *args):
+        self.connected = False
+
+    def is_healthy(self) -> bool:
+        return self.connected and self.browser.is_connected()
+
+    def close(self):
+        try:
+            if self.browser.is_connected():
+                self.browser.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled browser connection: {str(e)}")
+        finally:
+            self.connected = False
+            self.idle_pages.clear()
+            self.playwright.stop()
+
+
+class BrowserPool:
+    """
+    Pool of CDP connections for one browser endpoint.
+
+    The sync Playwright API is bound to the thread that started it, so each
+    worker thread owns one long-lived connection. Sessions lease a warm page
+    from it instead of connecting and closing the browser every time. Each
+    leased page lives in its own browser context, closed on release, so no
+    cookies, storage or auth state carry over from one session to the next.
+    Dead connections are detected on lease and rebuilt.
+    """
+
+    def __init__(self, endpoint: str = BROWSER_CDP_ENDPOINT, idle_pages: int = POOL_IDLE_PAGES,
+                 connect_timeout: int = BROWSER_CONNECT_TIMEOUT):
+        self.endpoint = endpoint
+        self.idle_pages = idle_pages
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: set[BrowserConnection] = set()
+
+    def _connect(self) -> BrowserConnection:
+        playwright = sync_playwright().start()
+        try:
+            browser = playwright.chromium.connect_over_cdp(self.endpoint, timeout=self.connect_timeout)
+        except Exception:
+            playwright.stop()
+            raise
+
+        connection = BrowserConnection(playwright, browser)
+        with self._lock:
+            self._connections.add(connection)
+        logger.info(f"Opened pooled browser connection to {self.endpoint}")
+        return connection
+
+    def _discard(self, connection: BrowserConnection):
+        with self._lock:
+            self._connections.discard(connection)
+        connection.close()
+
+    def connection(self) -> BrowserConnection:
+        """Return this thread's healthy connection, reconnecting if needed."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and not connection.is_healthy():
+            logger.warning(f"Pooled browser connection to {self.endpoint} lost, reconnecting")
+            self._discard(connection)
+            connection = None
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def _new_page(self, connection: BrowserConnection) -> Page:
+        """Open a page in a new, empty browser context."""
+        context = connection.browser.new_context(viewport=DEFAULT_VIEWPORT)
+        try:
+            return context.new_page()
+        except Exception:
+            context.close()
+            raise
+
+    def _fill(self, connection: BrowserConnection):
+        while len(connection.idle_pages) < self.idle_pages:
+            connection.idle_pages.append(self._new_page(connection))
+
+    def warm(self):
+        """Connect and pre-open idle pages so the next lease is instant."""
+        self._fill(self.connection())
+
+    def lease_page(self) -> tuple[BrowserContext, Page]:
+        """Lease a ready page, alone in its context, from this thread's connection."""
+        connection = self.connection()
+        while connection.idle_pages:
+            page = connection.idle_pages.pop()
+            if not page.is_closed():
+                return page.context, page
+        page = self._new_page(connection)
+        return page.context, page
+
+    def release_page(self, page: Page):
+        """Close a leased page's context and top the idle pages back up."""
+        if page is None:
+            return
+        try:
+            page.context.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled browser context: {str(e)}")
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or not connection.is_healthy():
+            return
+        try:
+            self._fill(connection)
+        except Exception as e:
+            logger.debug(f"Error refilling idle pages: {str(e)}")
+
+    def close_thread_connection(self):
+        """Close the connection owned by the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            self._discard(connection)
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = list(self._connections)
+        return {
+            'endpoint': self.endpoint,
+            'connections': len(connections),
+            'healthy': sum(1 for c in connections if c.connected),
+            'idle_pages': sum(len(c.idle_pages) for c in connections),
+        }
+
+
+_pools: dict[str, BrowserPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool(endpoint: str = BROWSER_CDP_ENDPOINT) -> BrowserPool:
+    """Return the process-wide pool for a CDP endpoint."""
+    with _pools_lock:
+        pool = _pools.get(endpoint)
+        if pool is None:
+            pool = _pools[endpoint] = BrowserPool(endpoint)
+        return pool
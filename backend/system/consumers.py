@@ -3,16 +3,49 @@ WebSocket consumers for interactive browser automation.
 Handles real-time communication between frontend and automation engine.
 """
 
+import asyncio
 import json
+import re
 import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
+from .authentication import MULTIPLEX_TICKET_SESSION, read_session_ticket
+from .live_view import LIVE_VIEW_ENABLED, ScreencastSession, get_live_view_browser
+from .session_store import TERMINAL_STATUSES, get_session_store, public_state
 
 logger = logging.getLogger(__name__)
 
-# A simple in-memory store for automation pause flags
-# In production, this should be stored in Redis or database
-pause_flags = {}
+
+def _parse_seq(value):
+    """Sequence number sent by a client, or None when absent or malformed."""
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+
+def _authenticate(scope: dict, query: dict, ticket_session: str):
+    """Primary key (as a string) of the connecting user, or None."""
+    user = scope.get('user')
+    if user is not None and user.is_authenticated:
+        return str(user.pk)
+    ticket = query.get('ticket', [None])[0]
+    return read_session_ticket(ticket, ticket_session) if ticket else None
+
+
+def _owned_by(state: dict, user_pk: str, allow_unstarted: bool = False) -> bool:
+    owner = state.get('owner')
+    if owner is None:
+        return allow_unstarted
+    return owner == user_pk
+
+
+def _replay_frame(events: list, last_seq: int) -> dict:
+    # Missed events fell out of the replay buffer when the oldest one left is not last_seq + 1
+    truncated = bool(events) and events[0]['seq'] > last_seq + 1
+    return {'events': events, 'truncated': truncated}
 
 
 class AutomationConsumer(AsyncWebsocketConsumer):
@@ -23,12 +56,32 @@ class AutomationConsumer(AsyncWebsocketConsumer):
     - Real-time status updates
     - Interactive pause/resume control
     - Session management
+    - Replay of missed updates: reconnect with `?last_seq=N` or send
+      {"command": "replay", "lastSeq": N} to receive the updates after N
+    - Optional CDP screencast live view (AUTOMATION_LIVE_VIEW):
+      "screencast_start" / "screencast_stop", acknowledge each
+      `screencast_frame` with {"command": "screencast_ack", "frameId": N}, and
+      forward input with {"command": "input", "event": {"kind": "mouse", ...}}
+
+    Connections authenticate with the session cookie or a `?ticket=` from the
+    session ticket endpoint, and only the user who started the session may
+    watch or control it.
     """
     
     async def connect(self):
         """Accept WebSocket connection and join automation group."""
         self.session_id = self.scope['url_route']['kwargs']['session_id']
         self.room_group_name = f'automation_{self.session_id}'
+        # Highest sequence number delivered, so replayed updates aren't sent twice
+        self.last_seq = 0
+        self.screencast: ScreencastSession = None
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.user_pk = _authenticate(self.scope, query, self.session_id)
+        # Watchers may connect before the session is started; its owner is checked again on control commands
+        if self.user_pk is None or not await self._owns_session(allow_unstarted=True):
+            await self.close(code=4403)
+            return
 
         # Join automation group
         await self.channel_layer.group_add(
@@ -40,17 +93,26 @@ class AutomationConsumer(AsyncWebsocketConsumer):
         
         logger.info(f"WebSocket connected for automation session: {self.session_id}")
 
+        last_seq = _parse_seq(query.get('last_seq', [None])[0])
+        if last_seq is not None:
+            await self.replay(last_seq)
+
+    async def _owns_session(self, allow_unstarted: bool = False) -> bool:
+        state = (await sync_to_async(get_session_states)([self.session_id]))[self.session_id]
+        return _owned_by(state, self.user_pk, allow_unstarted)
+
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection and cleanup."""
+        await self.stop_screencast(notify=False)
+
         # Leave automation group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
         
-        # Clean up pause flags
-        pause_flags.pop(self.session_id, None)
-        
+        # Pause flags are left alone: other watchers may still be connected and this one may
+        # reconnect; the engines and the stop/start views clean them up
         logger.info(f"WebSocket disconnected for automation session: {self.session_id}")
 
     async def receive(self, text_data):
@@ -58,10 +120,13 @@ class AutomationConsumer(AsyncWebsocketConsumer):
         try:
             data = json.loads(text_data)
             command = data.get('command')
+
+            if command in ('resume', 'pause', 'screencast_start') and not await self._owns_session():
+                raise ValueError('Only the user who started the session may control it')
             
             if command == 'resume':
                 # Signal automation to resume
-                pause_flags[self.session_id] = False
+                await sync_to_async(set_pause_flag)(self.session_id, False)
                 logger.info(f"Resume command received for session: {self.session_id}")
                 
                 # Notify group that automation is resuming
@@ -69,13 +134,14 @@ class AutomationConsumer(AsyncWebsocketConsumer):
                     self.room_group_name,
                     {
                         'type': 'automation_status',
+                        'session_id': self.session_id,
                         'status': 'running',
                         'message': 'Automation resumed by user.'
                     }
                 )
             elif command == 'pause':
                 # Signal automation to pause
-                pause_flags[self.session_id] = True
+                await sync_to_async(set_pause_flag)(self.session_id, True)
                 logger.info(f"Pause command received for session: {self.session_id}")
                 
             elif command == 'status':
@@ -83,36 +149,366 @@ class AutomationConsumer(AsyncWebsocketConsumer):
                 await self.send(text_data=json.dumps({
                     'type': 'status_response',
                     'session_id': self.session_id,
-                    'is_paused': pause_flags.get(self.session_id, False)
+                    'is_paused': await sync_to_async(get_pause_flag)(self.session_id)
                 }))
+
+            elif command == 'replay':
+                last_seq = _parse_seq(data.get('lastSeq'))
+                if last_seq is not None:
+                    await self.replay(last_seq)
+
+            elif command == 'screencast_start':
+                await self.start_screencast()
+            elif command == 'screencast_stop':
+                await self.stop_screencast()
+            elif command == 'screencast_ack':
+                if self.screencast is not None:
+                    await self.screencast.ack(data.get('frameId'))
+            elif command == 'input':
+                if self.screencast is None:
+                    raise ValueError('Start the screencast before sending input')
+                await self.screencast.dispatch_input(data.get('event') or {})
                 
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON received from session: {self.session_id}")
+        except ValueError as e:
+            await self._send_error(str(e))
         except Exception as e:
             logger.error(f"Error handling message for session {self.session_id}: {str(e)}")
 
+    async def _send_error(self, message: str):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message}))
+
+    async def start_screencast(self):
+        """Attach to the session's page and stream it as JPEG frames."""
+        if not LIVE_VIEW_ENABLED:
+            raise ValueError('Live view is not enabled')
+        if self.screencast is not None:
+            return
+        state = await sync_to_async(get_session_states)([self.session_id])
+        target_id = state[self.session_id].get('target_id')
+        endpoint = state[self.session_id].get('cdp_endpoint')
+        if not target_id or not endpoint:
+            raise ValueError('Session has no live page')
+        page = await get_live_view_browser(endpoint).find_page(target_id)
+        if page is None:
+            raise ValueError('Session page not found')
+
+        self.screencast = ScreencastSession(page, self._send_frame)
+        await self.screencast.start()
+        await self.send(text_data=json.dumps({'type': 'screencast_started', **self.screencast.stats()}))
+        logger.info(f"Screencast started for session: {self.session_id}")
+
+    async def stop_screencast(self, notify: bool = True):
+        if self.screencast is None:
+            return
+        screencast, self.screencast = self.screencast, None
+        await screencast.stop()
+        if notify:
+            await self.send(text_data=json.dumps({'type': 'screencast_stopped', **screencast.stats()}))
+
+    async def _send_frame(self, frame: dict):
+        await self.send(text_data=json.dumps({'type': 'screencast_frame', **frame}))
+
+    async def replay(self, last_seq: int):
+        """Send the buffered updates after last_seq in one frame."""
+        events = (await sync_to_async(get_session_events_since)({self.session_id: last_seq}))[self.session_id]
+        frame = _replay_frame([self._status_update(e) for e in events], last_seq)
+        await self.send(text_data=json.dumps({'type': 'replay', 'session_id': self.session_id, **frame}))
+        if events:
+            self.last_seq = max(self.last_seq, events[-1]['seq'])
+
+    def _status_update(self, event: dict) -> dict:
+        return {
+            'type': 'status_update',
+            'seq': event.get('seq'),
+            'status': event['status'],
+            'message': event['message'],
+            'timestamp': event.get('timestamp'),
+            'step_info': event.get('step_info')
+        }
+
     async def automation_status(self, event):
         """Send automation status update to WebSocket."""
-        await self.send(text_data=json.dumps({
-            'type': 'status_update',
+        seq = event.get('seq')
+        if seq is not None:
+            if seq <= self.last_seq:
+                return
+            self.last_seq = seq
+        await self.send(text_data=json.dumps(self._status_update(event)))
+        if event['status'] in TERMINAL_STATUSES:
+            # The page is returned to the pool once the session ends
+            await self.stop_screencast()
+
+    async def automation_status_batch(self, event):
+        """Send a batch of buffered automation status updates to WebSocket."""
+        for status_event in event['events']:
+            await self.automation_status(status_event)
+
+
+class AutomationMultiplexConsumer(AsyncWebsocketConsumer):
+    """
+    One WebSocket for watching many automation sessions.
+    
+    Client commands:
+    - {"command": "subscribe", "sessionIds": [...], "lastSeqs": {"id": N}}:
+      join session groups and receive their current state, plus the updates
+      missed since N for the sessions listed in the optional lastSeqs
+    - {"command": "unsubscribe", "sessionIds": [...]}: leave session groups
+    - {"command": "pause" | "resume", "sessionId": "..."}: control one session
+    
+    Status updates are tagged with their session id and sent in batched
+    `status_batch` frames every `flush_interval` seconds.
+
+    Connections authenticate with the session cookie or a `?ticket=` from the
+    multiplex ticket endpoint. Like AutomationConsumer, sessions started by
+    another user can't be subscribed to (they are listed as `forbidden`) and
+    only the owner may pause or resume a session.
+    """
+    
+    max_subscriptions = 200
+    flush_interval = 0.1
+    session_id_pattern = re.compile(r'^\w+$')
+    
+    async def connect(self):
+        """Accept authenticated connections; sessions are joined on subscribe."""
+        self.subscriptions = set()
+        self.last_seqs = {}
+        self.outbox = []
+        self.flush_handle = None
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.user_pk = _authenticate(self.scope, query, MULTIPLEX_TICKET_SESSION)
+        if self.user_pk is None:
+            await self.close(code=4403)
+            return
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        """Leave every subscribed session group."""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        for session_id in self.subscriptions:
+            await self.channel_layer.group_discard(f'automation_{session_id}', self.channel_name)
+        self.subscriptions.clear()
+        self.last_seqs.clear()
+
+    async def receive(self, text_data):
+        """Handle subscription and control commands."""
+        try:
+            data = json.loads(text_data)
+            command = data.get('command')
+            
+            if command == 'subscribe':
+                await self.subscribe(self._session_ids(data), self._last_seqs(data))
+            elif command == 'unsubscribe':
+                await self.unsubscribe(self._session_ids(data))
+            elif command in ('pause', 'resume'):
+                session_id = data.get('sessionId')
+                if session_id not in self.subscriptions:
+                    await self._send_error(f'Not subscribed to session: {session_id}')
+                    return
+                # The session may have been started by someone else since it was subscribed
+                state = (await sync_to_async(get_session_states)([session_id]))[session_id]
+                if not _owned_by(state, self.user_pk):
+                    raise ValueError('Only the user who started the session may control it')
+                await sync_to_async(set_pause_flag)(session_id, command == 'pause')
+                logger.info(f"{command.title()} command received for session: {session_id}")
+                if command == 'resume':
+                    await self.channel_layer.group_send(
+                        f'automation_{session_id}',
+                        {
+                            'type': 'automation_status',
+                            'session_id': session_id,
+                            'status': 'running',
+                            'message': 'Automation resumed by user.'
+                        }
+                    )
+                    
+        except json.JSONDecodeError:
+            logger.error("Invalid JSON received on multiplexed automation socket")
+        except ValueError as e:
+            await self._send_error(str(e))
+        except Exception as e:
+            logger.error(f"Error handling multiplexed automation message: {str(e)}")
+
+    def _session_ids(self, data) -> list:
+        session_ids = data.get('sessionIds')
+        if not isinstance(session_ids, list) or \
+                not all(isinstance(s, str) and self.session_id_pattern.match(s) for s in session_ids):
+            raise ValueError('sessionIds must be a list of session ids')
+        return list(dict.fromkeys(session_ids))
+
+    def _last_seqs(self, data) -> dict:
+        last_seqs = data.get('lastSeqs') or {}
+        if not isinstance(last_seqs, dict):
+            raise ValueError('lastSeqs must map session ids to sequence numbers')
+        parsed = {session_id: _parse_seq(seq) for session_id, seq in last_seqs.items()}
+        return {session_id: seq for session_id, seq in parsed.items() if seq is not None}
+
+    async def _send_error(self, message: str):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message}))
+
+    async def subscribe(self, session_ids: list, last_seqs: dict = None):
+        new_ids = [s for s in session_ids if s not in self.subscriptions]
+        if len(self.subscriptions) + len(new_ids) > self.max_subscriptions:
+            raise ValueError(f'At most {self.max_subscriptions} sessions per connection')
+        
+        # Join before reading the state so no update slips between the two; group messages
+        # aren't handled until this command returns
+        await asyncio.gather(*(
+            self.channel_layer.group_add(f'automation_{session_id}', self.channel_name)
+            for session_id in new_ids
+        ))
+        
+        # Current state of every requested session in one store round trip
+        states = await sync_to_async(get_session_states)(session_ids)
+        forbidden = [s for s in session_ids if not _owned_by(states[s], self.user_pk, allow_unstarted=True)]
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(f'automation_{session_id}', self.channel_name)
+            for session_id in forbidden
+        ))
+        session_ids = [s for s in session_ids if s not in forbidden]
+        self.subscriptions.difference_update(forbidden)
+        for session_id in forbidden:
+            self.last_seqs.pop(session_id, None)
+        self.subscriptions.update(session_ids)
+
+        frame = {
+            'type': 'subscribed',
+            'session_ids': session_ids,
+            'states': {session_id: public_state(states[session_id]) for session_id in session_ids}
+        }
+        if forbidden:
+            frame['forbidden'] = forbidden
+
+        last_seqs = {s: seq for s, seq in (last_seqs or {}).items() if s in self.subscriptions}
+        if last_seqs:
+            missed = await sync_to_async(get_session_events_since)(last_seqs)
+            frame['replay'] = {}
+            for session_id, events in missed.items():
+                frame['replay'][session_id] = _replay_frame(
+                    [self._event(e, session_id) for e in events], last_seqs[session_id]
+                )
+                if events:
+                    self._advance(session_id, events[-1]['seq'])
+        await self.send(text_data=json.dumps(frame))
+
+    async def unsubscribe(self, session_ids: list):
+        removed = [s for s in session_ids if s in self.subscriptions]
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(f'automation_{session_id}', self.channel_name)
+            for session_id in removed
+        ))
+        self.subscriptions.difference_update(removed)
+        for session_id in removed:
+            self.last_seqs.pop(session_id, None)
+        await self.send(text_data=json.dumps({'type': 'unsubscribed', 'session_ids': removed}))
+
+    @staticmethod
+    def _event(event: dict, session_id: str) -> dict:
+        return {
+            'session_id': session_id,
+            'seq': event.get('seq'),
             'status': event['status'],
             'message': event['message'],
             'timestamp': event.get('timestamp'),
             'step_info': event.get('step_info')
-        }))
+        }
+
+    def _advance(self, session_id: str, seq: int):
+        self.last_seqs[session_id] = max(self.last_seqs.get(session_id, 0), seq)
+
+    def _queue(self, event: dict, session_id: str):
+        seq = event.get('seq')
+        if seq is not None:
+            # Already delivered by a replay
+            if seq <= self.last_seqs.get(session_id, 0):
+                return
+            self._advance(session_id, seq)
+        self.outbox.append(self._event(event, session_id))
+        if self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.flush_interval, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        """Send every queued status update in one frame."""
+        self.flush_handle = None
+        events, self.outbox = self.outbox, []
+        if events:
+            await self.send(text_data=json.dumps({'type': 'status_batch', 'events': events}))
+
+    async def automation_status(self, event):
+        """Queue a status update from one of the subscribed sessions."""
+        session_id = event.get('session_id')
+        if session_id in self.subscriptions:
+            self._queue(event, session_id)
+
+    async def automation_status_batch(self, event):
+        """Queue a batch of buffered status updates from one session."""
+        session_id = event.get('session_id')
+        if session_id in self.subscriptions:
+            for status_event in event['events']:
+                self._queue(status_event, session_id)
 
 
 # Utility functions for automation control
 def set_pause_flag(session_id: str, paused: bool = True):
-    """Set pause flag for a specific session."""
-    pause_flags[session_id] = paused
+    """Set pause flag for a specific session and wake any waiting automation."""
+    get_session_store().set_paused(session_id, paused)
 
 
 def get_pause_flag(session_id: str) -> bool:
     """Get pause flag for a specific session."""
-    return pause_flags.get(session_id, False)
+    return get_session_store().is_paused(session_id)
+
+
+def wait_for_resume(session_id: str, timeout: float = None) -> bool:
+    """Block until the session is resumed. Returns False on timeout."""
+    return get_session_store().wait_for_resume(session_id, timeout=timeout)
+
+
+async def wait_for_resume_async(session_id: str, timeout: float = None) -> bool:
+    """Await until the session is resumed without blocking the event loop."""
+    return await get_session_store().wait_for_resume_async(session_id, timeout=timeout)
 
 
 def clear_session(session_id: str):
-    """Clear session data."""
-    pause_flags.pop(session_id, None)
+    """Clear session pause flags; the session state is kept for status lookups."""
+    get_session_store().clear(session_id)
+
+
+def reset_session_state(session_id: str, **fields):
+    """Replace the stored state of a session, e.g. when it is queued again."""
+    get_session_store().reset_state(session_id, **fields)
+
+
+def update_session_state(session_id: str, **fields):
+    """Set fields of the stored session state; fields given as None are removed."""
+    get_session_store().update_state(session_id, **fields)
+
+
+def increment_session_state(session_id: str, field: str, amount: int = 1) -> int:
+    """Atomically increment an integer field of the stored session state."""
+    return get_session_store().increment_state(session_id, field, amount)
+
+
+def record_session_status(session_id: str, status: str, message: str, timestamp: str, step_info: dict = None,
+                          started_at: str = None):
+    """Apply a status update to the stored session state."""
+    get_session_store().record_status(session_id, status, message, timestamp, step_info, started_at)
+
+
+def get_session_states(session_ids: list[str]) -> dict:
+    """Stored state of many sessions, fetched in one store round trip."""
+    return get_session_store().get_states(session_ids)
+
+
+def append_session_events(session_id: str, events: list[dict]) -> list[dict]:
+    """Assign sequence numbers to status events and add them to the replay buffer."""
+    return get_session_store().append_events(session_id, events)
+
+
+def get_session_events_since(last_seqs: dict[str, int]) -> dict:
+    """Buffered status events after each session's last seen sequence number."""
+    return get_session_store().get_events_since(last_seqs)
@@ -0,0 +1,264 @@
+"""
+CDP screencast live view of an automation session's page.
+A low-bandwidth alternative to the VNC display stream: only the session's page is
+captured, frames are paced by client acknowledgements, and input is forwarded
+back to the page through CDP.
+
+The automation engine records its page's CDP target id in the session state;
+the WebSocket consumer attaches to that target through a per-process async
+Playwright connection, so the live view keeps streaming while the engine waits
+for the user to resume.
+"""
+
+import asyncio
+import time
+import weakref
+import logging
+from django.conf import settings
+from playwright.async_api import async_playwright, Browser, Page, Playwright
+from .browser_pool import BROWSER_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+LIVE_VIEW_ENABLED = getattr(settings, 'AUTOMATION_LIVE_VIEW', False)
+MAX_FPS = getattr(settings, 'AUTOMATION_LIVE_VIEW_MAX_FPS', 10)
+MAX_WIDTH = getattr(settings, 'AUTOMATION_LIVE_VIEW_MAX_WIDTH', 1280)
+MAX_HEIGHT = getattr(settings, 'AUTOMATION_LIVE_VIEW_MAX_HEIGHT', 800)
+
+# JPEG quality adapts to how fast the client acknowledges frames
+MIN_QUALITY = 30
+MAX_QUALITY = 80
+INITIAL_QUALITY = 60
+QUALITY_STEP = 10
+SLOW_ACK = 0.25  # seconds; slower average acks lower the quality
+FAST_ACK = 0.08  # seconds; faster average acks raise it
+ACK_TIMEOUT = 2  # seconds before an unacknowledged frame is given up on
+RETUNE_INTERVAL = 2  # seconds between quality changes
+
+# Input events accepted from the client, per kind: CDP method and allowed params
+INPUT_EVENTS = {
+    'mouse': ('Input.dispatchMouseEvent',
+              ('type', 'x', 'y', 'button', 'buttons', 'clickCount', 'deltaX', 'deltaY', 'modifiers')),
+    'key': ('Input.dispatchKeyEvent',
+            ('type', 'key', 'code', 'text', 'unmodifiedText', 'windowsVirtualKeyCode', 'modifiers')),
+    'text': ('Input.insertText', ('text',)),
+}
+
+
+def page_target_id(context, page) -> str:
+    """CDP target id of a page, from the thread that owns its sync Playwright connection."""
+    cdp = context.new_cdp_session(page)
+    try:
+        return cdp.send('Target.getTargetInfo')['targetInfo']['targetId']
+    finally:
+        cdp.detach()
+
+
+async def page_target_id_async(context, page) -> str:
+    """Async counterpart of page_target_id."""
+    cdp = await context.new_cdp_session(page)
+    try:
+        return (await cdp.send('Target.getTargetInfo'))['targetInfo']['targetId']
+    finally:
+        await cdp.detach()
+
+
+class LiveViewBrowser:
+    """
+    Async Playwright connection used to attach to automation pages by target id.
+    Pages created by other CDP clients show up in the connection's default
+    context, so any worker's page can be found.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.loop = asyncio.get_running_loop()
+        self.playwright: Playwright = None
+        self.browser: Browser = None
+        self._target_ids = weakref.WeakKeyDictionary()
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> Browser:
+        # Called with self._lock held
+        if self.browser is not None and self.browser.is_connected():
+            return self.browser
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.connect_over_cdp(
+            self.endpoint, timeout=BROWSER_CONNECT_TIMEOUT
+        )
+        self._target_ids = weakref.WeakKeyDictionary()
+        logger.info(f"Live view connected to browser at {self.endpoint}")
+        return self.browser
+
+    async def find_page(self, target_id: str) -> Page:
+        async with self._lock:
+            browser = await self._connect()
+            for context in browser.contexts:
+                for page in context.pages:
+                    if page not in self._target_ids:
+                        self._target_ids[page] = await page_target_id_async(context, page)
+                    if self._target_ids[page] == target_id:
+                        return page
+        return None
+
+
+_browsers: dict[str, LiveViewBrowser] = {}
+
+
+def get_live_view_browser(endpoint: str) -> LiveViewBrowser:
+    """The live view connection to ``endpoint`` for the running event loop."""
+    browser = _browsers.get(endpoint)
+    if browser is None or browser.loop is not asyncio.get_running_loop():
+        browser = _browsers[endpoint] = LiveViewBrowser(endpoint)
+    return browser
+
+
+class ScreencastSession:
+    """
+    One viewer's screencast of a page.
+
+    At most one frame is in flight: Chrome is only asked for the next frame once
+    the client acknowledges the previous one, so the frame rate follows the
+    client's throughput (capped at ``MAX_FPS``). JPEG quality is lowered when
+    acknowledgements are slow and raised again when they are fast.
+    """
+
+    def __init__(self, page: Page, send_frame):
+        self.page = page
+        self.send_frame = send_frame
+        self.quality = INITIAL_QUALITY
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.ack_seconds = None  # moving average
+        self.metadata = None  # of the latest frame; deviceWidth/deviceHeight are the page's CSS size
+        self._cdp = None
+        self._frame_id = 0
+        self._pending = None  # (frame_id, cdp_session_id, sent_at)
+        self._last_frame_at = 0.0
+        self._tuned_at = time.monotonic()
+        self._ack_timer: asyncio.TimerHandle = None
+
+    def _params(self) -> dict:
+        return {'format': 'jpeg', 'quality': self.quality, 'maxWidth': MAX_WIDTH, 'maxHeight': MAX_HEIGHT}
+
+    async def start(self):
+        self._cdp = await self.page.context.new_cdp_session(self.page)
+        self._cdp.on('Page.screencastFrame', self._on_frame)
+        await self._cdp.send('Page.startScreencast', self._params())
+
+    async def stop(self):
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+        if self._cdp is None:
+            return
+        cdp, self._cdp = self._cdp, None
+        try:
+            await cdp.send('Page.stopScreencast')
+            await cdp.detach()
+        except Exception as e:
+            logger.debug(f"Error stopping screencast: {str(e)}")
+
+    async def _on_frame(self, params: dict):
+        self._frame_id += 1
+        self._pending = (self._frame_id, params['sessionId'], time.monotonic())
+        self._last_frame_at = self._pending[2]
+        self.metadata = params.get('metadata') or self.metadata
+        loop = asyncio.get_running_loop()
+        self._ack_timer = loop.call_later(
+            ACK_TIMEOUT, lambda frame_id=self._frame_id: asyncio.ensure_future(self._expire(frame_id))
+        )
+        self.frames_sent += 1
+        await self.send_frame({
+            'frameId': self._frame_id,
+            'data': params['data'],
+            'metadata': params.get('metadata'),
+            'quality': self.quality,
+        })
+
+    async def ack(self, frame_id: int):
+        """Client acknowledgement of a frame; requests the next one."""
+        if self._pending is None or self._pending[0] != frame_id:
+            return
+        _, cdp_session_id, sent_at = self._pending
+        self._pending = None
+        self._ack_timer.cancel()
+        elapsed = time.monotonic() - sent_at
+        self.ack_seconds = elapsed if self.ack_seconds is None else 0.7 * self.ack_seconds + 0.3 * elapsed
+        await self._next_frame(cdp_session_id)
+
+    async def _expire(self, frame_id: int):
+        # The client never acknowledged the frame; count it and carry on slower
+        if self._pending is None or self._pending[0] != frame_id:
+            return
+        _, cdp_session_id, _ = self._pending
+        self._pending = None
+        self.frames_dropped += 1
+        self.ack_seconds = max(self.ack_seconds or 0.0, ACK_TIMEOUT)
+        await self._next_frame(cdp_session_id)
+
+    async def _next_frame(self, cdp_session_id: int):
+        if self._cdp is None:
+            return
+        # Cap the frame rate
+        wait = self._last_frame_at + 1 / MAX_FPS - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            if await self._retune():
+                return
+            await self._cdp.send('Page.screencastFrameAck', {'sessionId': cdp_session_id})
+        except Exception as e:
+            logger.debug(f"Error requesting next screencast frame: {str(e)}")
+
+    async def _retune(self) -> bool:
+        """Adjust quality from the ack average; returns True when the screencast was restarted."""
+        now = time.monotonic()
+        if now - self._tuned_at < RETUNE_INTERVAL or self.ack_seconds is None:
+            return False
+        if self.ack_seconds > SLOW_ACK and self.quality > MIN_QUALITY:
+            self.quality = max(self.quality - QUALITY_STEP, MIN_QUALITY)
+        elif self.ack_seconds < FAST_ACK and self.quality < MAX_QUALITY:
+            self.quality = min(self.quality + QUALITY_STEP, MAX_QUALITY)
+        else:
+            return False
+        self._tuned_at = now
+        # Quality only changes on a new screencast, which starts with a fresh frame
+        await self._cdp.send('Page.stopScreencast')
+        await self._cdp.send('Page.startScreencast', self._params())
+        return True
+
+    def _to_page(self, event: dict, params: dict) -> dict:
+        """
+        Map x/y from frame pixels to the page's CSS pixels. Chrome downscales
+        frames to fit MAX_WIDTH x MAX_HEIGHT; clients may also send the size
+        they display frames at as frameWidth/frameHeight.
+        """
+        if self.metadata is None or 'x' not in params or 'y' not in params:
+            return params
+        width, height = self.metadata['deviceWidth'], self.metadata['deviceHeight']
+        fit = min(1.0, MAX_WIDTH / width, MAX_HEIGHT / height)
+        frame_width = event.get('frameWidth') or width * fit
+        frame_height = event.get('frameHeight') or height * fit
+        return {**params, 'x': params['x'] * width / frame_width, 'y': params['y'] * height / frame_height}
+
+    async def dispatch_input(self, event: dict):
+        """Forward a client input event, e.g. {"kind": "mouse", "type": "mousePressed", "x": 10, "y": 20}."""
+        if self._cdp is None:
+            raise ValueError('Screencast is not running')
+        kind = event.get('kind')
+        if kind not in INPUT_EVENTS:
+            raise ValueError(f"Input kind must be one of {', '.join(INPUT_EVENTS)}")
+        method, fields = INPUT_EVENTS[kind]
+        params = {field: event[field] for field in fields if field in event}
+        if kind == 'mouse':
+            params = self._to_page(event, params)
+        await self._cdp.send(method, params)
+
+    def stats(self) -> dict:
+        return {
+            'quality': self.quality,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'avg_ack_ms': round(self.ack_seconds * 1000, 2) if self.ack_seconds is not None else None,
+        }
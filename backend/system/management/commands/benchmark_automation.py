@@ -0,0 +1,55 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from system.benchmark import AutomationBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the automation path against a local fake browser and an in-memory "
+        "channel layer: N concurrent sessions watched by M WebSocket clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=20, help='Concurrent automation sessions.')
+        parser.add_argument('--watchers', type=int, default=40,
+                            help='WebSocket watchers, spread round-robin over the sessions.')
+        parser.add_argument('--workers', type=int, default=4, help='Automation scheduler workers.')
+        parser.add_argument('--latency-ms', type=float, default=2.0,
+                            help='Simulated latency of each page call.')
+        parser.add_argument('--navigation-ms', type=float, default=20.0,
+                            help='Simulated latency of a navigation.')
+        parser.add_argument('--timeout', type=float, default=120.0, help='Seconds to wait for the sessions.')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Also measure Python allocations with tracemalloc (slower).')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['sessions'] < 1 or options['watchers'] < 0 or options['workers'] < 1:
+            raise CommandError('sessions and workers must be positive and watchers non-negative.')
+
+        benchmark = AutomationBenchmark(
+            sessions=options['sessions'],
+            watchers=options['watchers'],
+            workers=options['workers'],
+            latency=options['latency_ms'] / 1000,
+            navigation_latency=options['navigation_ms'] / 1000,
+            timeout=options['timeout'],
+            trace_memory=options['trace_memory'],
+        )
+        try:
+            report = benchmark.run()
+        except (RuntimeError, TimeoutError) as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for section, values in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(section))
+            if isinstance(values, list):
+                for row in values:
+                    self.stdout.write(f"  {row}")
+                continue
+            for key, value in values.items():
+                self.stdout.write(f"  {key}: {value}")
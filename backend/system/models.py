@@ -1,3 +1,23 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
-# Create your models here.
+from config.abstract_models import TimeStampedUUIDModel
+
+
+class AutomationPlan(TimeStampedUUIDModel):
+    """Stored declarative step plan, see system.plans for the format."""
+
+    name = models.SlugField(max_length=100, unique=True)
+    description = models.TextField(blank=True, default='')
+    steps = models.JSONField()
+
+    def clean(self):
+        from system.plans import PlanValidationError, compile_plan
+
+        try:
+            compile_plan({'name': self.name, 'steps': self.steps})
+        except PlanValidationError as e:
+            raise ValidationError({'steps': str(e)})
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,278 @@
+"""
+Declarative automation step plans.
+Plans are validated and compiled once, cached, and executed by the automation engines.
+
+A plan is a JSON document:
+    {"name": "my-flow", "steps": [
+        {"type": "navigate", "url": "https://example.com"},
+        {"type": "wait", "load_state": "networkidle"},
+        {"type": "fill", "selector": "#email", "value": "me@example.com"},
+        {"type": "click", "selectors": ["text=Submit", "button[type=submit]"]},
+        {"type": "extract", "name": "title", "selector": "h1"},
+        {"type": "screenshot", "name": "result", "full_page": true},
+        {"type": "pause", "message": "Check the result and click Resume."}
+    ]}
+
+Click, fill and wait take Playwright selectors; click and fill may list fallbacks.
+A selector wait may set "state" (attached, detached, visible or hidden; default visible).
+A step marked "optional" that times out is reported as a warning instead of failing the run.
+A pause that nobody resumes within its "timeout" (default AUTOMATION_PAUSE_TIMEOUT) fails the run.
+Extract selectors are plain CSS because extracts are resolved in the page itself.
+Screenshots are uploaded to object storage when the session ends (see system.artifacts).
+"""
+
+import re
+import threading
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STEP_TYPES = ('navigate', 'wait', 'click', 'fill', 'extract', 'screenshot', 'pause')
+LOAD_STATES = ('load', 'domcontentloaded', 'networkidle')
+ELEMENT_STATES = ('attached', 'detached', 'visible', 'hidden')
+DEFAULT_STEP_TIMEOUT = 10000  # ms
+DEFAULT_NAVIGATION_TIMEOUT = 30000  # ms
+# A paused session holds a worker; one nobody resumes is ended after this long
+DEFAULT_PAUSE_TIMEOUT = getattr(settings, 'AUTOMATION_PAUSE_TIMEOUT', 1800) * 1000  # ms
+
+STEP_OPTIONS = ('url', 'value', 'name', 'attribute', 'all', 'optional', 'load_state', 'state', 'ms', 'full_page')
+# Screenshot names become part of their object key
+ARTIFACT_NAME_PATTERN = re.compile(r'^[\w-]{1,64}$')
+
+DEFAULT_PLAN_NAME = 'add-route-demo'
+
+# Built-in plans, available without a database row
+BUILTIN_PLANS = {
+    DEFAULT_PLAN_NAME: {
+        'name': DEFAULT_PLAN_NAME,
+        'steps': [
+            {'type': 'navigate', 'url': 'https://angularformadd.netlify.app/',
+             'message': 'Navigating to target website...'},
+            # Some pages keep polling; don't fail the demo when they never go idle
+            {'type': 'wait', 'load_state': 'networkidle', 'optional': True},
+            {'type': 'pause',
+             'message': 'Handing over control. Please interact with the form and click Resume when ready.'},
+            {'type': 'click', 'optional': True, 'timeout': 5000, 'message': 'Clicking "Add Route" button...',
+             'selectors': [
+                 'text=Add Route',
+                 'button:has-text("Add Route")',
+                 'input[value="Add Route"]',
+                 '[onclick*="addRoute"]',
+                 '.btn:has-text("Add")'
+             ]},
+            # Observe result
+            {'type': 'wait', 'ms': 3000},
+        ],
+    },
+}
+
+
+class PlanValidationError(ValueError):
+    """Raised when a plan document is malformed."""
+
+
+class PlanNotFound(LookupError):
+    """Raised when no plan exists with the requested name."""
+
+
+class StepFailed(Exception):
+    """Raised by the engines when a required step cannot be completed."""
+
+
+class Step:
+    """A validated, normalized plan step."""
+
+    def __init__(self, index: int, type: str, message: str = None, timeout: int = DEFAULT_STEP_TIMEOUT,
+                 **options):
+        self.index = index
+        self.type = type
+        self.message = message
+        self.timeout = timeout
+        self.url = options.get('url')
+        self.selectors = options.get('selectors', [])
+        self.value = options.get('value')
+        self.name = options.get('name')
+        self.attribute = options.get('attribute')
+        self.all = options.get('all', False)
+        self.optional = options.get('optional', False)
+        self.load_state = options.get('load_state')
+        self.state = options.get('state', 'visible')
+        self.ms = options.get('ms')
+        self.full_page = options.get('full_page', False)
+
+    def info(self, total: int) -> dict:
+        """Step description attached to status updates."""
+        return {'index': self.index, 'type': self.type, 'total': total}
+
+
+class ExtractBatch:
+    """Consecutive extract steps, resolved together in one page round trip."""
+
+    type = 'extract_batch'
+
+    def __init__(self, steps: list[Step]):
+        self.steps = steps
+        self.index = steps[0].index
+
+    def script_args(self) -> list[dict]:
+        return [
+            {'name': s.name, 'selector': s.selectors[0], 'attribute': s.attribute, 'all': s.all}
+            for s in self.steps
+        ]
+
+    def info(self, total: int) -> dict:
+        return {'index': self.index, 'type': 'extract', 'total': total,
+                'names': [s.name for s in self.steps]}
+
+
+# Evaluated in the page for an ExtractBatch: one round trip for every field
+EXTRACT_SCRIPT = """
+(fields) => {
+    const read = (el, attribute) => el ? (attribute ? el.getAttribute(attribute) : el.innerText) : null;
+    const result = {};
+    for (const f of fields) {
+        result[f.name] = f.all
+            ? Array.from(document.querySelectorAll(f.selector)).map(el => read(el, f.attribute))
+            : read(document.querySelector(f.selector), f.attribute);
+    }
+    return result;
+}
+"""
+
+
+class CompiledPlan:
+    """Executable form of a plan: normalized steps with extracts batched."""
+
+    def __init__(self, name: str, steps: list[Step], version=None):
+        self.name = name
+        self.steps = steps
+        self.version = version
+        self.operations = self._batch(steps)
+
+    @staticmethod
+    def _batch(steps: list[Step]) -> list:
+        operations = []
+        for step in steps:
+            if step.type == 'extract' and operations and isinstance(operations[-1], ExtractBatch):
+                operations[-1].steps.append(step)
+            elif step.type == 'extract':
+                operations.append(ExtractBatch([step]))
+            else:
+                operations.append(step)
+        return operations
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def _require(condition: bool, index: int, message: str):
+    if not condition:
+        raise PlanValidationError(f"Step {index}: {message}")
+
+
+def _compile_step(index: int, raw: dict) -> Step:
+    _require(isinstance(raw, dict), index, "must be an object.")
+    step_type = raw.get('type')
+    _require(step_type in STEP_TYPES, index, f"type must be one of {', '.join(STEP_TYPES)}.")
+
+    options = {k: v for k, v in raw.items() if k in STEP_OPTIONS}
+    timeout = raw.get('timeout', {'navigate': DEFAULT_NAVIGATION_TIMEOUT, 'pause': DEFAULT_PAUSE_TIMEOUT}.get(
+        step_type, DEFAULT_STEP_TIMEOUT))
+    _require(isinstance(timeout, int) and timeout > 0, index, "timeout must be a positive integer (ms).")
+
+    # Accept a single "selector" as shorthand for a one-item "selectors" list
+    selectors = raw.get('selectors')
+    if selectors is None and raw.get('selector') is not None:
+        selectors = [raw['selector']]
+    if selectors is not None:
+        _require(isinstance(selectors, list) and selectors and all(isinstance(s, str) and s for s in selectors),
+                 index, "selectors must be a non-empty list of strings.")
+        options['selectors'] = selectors
+
+    if step_type == 'navigate':
+        _require(isinstance(raw.get('url'), str) and raw['url'].startswith(('http://', 'https://')),
+                 index, "navigate requires an http(s) url.")
+    elif step_type == 'wait':
+        given = [k for k in ('selectors', 'load_state', 'ms') if options.get(k) is not None]
+        _require(len(given) == 1, index, "wait requires exactly one of selector(s), load_state or ms.")
+        if 'load_state' in given:
+            _require(raw['load_state'] in LOAD_STATES, index, f"load_state must be one of {', '.join(LOAD_STATES)}.")
+        if 'ms' in given:
+            _require(isinstance(raw['ms'], int) and raw['ms'] >= 0, index, "ms must be a non-negative integer.")
+    elif step_type in ('click', 'fill'):
+        _require(bool(options.get('selectors')), index, f"{step_type} requires selector(s).")
+        if step_type == 'fill':
+            _require(isinstance(raw.get('value'), str), index, "fill requires a string value.")
+    elif step_type == 'extract':
+        _require(bool(options.get('selectors')), index, "extract requires a selector.")
+        _require(len(options['selectors']) == 1, index, "extract takes a single selector.")
+        _require(isinstance(raw.get('name'), str) and raw['name'], index, "extract requires a name.")
+    elif step_type == 'screenshot':
+        _require(isinstance(raw.get('name'), str) and ARTIFACT_NAME_PATTERN.match(raw['name']), index,
+                 "screenshot requires a name of up to 64 letters, digits, '_' or '-'.")
+        _require(isinstance(raw.get('full_page', False), bool), index, "full_page must be a boolean.")
+
+    if 'state' in options:
+        _require(step_type == 'wait' and bool(options.get('selectors')), index,
+                 "state only applies to a wait on selector(s).")
+        _require(options['state'] in ELEMENT_STATES, index, f"state must be one of {', '.join(ELEMENT_STATES)}.")
+
+    return Step(index, step_type, message=raw.get('message'), timeout=timeout, **options)
+
+
+def compile_plan(document: dict, version=None) -> CompiledPlan:
+    """Validate a plan document and compile it. Raises PlanValidationError."""
+    if not isinstance(document, dict):
+        raise PlanValidationError("Plan must be an object.")
+    steps = document.get('steps')
+    if not isinstance(steps, list) or not steps:
+        raise PlanValidationError("Plan requires a non-empty list of steps.")
+    compiled = [_compile_step(index, raw) for index, raw in enumerate(steps, start=1)]
+    for step_type in ('extract', 'screenshot'):
+        names = [s.name for s in compiled if s.type == step_type]
+        if len(names) != len(set(names)):
+            raise PlanValidationError(f"{step_type.title()} step names must be unique.")
+    return CompiledPlan(document.get('name', ''), compiled, version=version)
+
+
+_compiled_cache: dict[str, CompiledPlan] = {}
+_cache_lock = threading.Lock()
+
+
+def get_compiled_plan(name: str = None) -> CompiledPlan:
+    """
+    Return the compiled plan for ``name``, compiling it only when it is new or changed.
+    Built-in plans take precedence over stored AutomationPlan rows.
+    """
+    name = name or DEFAULT_PLAN_NAME
+
+    if name in BUILTIN_PLANS:
+        version = 'builtin'
+    else:
+        from .models import AutomationPlan
+
+        # Only the version is read on every call; the steps are loaded when it changed
+        plans = AutomationPlan.objects.filter(name=name)
+        version = plans.values_list('updated_at', flat=True).first()
+        if version is None:
+            raise PlanNotFound(f"Automation plan '{name}' does not exist.")
+
+    with _cache_lock:
+        cached = _compiled_cache.get(name)
+        if cached is not None and cached.version == version:
+            return cached
+
+    if name in BUILTIN_PLANS:
+        document = BUILTIN_PLANS[name]
+    else:
+        row = plans.values('steps', 'updated_at').first()
+        if row is None:
+            raise PlanNotFound(f"Automation plan '{name}' does not exist.")
+        version = row['updated_at']
+        document = {'name': name, 'steps': row['steps']}
+    compiled = compile_plan(document, version=version)
+    with _cache_lock:
+        _compiled_cache[name] = compiled
+    logger.info(f"Compiled automation plan '{name}' ({len(compiled)} steps)")
+    return compiled
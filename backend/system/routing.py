@@ -8,4 +8,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/automation/(?P<session_id>\w+)/$', consumers.AutomationConsumer.as_asgi()),
+    # One socket subscribing to many sessions, for dashboards
+    re_path(r'ws/automations/$', consumers.AutomationMultiplexConsumer.as_asgi()),
 ]
@@ -0,0 +1,144 @@
+"""
+Bounded scheduler for automation sessions.
+Runs automations on a fixed worker pool with a bounded queue and per-user caps.
+"""
+
+import queue
+import threading
+import time
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerFull(Exception):
+    """Raised when the automation queue has no room left."""
+
+
+class UserConcurrencyLimit(Exception):
+    """Raised when a user already has the maximum number of active automations."""
+
+
+class AutomationScheduler:
+    """
+    Fixed-size worker pool fed by a bounded FIFO queue.
+
+    Features:
+    - Configurable number of long-lived worker threads
+    - Backpressure: submissions are rejected once the queue is full
+    - Per-user cap on queued plus running automations
+    - Queue depth and wait time metrics
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 50, per_user_limit: int = 3,
+                 initializer=None, name: str = 'automation'):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.initializer = initializer
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._workers: list[threading.Thread] = []
+        self._active_per_user = defaultdict(int)
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def _ensure_workers(self):
+        # Called with self._lock held
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f'{self.name}-{len(self._workers)}',
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def submit(self, fn, *args, user_key=None) -> int:
+        """
+        Queue ``fn(*args)`` and return its position in the queue (0 = starting now).
+
+        Raises SchedulerFull or UserConcurrencyLimit instead of blocking.
+        """
+        with self._lock:
+            if user_key is not None and self.per_user_limit \
+                    and self._active_per_user[user_key] >= self.per_user_limit:
+                self._rejected += 1
+                raise UserConcurrencyLimit(
+                    f"At most {self.per_user_limit} automations may be active per user."
+                )
+            try:
+                self._queue.put_nowait((fn, args, user_key, time.monotonic()))
+            except queue.Full:
+                self._rejected += 1
+                raise SchedulerFull(f"Automation queue is full ({self.max_queue} waiting).")
+
+            if user_key is not None:
+                self._active_per_user[user_key] += 1
+            self._submitted += 1
+            self._ensure_workers()
+            # Idle workers will pick the job straight away
+            idle = max(self.max_workers - self._running, 0)
+            return max(self._queue.qsize() - idle, 0)
+
+    def _work(self):
+        if self.initializer is not None:
+            try:
+                self.initializer()
+            except Exception as e:
+                logger.warning(f"Scheduler worker initializer failed: {str(e)}")
+
+        while True:
+            fn, args, user_key, enqueued_at = self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self._running += 1
+                self._wait_total += waited
+                self._wait_last = waited
+                self._wait_max = max(self._wait_max, waited)
+
+            failed = False
+            try:
+                fn(*args)
+            except Exception as e:
+                failed = True
+                logger.error(f"Scheduled automation failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    if failed:
+                        self._failed += 1
+                    if user_key is not None:
+                        self._active_per_user[user_key] -= 1
+                        if self._active_per_user[user_key] <= 0:
+                            del self._active_per_user[user_key]
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                'workers': self.max_workers,
+                'running': self._running,
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.max_queue,
+                'per_user_limit': self.per_user_limit,
+                'submitted': self._submitted,
+                'rejected': self._rejected,
+                'completed': self._completed,
+                'failed': self._failed,
+                'wait_seconds': {
+                    'last': round(self._wait_last, 4),
+                    'avg': round(self._wait_total / started, 4) if started else 0.0,
+                    'max': round(self._wait_max, 4),
+                },
+            }
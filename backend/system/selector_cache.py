@@ -0,0 +1,219 @@
+"""
+Learned selector resolution for plan steps with fallback locators.
+Remembers which candidate selector matched per site and step, tries it first on
+the next run, and resolves cache misses in as few page round trips as possible.
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from collections import defaultdict
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+SELECTOR_CACHE_TTL = getattr(settings, 'AUTOMATION_SELECTOR_CACHE_TTL', 86400)
+
+# Checks every candidate in one evaluate call. Returns true/false per candidate,
+# or null when the selector is Playwright-only syntax the page can't evaluate
+# (">>", nth=, ...) and has to be checked through the Playwright selector engine.
+# "text=" and "css:has-text()" candidates are matched here like Playwright does:
+# case-insensitive substring, or exact for quoted text, on whitespace-normalized
+# text, with "text=" resolving to the innermost matching elements.
+VISIBILITY_SCRIPT = """
+(selectors) => {
+    const visible = (el) => {
+        const style = window.getComputedStyle(el);
+        const rect = el.getBoundingClientRect();
+        return style.visibility !== 'hidden' && style.display !== 'none' && rect.width > 0 && rect.height > 0;
+    };
+    const normalize = (text) => text.replace(/\\s+/g, ' ').trim();
+    const textOf = (el) => normalize(
+        el.tagName === 'INPUT' && ['button', 'submit', 'reset'].includes(el.type) ? el.value : el.textContent || ''
+    );
+    const matches = (el, text, exact) => exact ? textOf(el) === text : textOf(el).toLowerCase().includes(text);
+    const unquote = (text) => {
+        const quoted = text.match(/^(["'])(.*)\\1$/s);
+        return quoted ? [normalize(quoted[2]), true] : [normalize(text).toLowerCase(), false];
+    };
+    const query = (selector) => {
+        if (selector.includes('>>')) {
+            throw new Error('Chained selectors are resolved by Playwright');
+        }
+        let match = selector.match(/^text=(.*)$/s);
+        if (match) {
+            const [text, exact] = unquote(match[1]);
+            return Array.from(document.body.querySelectorAll('*')).filter((el) =>
+                matches(el, text, exact) && !Array.from(el.children).some((child) => matches(child, text, exact)));
+        }
+        match = selector.match(/^(.*):has-text\\((["'])(.*)\\2\\)$/s);
+        if (match) {
+            const text = normalize(match[3]).toLowerCase();
+            return Array.from(document.querySelectorAll(match[1] || '*')).filter((el) => matches(el, text, false));
+        }
+        return Array.from(document.querySelectorAll(selector));
+    };
+    return selectors.map((selector) => {
+        try {
+            return query(selector).some(visible);
+        } catch (e) {
+            return null;
+        }
+    });
+}
+"""
+
+
+def _is_text_selector(selector: str) -> bool:
+    return selector.startswith('text=') or ':has-text(' in selector
+
+
+def _text_misses(selectors: list[str], in_page: list) -> list[int]:
+    """Text candidates the page found no visible match for."""
+    return [index for index, selector in enumerate(selectors) if in_page[index] is False and _is_text_selector(selector)]
+
+
+class SelectorStats:
+    """Hit/miss counts and resolution times for one (site, plan, step)."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        avg_hit = self.hit_seconds / self.hits if self.hits else 0.0
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'avg_hit_ms': round(avg_hit * 1000, 2),
+            'avg_miss_ms': round(avg_miss * 1000, 2),
+            # Each hit saves roughly what an average miss would have cost
+            'time_saved_ms': round(max(avg_miss - avg_hit, 0.0) * self.hits * 1000, 2) if self.misses else 0.0,
+        }
+
+
+class SelectorCache:
+    """
+    Learned selector per (site, plan, step), stored in the default Django cache
+    (Redis, see CACHES) so every worker process and Celery worker learns from
+    the others. Resolution statistics are kept per process.
+    """
+
+    KEY_PREFIX = 'automation_selector'
+
+    def __init__(self, ttl: int = SELECTOR_CACHE_TTL):
+        self.ttl = ttl
+        self._stats = defaultdict(SelectorStats)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def step_key(page_url: str, plan_name: str, step_index: int) -> str:
+        site = urlparse(page_url).netloc or 'local'
+        return f'{site}:{plan_name}:{step_index}'
+
+    def get(self, step_key: str):
+        return cache.get(f'{self.KEY_PREFIX}:{step_key}')
+
+    def remember(self, step_key: str, selector: str):
+        cache.set(f'{self.KEY_PREFIX}:{step_key}', selector, self.ttl)
+
+    def record(self, step_key: str, hit: bool, seconds: float):
+        with self._lock:
+            stats = self._stats[step_key]
+            if hit:
+                stats.hits += 1
+                stats.hit_seconds += seconds
+            else:
+                stats.misses += 1
+                stats.miss_seconds += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {step_key: stats.as_dict() for step_key, stats in self._stats.items()}
+
+
+selector_cache = SelectorCache()
+
+
+def _first_visible(selectors: list[str], in_page: list, engine_results: dict):
+    for index, selector in enumerate(selectors):
+        visible = in_page[index] if in_page[index] is not None else engine_results.get(index, False)
+        if visible:
+            return selector
+    return None
+
+
+def resolve_selector(page, step, plan_name: str):
+    """
+    Return (selector, locator) for the step's first visible candidate, or (None, None).
+    Call once the page shows at least one candidate.
+    """
+    started = time.monotonic()
+    step_key = selector_cache.step_key(page.url, plan_name, step.index)
+
+    cached = selector_cache.get(step_key)
+    if cached in step.selectors and page.locator(cached).first.is_visible():
+        selector_cache.record(step_key, True, time.monotonic() - started)
+        return cached, page.locator(cached).first
+
+    in_page = page.evaluate(VISIBILITY_SCRIPT, step.selectors)
+    engine_results = {}
+    for index, selector in enumerate(step.selectors):
+        if in_page[index] is True:
+            break
+        if in_page[index] is None:
+            engine_results[index] = page.locator(selector).first.is_visible()
+            if engine_results[index]:
+                break
+
+    selector = _first_visible(step.selectors, in_page, engine_results)
+    if selector is None:
+        # In-page text matching approximates Playwright's; let the engine confirm its misses
+        selector = next(
+            (step.selectors[i] for i in _text_misses(step.selectors, in_page)
+             if page.locator(step.selectors[i]).first.is_visible()),
+            None
+        )
+    selector_cache.record(step_key, False, time.monotonic() - started)
+    if selector is None:
+        return None, None
+    selector_cache.remember(step_key, selector)
+    return selector, page.locator(selector).first
+
+
+async def resolve_selector_async(page, step, plan_name: str):
+    """Async counterpart of resolve_selector; Playwright-only candidates are checked concurrently."""
+    started = time.monotonic()
+    step_key = selector_cache.step_key(page.url, plan_name, step.index)
+
+    cached = await asyncio.to_thread(selector_cache.get, step_key)
+    if cached in step.selectors and await page.locator(cached).first.is_visible():
+        selector_cache.record(step_key, True, time.monotonic() - started)
+        return cached, page.locator(cached).first
+
+    in_page = await page.evaluate(VISIBILITY_SCRIPT, step.selectors)
+    engine_indexes = [index for index, visible in enumerate(in_page) if visible is None]
+    engine_visible = await asyncio.gather(
+        *(page.locator(step.selectors[index]).first.is_visible() for index in engine_indexes)
+    )
+    engine_results = dict(zip(engine_indexes, engine_visible))
+
+    selector = _first_visible(step.selectors, in_page, engine_results)
+    if selector is None:
+        # In-page text matching approximates Playwright's; let the engine confirm its misses
+        misses = _text_misses(step.selectors, in_page)
+        confirmed = await asyncio.gather(*(page.locator(step.selectors[i]).first.is_visible() for i in misses))
+        selector = next((step.selectors[i] for i, visible in zip(misses, confirmed) if visible), None)
+    selector_cache.record(step_key, False, time.monotonic() - started)
+    if selector is None:
+        return None, None
+    await asyncio.to_thread(selector_cache.remember, step_key, selector)
+    return selector, page.locator(selector).first
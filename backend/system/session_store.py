@@ -0,0 +1,435 @@
+"""
+Shared state store for automation sessions.
+Holds pause flags, session state (status, current step, timestamps, last
+message) and a replay buffer of recent status events in Redis so the WebSocket
+consumers, API views and automation workers can run in different processes,
+and wakes paused automations on resume.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import logging
+from collections import defaultdict, deque
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = getattr(settings, 'AUTOMATION_STATE_BACKEND', 'redis')
+STATE_REDIS_URL = getattr(settings, 'AUTOMATION_STATE_REDIS_URL', 'redis://redis:6379/1')
+STATE_TTL = getattr(settings, 'AUTOMATION_STATE_TTL', 86400)
+REPLAY_BUFFER_SIZE = getattr(settings, 'AUTOMATION_STATUS_REPLAY_SIZE', 200)
+# Safety net: paused waiters re-check the flag this often even without a notification
+PAUSE_RECHECK_INTERVAL = 30
+
+TERMINAL_STATUSES = ('completed', 'error')
+INT_STATE_FIELDS = ('current_step', 'total_steps')
+# State fields shown to watchers; owner, live view target and delivery counts stay internal
+PUBLIC_STATE_FIELDS = (
+    'status', 'message', 'plan', 'current_step', 'step_type', 'total_steps',
+    'queued_at', 'started_at', 'updated_at', 'finished_at', 'is_paused'
+)
+
+
+def build_state_update(status: str, message: str, timestamp: str, step_info: dict = None) -> dict:
+    """State fields written for one status update."""
+    fields = {'status': status, 'message': message, 'updated_at': timestamp}
+    if step_info and 'index' in step_info:
+        fields['current_step'] = step_info['index']
+        fields['step_type'] = step_info.get('type')
+        fields['total_steps'] = step_info.get('total')
+    if status in TERMINAL_STATUSES:
+        fields['finished_at'] = timestamp
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+def public_state(state: dict) -> dict:
+    """The watcher-visible fields of a stored session state."""
+    return {field: state[field] for field in PUBLIC_STATE_FIELDS if field in state}
+
+
+class _LoopEvent:
+    """Waiter that can be set from any thread and awaited on its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+async def _wait_until_resumed(waiter: _LoopEvent, is_paused, timeout: float = None) -> bool:
+    # is_paused is an async callable so backends can keep network I/O off the loop
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while await is_paused():
+        wait = PAUSE_RECHECK_INTERVAL
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            wait = min(remaining, wait)
+        try:
+            await asyncio.wait_for(waiter.event.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+        waiter.event.clear()
+    return True
+
+
+class LocalSessionStore:
+    """
+    In-process session store.
+
+    Used in tests and single-process development; it is only shared between
+    threads of the same process.
+    """
+
+    def __init__(self):
+        self._paused = {}
+        self._states = {}
+        self._events = defaultdict(lambda: deque(maxlen=REPLAY_BUFFER_SIZE))
+        self._seqs = defaultdict(int)
+        self._condition = threading.Condition()
+        self._async_waiters = defaultdict(set)
+
+    def _notify(self, session_id: str):
+        # Called with self._condition held
+        self._condition.notify_all()
+        for waiter in self._async_waiters.get(session_id, ()):
+            waiter.set()
+
+    def set_paused(self, session_id: str, paused: bool = True):
+        with self._condition:
+            self._paused[session_id] = paused
+            self._notify(session_id)
+
+    def is_paused(self, session_id: str) -> bool:
+        return self._paused.get(session_id, False)
+
+    def wait_for_resume(self, session_id: str, timeout: float = None) -> bool:
+        """Block until the session is no longer paused. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self.is_paused(session_id), timeout=timeout)
+
+    async def wait_for_resume_async(self, session_id: str, timeout: float = None) -> bool:
+        """Await until the session is no longer paused without blocking the event loop."""
+        waiter = _LoopEvent(asyncio.get_running_loop())
+        with self._condition:
+            self._async_waiters[session_id].add(waiter)
+
+        async def is_paused():
+            return self.is_paused(session_id)
+
+        try:
+            return await _wait_until_resumed(waiter, is_paused, timeout)
+        finally:
+            with self._condition:
+                self._async_waiters[session_id].discard(waiter)
+                if not self._async_waiters[session_id]:
+                    del self._async_waiters[session_id]
+
+    def clear(self, session_id: str):
+        with self._condition:
+            self._paused.pop(session_id, None)
+            self._notify(session_id)
+
+    def reset_state(self, session_id: str, **fields):
+        with self._condition:
+            self._states[session_id] = dict(fields)
+
+    def update_state(self, session_id: str, **fields):
+        """Set state fields; fields given as None are removed."""
+        with self._condition:
+            state = self._states.setdefault(session_id, {})
+            for field, value in fields.items():
+                if value is None:
+                    state.pop(field, None)
+                else:
+                    state[field] = value
+
+    def increment_state(self, session_id: str, field: str, amount: int = 1) -> int:
+        """Atomically add ``amount`` to an integer state field and return the new value."""
+        with self._condition:
+            state = self._states.setdefault(session_id, {})
+            state[field] = int(state.get(field, 0)) + amount
+            return state[field]
+
+    def record_status(self, session_id: str, status: str, message: str, timestamp: str, step_info: dict = None,
+                      started_at: str = None):
+        """Apply a status update; ``started_at`` (default ``timestamp``) is only set once."""
+        with self._condition:
+            state = self._states.setdefault(session_id, {})
+            state.setdefault('started_at', started_at or timestamp)
+            state.update(build_state_update(status, message, timestamp, step_info))
+
+    def get_state(self, session_id: str) -> dict:
+        return self.get_states([session_id])[session_id]
+
+    def get_states(self, session_ids: list[str]) -> dict:
+        with self._condition:
+            return {
+                session_id: {**self._states.get(session_id, {}), 'is_paused': self.is_paused(session_id)}
+                for session_id in session_ids
+            }
+
+    def append_events(self, session_id: str, events: list[dict]) -> list[dict]:
+        """Number status events with the session's next sequence numbers and buffer them."""
+        with self._condition:
+            first = self._seqs[session_id] + 1
+            self._seqs[session_id] += len(events)
+            sequenced = [{**event, 'seq': seq} for seq, event in enumerate(events, start=first)]
+            self._events[session_id].extend(sequenced)
+            return sequenced
+
+    def get_events_since(self, last_seqs: dict[str, int]) -> dict:
+        """Buffered events newer than each session's last seen sequence number."""
+        with self._condition:
+            return {
+                session_id: [e for e in self._events.get(session_id, ()) if e['seq'] > last_seq]
+                for session_id, last_seq in last_seqs.items()
+            }
+
+
+class RedisSessionStore:
+    """
+    Redis-backed session store shared by every daphne and worker process.
+
+    Pause changes are published on a per-session channel. One listener thread
+    per process receives them and wakes the local waiters, so resuming is
+    immediate without polling.
+    """
+
+    KEY_PREFIX = 'automation'
+
+    def __init__(self, url: str = STATE_REDIS_URL):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self._waiters = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._subscribed = threading.Event()
+
+    def _pause_key(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}:{session_id}:paused'
+
+    def _state_key(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}:{session_id}:state'
+
+    def _seq_key(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}:{session_id}:seq'
+
+    def _events_key(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}:{session_id}:events'
+
+    def _channel(self, session_id: str) -> str:
+        return f'{self.KEY_PREFIX}:{session_id}:pause-events'
+
+    def _notify(self, session_id: str):
+        self.redis.publish(self._channel(session_id), '1')
+
+    def set_paused(self, session_id: str, paused: bool = True):
+        if paused:
+            self.redis.set(self._pause_key(session_id), '1')
+        else:
+            self.redis.delete(self._pause_key(session_id))
+        self._notify(session_id)
+
+    def is_paused(self, session_id: str) -> bool:
+        return bool(self.redis.exists(self._pause_key(session_id)))
+
+    def _ensure_listener(self):
+        # Called with self._lock held
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._subscribed.clear()
+        self._listener = threading.Thread(target=self._listen, name='automation-pause-listener', daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        prefix, suffix = f'{self.KEY_PREFIX}:', ':pause-events'
+        try:
+            pubsub.psubscribe(self._channel('*'))
+            self._subscribed.set()
+            for message in pubsub.listen():
+                channel = message.get('channel', '')
+                session_id = channel[len(prefix):-len(suffix)]
+                with self._lock:
+                    events = list(self._waiters.get(session_id, ()))
+                for event in events:
+                    event.set()
+        except Exception as e:
+            logger.error(f"Pause listener stopped: {str(e)}")
+            # Wake everyone so they fall back to re-checking the flag
+            with self._lock:
+                events = [event for waiters in self._waiters.values() for event in waiters]
+            for event in events:
+                event.set()
+        finally:
+            pubsub.close()
+
+    def wait_for_resume(self, session_id: str, timeout: float = None) -> bool:
+        """Block until the session is no longer paused. Returns False on timeout."""
+        event = threading.Event()
+        with self._lock:
+            self._waiters[session_id].add(event)
+            self._ensure_listener()
+        # Don't miss a resume published before the listener is subscribed
+        self._subscribed.wait(5)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while self.is_paused(session_id):
+                wait = PAUSE_RECHECK_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    wait = min(remaining, wait)
+                event.wait(wait)
+                event.clear()
+            return True
+        finally:
+            with self._lock:
+                self._waiters[session_id].discard(event)
+                if not self._waiters[session_id]:
+                    del self._waiters[session_id]
+
+    async def wait_for_resume_async(self, session_id: str, timeout: float = None) -> bool:
+        """Await until the session is no longer paused without blocking the event loop."""
+        waiter = _LoopEvent(asyncio.get_running_loop())
+        with self._lock:
+            self._waiters[session_id].add(waiter)
+            self._ensure_listener()
+        await asyncio.to_thread(self._subscribed.wait, 5)
+
+        async def is_paused():
+            return await asyncio.to_thread(self.is_paused, session_id)
+
+        try:
+            return await _wait_until_resumed(waiter, is_paused, timeout)
+        finally:
+            with self._lock:
+                self._waiters[session_id].discard(waiter)
+                if not self._waiters[session_id]:
+                    del self._waiters[session_id]
+
+    def clear(self, session_id: str):
+        self.redis.delete(self._pause_key(session_id))
+        self._notify(session_id)
+
+    def reset_state(self, session_id: str, **fields):
+        key = self._state_key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.delete(key)
+        if fields:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, STATE_TTL)
+        pipe.execute()
+
+    def update_state(self, session_id: str, **fields):
+        """Set state fields; fields given as None are removed."""
+        key = self._state_key(session_id)
+        updates = {field: value for field, value in fields.items() if value is not None}
+        removed = [field for field, value in fields.items() if value is None]
+        pipe = self.redis.pipeline()
+        if updates:
+            pipe.hset(key, mapping=updates)
+        if removed:
+            pipe.hdel(key, *removed)
+        pipe.expire(key, STATE_TTL)
+        pipe.execute()
+
+    def increment_state(self, session_id: str, field: str, amount: int = 1) -> int:
+        """Atomically add ``amount`` to an integer state field and return the new value."""
+        key = self._state_key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.hincrby(key, field, amount)
+        pipe.expire(key, STATE_TTL)
+        value, _ = pipe.execute()
+        return value
+
+    def record_status(self, session_id: str, status: str, message: str, timestamp: str, step_info: dict = None,
+                      started_at: str = None):
+        """Apply a status update; ``started_at`` (default ``timestamp``) is only set once."""
+        key = self._state_key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.hsetnx(key, 'started_at', started_at or timestamp)
+        pipe.hset(key, mapping=build_state_update(status, message, timestamp, step_info))
+        pipe.expire(key, STATE_TTL)
+        pipe.execute()
+
+    def get_state(self, session_id: str) -> dict:
+        return self.get_states([session_id])[session_id]
+
+    def get_states(self, session_ids: list[str]) -> dict:
+        """Fetch state and pause flags for many sessions in one round trip."""
+        pipe = self.redis.pipeline()
+        for session_id in session_ids:
+            pipe.hgetall(self._state_key(session_id))
+            pipe.exists(self._pause_key(session_id))
+        results = pipe.execute()
+
+        states = {}
+        for index, session_id in enumerate(session_ids):
+            state, paused = results[2 * index], results[2 * index + 1]
+            for field in INT_STATE_FIELDS:
+                if field in state:
+                    state[field] = int(state[field])
+            state['is_paused'] = bool(paused)
+            states[session_id] = state
+        return states
+
+    def append_events(self, session_id: str, events: list[dict]) -> list[dict]:
+        """
+        Number status events with the session's next sequence numbers and push
+        them onto its capped replay list. INCRBY reserves the whole range at once,
+        so sequence numbers stay unique even with several writers.
+        """
+        last = self.redis.incrby(self._seq_key(session_id), len(events))
+        first = last - len(events) + 1
+        sequenced = [{**event, 'seq': seq} for seq, event in enumerate(events, start=first)]
+
+        key = self._events_key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.rpush(key, *(json.dumps(event) for event in sequenced))
+        pipe.ltrim(key, -REPLAY_BUFFER_SIZE, -1)
+        pipe.expire(key, STATE_TTL)
+        pipe.expire(self._seq_key(session_id), STATE_TTL)
+        pipe.execute()
+        return sequenced
+
+    def get_events_since(self, last_seqs: dict[str, int]) -> dict:
+        """Buffered events newer than each session's last seen sequence number, in one round trip."""
+        pipe = self.redis.pipeline()
+        for session_id in last_seqs:
+            pipe.lrange(self._events_key(session_id), 0, -1)
+        results = pipe.execute()
+
+        missed = {}
+        for (session_id, last_seq), raw_events in zip(last_seqs.items(), results):
+            events = (json.loads(raw) for raw in raw_events)
+            missed[session_id] = [e for e in events if e['seq'] > last_seq]
+        return missed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Return the process-wide session store selected by AUTOMATION_STATE_BACKEND."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalSessionStore() if STATE_BACKEND == 'local' else RedisSessionStore()
+        return _store
+
+
+def set_session_store(store):
+    """Swap the process-wide store, e.g. for a LocalSessionStore in tests."""
+    global _store
+    with _store_lock:
+        _store = store
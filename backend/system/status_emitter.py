@@ -0,0 +1,183 @@
+"""
+Buffered, coalescing status emitter for automation sessions.
+Takes channel-layer round trips off the automation hot path.
+"""
+
+import asyncio
+import threading
+import logging
+from datetime import datetime
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .consumers import append_session_events, record_session_status
+from .session_store import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, 'AUTOMATION_STATUS_FLUSH_INTERVAL', 0.05)
+# Consecutive updates with these statuses collapse to the latest one within a flush
+COALESCIBLE_STATUSES = {'connecting', 'running'}
+
+_loop: asyncio.AbstractEventLoop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop that performs all status flushes."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='automation-status-emitter', daemon=True).start()
+        return _loop
+
+
+def _has_span(event: dict) -> bool:
+    return bool(event['step_info']) and 'span' in event['step_info']
+
+
+def coalesce(events: list[dict]) -> list[dict]:
+    """
+    Drop progress updates superseded by a later update with the same status.
+    Updates reporting a finished step's span are always kept.
+    """
+    result = []
+    for event in events:
+        if result and event['status'] in COALESCIBLE_STATUSES and result[-1]['status'] == event['status'] \
+                and not _has_span(result[-1]):
+            result[-1] = event
+        else:
+            result.append(event)
+    return result
+
+
+class StatusEmitter:
+    """
+    Per-session status buffer flushed in batches on a background loop.
+
+    ``emit`` only appends to the buffer and never waits on the channel layer.
+    Events are flushed every ``flush_interval`` seconds in order; rapid
+    progress updates are coalesced and the rest are sent as one batch message.
+    Each flush numbers its events into the session's replay buffer before
+    sending them, and writes the latest status to the shared session store.
+    The first terminal status recorded is final for the session's state.
+    """
+
+    def __init__(self, session_id: str, channel_layer=None, flush_interval: float = FLUSH_INTERVAL):
+        self.session_id = session_id
+        self.group_name = f'automation_{session_id}'
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.flush_interval = flush_interval
+        self.emitted = 0
+        self.sent = 0
+        self.finished = False
+        self._pending: list[dict] = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._send_lock = asyncio.Lock()
+
+    def emit(self, status: str, message: str, step_info: dict = None):
+        """Queue a status update; returns immediately."""
+        event = {
+            "status": status,
+            "message": message,
+            "timestamp": datetime.now().isoformat(),
+            "step_info": step_info
+        }
+        with self._lock:
+            self._pending.append(event)
+            self.emitted += 1
+            if self._scheduled:
+                return
+            self._scheduled = True
+        loop = _get_loop()
+        loop.call_soon_threadsafe(loop.call_later, self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        # The send lock keeps batches in emission order
+        async with self._send_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+                self._scheduled = False
+            if events:
+                events = await self._sequence(coalesce(events))
+                await self._send(events)
+                await self._record_state(events)
+
+    async def _sequence(self, events: list[dict]) -> list[dict]:
+        # Reconnecting clients replay from the buffer by sequence number
+        try:
+            return await asyncio.to_thread(append_session_events, self.session_id, events)
+        except Exception as e:
+            logger.error(f"Failed to buffer status for {self.session_id}: {str(e)}")
+            return events
+
+    async def _record_state(self, events: list[dict]):
+        # One state write per batch: the latest update plus the latest step seen. The engines
+        # follow completed/error with 'disconnected', often in the same batch; that must not
+        # replace the terminal status or leave finished_at unset.
+        if self.finished:
+            return
+        terminal = next((i for i, e in enumerate(events) if e['status'] in TERMINAL_STATUSES), None)
+        if terminal is not None:
+            self.finished = True
+            events = events[:terminal + 1]
+        last = events[-1]
+        step_info = next((e['step_info'] for e in reversed(events) if e['step_info'] and 'index' in e['step_info']), None)
+        try:
+            await asyncio.to_thread(
+                record_session_status, self.session_id, last['status'], last['message'], last['timestamp'], step_info,
+                # The session started with the batch's first update, not its last
+                events[0]['timestamp']
+            )
+        except Exception as e:
+            logger.error(f"Failed to record state for {self.session_id}: {str(e)}")
+
+    async def _send(self, events: list[dict]):
+        try:
+            if len(events) == 1:
+                message = {"type": "automation_status", "session_id": self.session_id, **events[0]}
+            else:
+                message = {"type": "automation_status_batch", "session_id": self.session_id, "events": events}
+            await self.channel_layer.group_send(self.group_name, message)
+            self.sent += len(events)
+            logger.debug(f"Flushed {len(events)} status updates to {self.session_id}")
+        except Exception as e:
+            logger.error(f"Failed to send status for {self.session_id}: {str(e)}")
+
+    def flush(self, timeout: float = 5):
+        """Block until every queued update has been sent."""
+        future = asyncio.run_coroutine_threadsafe(self._flush(), _get_loop())
+        try:
+            future.result(timeout)
+        except Exception as e:
+            logger.error(f"Failed to flush status for {self.session_id}: {str(e)}")
+
+    async def flush_async(self):
+        """Await until every queued update has been sent, from any event loop."""
+        future = asyncio.run_coroutine_threadsafe(self._flush(), _get_loop())
+        await asyncio.wrap_future(future)
+
+
+def send_session_error(session_id: str, message: str):
+    """Send and record a final error status for a session that has no running engine."""
+    try:
+        timestamp = datetime.now().isoformat()
+        [event] = append_session_events(session_id, [{
+            "status": "error",
+            "message": message,
+            "timestamp": timestamp,
+            "step_info": None
+        }])
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(
+            f'automation_{session_id}',
+            {"type": "automation_status", "session_id": session_id, **event}
+        )
+        record_session_status(session_id, 'error', message, timestamp)
+    except Exception:
+        pass  # Fail silently if we can't even send error status
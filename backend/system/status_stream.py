@@ -0,0 +1,184 @@
+"""
+Server-Sent Events streams of automation session status.
+Read-only watchers share one channel-layer subscription per session and process
+instead of a WebSocket and group membership each.
+"""
+
+import asyncio
+import time
+import logging
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from config.renderers import format_sse
+from .consumers import get_session_events_since, get_session_states
+from .session_store import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = getattr(settings, 'AUTOMATION_SSE_HEARTBEAT_INTERVAL', 15)
+# Events buffered per watcher; a watcher that falls further behind is disconnected
+# and catches up from the replay buffer when it reconnects
+WATCHER_QUEUE_SIZE = 256
+RECONNECT_DELAY = 3000  # ms
+# Streams are closed after this many seconds so watchers of sessions that never finish
+# don't hold a connection forever; an EventSource reconnects and resumes
+MAX_STREAM_LIFETIME = getattr(settings, 'AUTOMATION_SSE_MAX_LIFETIME', 3600)
+# The engines send 'disconnected' once the page is released, after completed or error
+END_STATUSES = (*TERMINAL_STATUSES, 'disconnected')
+
+
+class StatusHub:
+    """
+    Fans status events out to every local watcher of a session.
+
+    The hub owns one channel-layer channel for the process and joins a session's
+    group when the session gets its first watcher, so thousands of watchers cost
+    one group membership per watched session.
+    """
+
+    def __init__(self, channel_layer=None):
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.loop = asyncio.get_running_loop()
+        self.channel_name = None
+        self._watchers = defaultdict(set)
+        self._lock = asyncio.Lock()
+        self._reader: asyncio.Task = None
+
+    async def _ensure_reader(self):
+        # Called with self._lock held
+        if self.channel_name is None:
+            self.channel_name = await self.channel_layer.new_channel('automation-sse.')
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self.channel_layer.receive(self.channel_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Status hub receive failed: {str(e)}")
+                await asyncio.sleep(1)
+                continue
+            if message.get('type') == 'automation_status_batch':
+                events = message['events']
+            elif message.get('type') == 'automation_status':
+                events = [message]
+            else:
+                continue
+            for queue in list(self._watchers.get(message.get('session_id'), ())):
+                for event in events:
+                    self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: dict):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow: drop what is queued and tell the stream to end
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    async def subscribe(self, session_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=WATCHER_QUEUE_SIZE)
+        async with self._lock:
+            await self._ensure_reader()
+            if not self._watchers[session_id]:
+                await self.channel_layer.group_add(f'automation_{session_id}', self.channel_name)
+            self._watchers[session_id].add(queue)
+        return queue
+
+    async def unsubscribe(self, session_id: str, queue: asyncio.Queue):
+        async with self._lock:
+            watchers = self._watchers.get(session_id)
+            if watchers is None:
+                return
+            watchers.discard(queue)
+            if not watchers:
+                del self._watchers[session_id]
+                await self.channel_layer.group_discard(f'automation_{session_id}', self.channel_name)
+
+
+_hub: StatusHub = None
+
+
+def get_status_hub() -> StatusHub:
+    """The hub of the running event loop; created on first use."""
+    global _hub
+    if _hub is None or _hub.loop is not asyncio.get_running_loop():
+        _hub = StatusHub()
+    return _hub
+
+
+def _status_event(event: dict) -> str:
+    return format_sse({
+        'status': event['status'],
+        'message': event['message'],
+        'timestamp': event.get('timestamp'),
+        'step_info': event.get('step_info')
+    }, event='status', id=event.get('seq'))
+
+
+async def stream_session_status(session_id: str, last_seq: int = None, serialize_state=None):
+    """
+    Async generator of SSE messages for one session.
+
+    Without ``last_seq`` the stream starts with a "state" event holding the
+    current state; with it, the buffered events after ``last_seq`` are replayed
+    first (plus a "state" event when some were no longer buffered). Status
+    events carry their sequence number as the event id, so a reconnecting
+    EventSource resumes through Last-Event-ID. The stream ends with an "end"
+    event once the session completes or fails, and is closed without one after
+    MAX_STREAM_LIFETIME seconds.
+    """
+    serialize_state = serialize_state or (lambda session_id, state: state)
+    hub = get_status_hub()
+    # Subscribe before reading the store so nothing slips between the two
+    queue = await hub.subscribe(session_id)
+    try:
+        yield format_sse(retry=RECONNECT_DELAY, comment='connected')
+        deadline = time.monotonic() + MAX_STREAM_LIFETIME
+
+        # A finished session's state keeps its terminal status, so late watchers end at once
+        state = (await sync_to_async(get_session_states)([session_id]))[session_id]
+        status = state.get('status')
+        send_state = last_seq is None
+        if last_seq is not None:
+            missed = (await sync_to_async(get_session_events_since)({session_id: last_seq}))[session_id]
+            send_state = bool(missed) and missed[0]['seq'] > last_seq + 1
+            for event in missed:
+                yield _status_event(event)
+                last_seq = event['seq']
+                if status not in TERMINAL_STATUSES:
+                    status = event['status']
+        if send_state:
+            yield format_sse(serialize_state(session_id, state), event='state')
+
+        while status not in END_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.info(f"SSE stream of {session_id} reached its maximum lifetime; closing")
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), min(HEARTBEAT_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                yield format_sse(comment='heartbeat')
+                continue
+            if event is None:
+                logger.info(f"SSE watcher of {session_id} fell behind; closing stream")
+                return
+            seq = event.get('seq')
+            if seq is not None:
+                if last_seq is not None and seq <= last_seq:
+                    continue
+                last_seq = seq
+            status = event['status']
+            yield _status_event(event)
+
+        yield format_sse({'status': status}, event='end')
+    finally:
+        await hub.unsubscribe(session_id, queue)
@@ -0,0 +1,112 @@
+"""
+Per-step timing spans for automation sessions.
+Each plan step (and the browser connect phase) is timed as a span attached to
+its status update, and recorded in a shared latency histogram by plan and step
+so slow steps can be found across runs.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+from config.metrics import metrics, parse_series
+
+STEP_METRIC = 'automation_step_duration_seconds'
+# Steps range from quick clicks to pauses waiting on a person
+STEP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StepSpan:
+    """Start, end, duration and outcome of one step or phase of a session."""
+
+    def __init__(self, plan_name: str, step, step_type: str):
+        self.plan_name = plan_name
+        self.step = step
+        self.step_type = step_type
+        self.started_at = datetime.now().isoformat()
+        self.ended_at = None
+        self.outcome = None
+        self.seconds = None
+        self._started = time.monotonic()
+
+    def finish(self, outcome: str = 'ok') -> dict:
+        """Close the span, record it in the step histogram and return it as a dict."""
+        self.seconds = time.monotonic() - self._started
+        self.ended_at = datetime.now().isoformat()
+        self.outcome = outcome
+        metrics.observe(
+            STEP_METRIC,
+            self.seconds,
+            {'plan': self.plan_name, 'step': self.step, 'type': self.step_type, 'outcome': outcome},
+            buckets=STEP_BUCKETS,
+        )
+        return self.as_dict()
+
+    def as_dict(self) -> dict:
+        return {
+            'step': self.step,
+            'type': self.step_type,
+            'started_at': self.started_at,
+            'ended_at': self.ended_at,
+            'duration_ms': round(self.seconds * 1000, 2) if self.seconds is not None else None,
+            'outcome': self.outcome,
+        }
+
+
+def _quantile(q: float, buckets: list[tuple[float, float]], count: float) -> float:
+    # Linear interpolation inside the bucket holding the quantile, as Prometheus' histogram_quantile
+    rank = q * count
+    lower, below = 0.0, 0.0
+    for upper, cumulative in buckets:
+        if cumulative >= rank:
+            if upper == float('inf'):
+                return lower
+            in_bucket = cumulative - below
+            return lower + (upper - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+        lower, below = upper, cumulative
+    return lower
+
+
+def step_latency_summary(plan_name: str = None, step=None) -> list[dict]:
+    """
+    Aggregated step durations across every process and run, per plan, step and
+    outcome, optionally filtered by plan and step. Quantiles are estimated from
+    the histogram buckets.
+    """
+    groups = defaultdict(lambda: {'buckets': [], 'count': 0.0, 'sum': 0.0})
+    for series, value in metrics.totals().items():
+        name, labels = parse_series(series)
+        if not name.startswith(STEP_METRIC):
+            continue
+        if plan_name is not None and labels.get('plan') != plan_name:
+            continue
+        if step is not None and labels.get('step') != str(step):
+            continue
+        key = (labels.get('plan'), labels.get('step'), labels.get('type'), labels.get('outcome'))
+        if name == f'{STEP_METRIC}_bucket':
+            groups[key]['buckets'].append((float(labels['le']), value))
+        elif name == f'{STEP_METRIC}_count':
+            groups[key]['count'] = value
+        elif name == f'{STEP_METRIC}_sum':
+            groups[key]['sum'] = value
+
+    summary = []
+    for (plan, step_label, step_type, outcome), group in groups.items():
+        count = group['count']
+        if not count:
+            continue
+        buckets = sorted(group['buckets'])
+        row = {
+            'plan': plan,
+            'step': step_label,
+            'type': step_type,
+            'outcome': outcome,
+            'count': int(count),
+            'avg_ms': round(group['sum'] / count * 1000, 2),
+        }
+        for q in QUANTILES:
+            row[f'p{int(q * 100)}_ms'] = round(_quantile(q, buckets, count) * 1000, 2)
+        summary.append(row)
+    # Slowest steps first
+    summary.sort(key=lambda row: row['avg_ms'], reverse=True)
+    return summary
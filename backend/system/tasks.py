@@ -0,0 +1,43 @@
+"""
+Celery tasks for running browser automations on dedicated worker nodes.
+"""
+
+import logging
+from celery import shared_task
+from django.conf import settings
+from .automation import run_automation_script
+from .status_emitter import send_session_error
+from .consumers import increment_session_state
+
+logger = logging.getLogger(__name__)
+
+AUTOMATION_BROWSERS = getattr(settings, 'AUTOMATION_BROWSERS', {})
+# Deliveries of one session's task before it is given up on, e.g. when its browser keeps
+# crashing the worker
+MAX_DELIVERIES = getattr(settings, 'AUTOMATION_TASK_MAX_DELIVERIES', 3)
+
+
+@shared_task(
+    bind=True,
+    ignore_result=True,
+    # Only ack once the run finishes so a crashed worker's session is redelivered
+    acks_late=True,
+    reject_on_worker_lost=True
+)
+def run_automation_task(self, session_id: str, plan_name: str = None, browser: str = 'default'):
+    """Run one automation session against the browser this worker's queue is bound to."""
+    endpoint = AUTOMATION_BROWSERS.get(browser)
+    if endpoint is None:
+        logger.error(f"Unknown automation browser '{browser}' for session: {session_id}")
+        return
+    # Counted in the session state, which StartAutomationView resets for every new run
+    deliveries = increment_session_state(session_id, 'deliveries')
+    if deliveries > MAX_DELIVERIES:
+        logger.error(f"Giving up on session {session_id} after {MAX_DELIVERIES} deliveries")
+        send_session_error(
+            session_id, f"Automation stopped: its worker was lost {MAX_DELIVERIES} times while running it."
+        )
+        return
+    if deliveries > 1:
+        logger.warning(f"Re-running automation for session {session_id} after worker loss ({deliveries})")
+    run_automation_script(session_id, plan_name, endpoint)
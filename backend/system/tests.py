@@ -1,3 +1,432 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.utils import presigned_url_cache
+from . import plans, status_stream
+from .artifacts import new_trace_path, upload_session_artifacts
+from .async_automation import AsyncAutomationRunner
+from .authentication import MULTIPLEX_TICKET_SESSION, issue_session_ticket
+from .consumers import AutomationMultiplexConsumer
+from .models import AutomationPlan
+from .plans import PlanValidationError, Step, compile_plan
+from .selector_cache import resolve_selector, selector_cache
+from .session_store import LocalSessionStore, get_session_store, set_session_store
+from .status_emitter import StatusEmitter, coalesce
+from .views import AutomationStatusStreamView, serialize_session_state
+
+
+class FakeChannelLayer:
+    """Channel layer that records group messages instead of delivering them."""
+
+    def __init__(self):
+        self.sent = []
+        self.groups = {}
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+    async def group_add(self, group, channel):
+        self.groups.setdefault(group, set()).add(channel)
+
+    async def group_discard(self, group, channel):
+        self.groups.get(group, set()).discard(channel)
+
+    async def new_channel(self, prefix='specific.'):
+        return f'{prefix}fake'
+
+    async def receive(self, channel):
+        await asyncio.Event().wait()
+
+
+class SessionStoreTestCase(SimpleTestCase):
+    """Runs each test against a fresh in-process session store."""
+
+    def setUp(self):
+        self.previous_store = get_session_store()
+        self.store = LocalSessionStore()
+        set_session_store(self.store)
+
+    def tearDown(self):
+        set_session_store(self.previous_store)
+
+
+class StatusRecordingTests(SessionStoreTestCase):
+
+    def emitter(self):
+        # A long interval keeps every emit in the batch sent by flush()
+        return StatusEmitter('session1', FakeChannelLayer(), flush_interval=60)
+
+    def test_disconnected_after_completed_in_one_batch_keeps_completed(self):
+        emitter = self.emitter()
+        emitter.emit('running', 'Step 1', {'index': 1, 'type': 'navigate', 'total': 1})
+        emitter.emit('completed', 'Done', {'plan': 'demo', 'spans': []})
+        emitter.emit('disconnected', 'Browser disconnected.')
+        emitter.flush()
+
+        state = self.store.get_state('session1')
+        self.assertEqual(state['status'], 'completed')
+        self.assertEqual(state['message'], 'Done')
+        self.assertEqual(state['current_step'], 1)
+        self.assertIsNotNone(state.get('finished_at'))
+
+    def test_started_at_is_the_first_update_of_the_first_batch(self):
+        emitter = self.emitter()
+        emitter.emit('connecting', 'Connecting to browser...')
+        emitter.emit('connected', 'Browser connected successfully.')
+        emitter.flush()
+
+        state = self.store.get_state('session1')
+        first, last = (e['timestamp'] for e in self.store.get_events_since({'session1': 0})['session1'])
+        self.assertEqual(state['started_at'], first)
+        self.assertEqual(state['updated_at'], last)
+
+    def test_disconnected_in_a_later_batch_keeps_error(self):
+        emitter = self.emitter()
+        emitter.emit('error', 'Automation error: boom')
+        emitter.flush()
+        emitter.emit('disconnected', 'Browser disconnected.')
+        emitter.flush()
+
+        state = self.store.get_state('session1')
+        self.assertEqual(state['status'], 'error')
+        self.assertIsNotNone(state.get('finished_at'))
+
+    def test_every_event_is_still_sent(self):
+        emitter = self.emitter()
+        emitter.emit('completed', 'Done')
+        emitter.emit('disconnected', 'Browser disconnected.')
+        emitter.flush()
+
+        [(group, message)] = emitter.channel_layer.sent
+        self.assertEqual(group, 'automation_session1')
+        self.assertEqual([e['status'] for e in message['events']], ['completed', 'disconnected'])
+
+
+class CoalesceTests(SimpleTestCase):
+
+    @staticmethod
+    def event(status, message, step_info=None):
+        return {'status': status, 'message': message, 'timestamp': None, 'step_info': step_info}
+
+    def test_consecutive_progress_updates_collapse_to_the_latest(self):
+        events = [self.event('running', 'a'), self.event('running', 'b'), self.event('paused', 'c')]
+        self.assertEqual([e['message'] for e in coalesce(events)], ['b', 'c'])
+
+    def test_span_updates_are_kept(self):
+        span = {'step': 1, 'duration_ms': 3}
+        events = [
+            self.event('running', 'Clicking...', {'index': 1}),
+            self.event('running', 'Step 1 ok', {'index': 1, 'span': span}),
+            self.event('running', 'Step 2 ok', {'index': 2, 'span': {**span, 'step': 2}}),
+            self.event('running', 'Filling...', {'index': 3}),
+            self.event('running', 'Filled', {'index': 3}),
+        ]
+        self.assertEqual([e['message'] for e in coalesce(events)], ['Step 1 ok', 'Step 2 ok', 'Filled'])
+
+
+class StatusStreamTests(SessionStoreTestCase):
+
+    def collect(self, **kwargs):
+        async def run():
+            status_stream._hub = status_stream.StatusHub(FakeChannelLayer())
+            return [message async for message in status_stream.stream_session_status('session1', **kwargs)]
+        return async_to_sync(run)()
+
+    @staticmethod
+    def events(messages):
+        parsed = []
+        for message in messages:
+            fields = dict(line.split(': ', 1) for line in message.strip().splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                parsed.append((fields['event'], json.loads(fields['data'])))
+        return parsed
+
+    def test_stream_of_a_finished_session_ends_at_once(self):
+        self.store.record_status('session1', 'completed', 'Done', '2025-01-01T00:00:00')
+
+        events = self.events(self.collect())
+        self.assertEqual([name for name, _ in events], ['state', 'end'])
+        self.assertEqual(events[-1][1], {'status': 'completed'})
+
+    def test_replay_ending_in_disconnected_ends_the_stream(self):
+        self.store.record_status('session1', 'running', 'Step 1', '2025-01-01T00:00:00')
+        self.store.append_events('session1', [
+            {'status': 'running', 'message': 'Step 1', 'timestamp': None, 'step_info': None},
+            {'status': 'completed', 'message': 'Done', 'timestamp': None, 'step_info': None},
+            {'status': 'disconnected', 'message': 'Browser disconnected.', 'timestamp': None, 'step_info': None},
+        ])
+
+        events = self.events(self.collect(last_seq=1))
+        self.assertEqual([name for name, _ in events], ['status', 'status', 'end'])
+        self.assertEqual(events[-1][1], {'status': 'completed'})
+
+
+class StatusStreamViewTests(SessionStoreTestCase):
+
+    def test_header_authenticated_user_cannot_stream_another_users_session(self):
+        self.store.reset_state('session1', owner='1', status='running')
+        request = APIRequestFactory().get('/api/system/automations/status/session1/stream/')
+        force_authenticate(request, user=get_user_model()(pk=2))
+
+        response = AutomationStatusStreamView.as_view()(request, session_id='session1')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MultiplexConsumerTests(SessionStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store.reset_state('mine', owner='1', status='running', target_id='T1',
+                               cdp_endpoint='http://browser:9222')
+        self.store.reset_state('theirs', owner='2', status='running')
+
+    def run_socket(self, user_pk, commands):
+        """Connect as ``user_pk`` (None for no ticket), send ``commands`` and collect one reply each."""
+        async def run():
+            query = f'?ticket={issue_session_ticket(get_user_model()(pk=user_pk), MULTIPLEX_TICKET_SESSION)}' \
+                if user_pk is not None else ''
+            communicator = WebsocketCommunicator(AutomationMultiplexConsumer.as_asgi(), f'/ws/automations/{query}')
+            connected, code = await communicator.connect()
+            if not connected:
+                return code, []
+            replies = []
+            try:
+                for command in commands:
+                    await communicator.send_json_to(command)
+                    replies.append(await communicator.receive_json_from())
+            finally:
+                await communicator.disconnect()
+            return None, replies
+        return async_to_sync(run)()
+
+    def test_connection_without_credentials_is_rejected(self):
+        code, _ = self.run_socket(None, [])
+        self.assertEqual(code, 4403)
+
+    def test_session_ticket_does_not_open_the_multiplexed_socket(self):
+        async def run():
+            ticket = issue_session_ticket(get_user_model()(pk=1), 'mine')
+            communicator = WebsocketCommunicator(AutomationMultiplexConsumer.as_asgi(), f'/ws/automations/?ticket={ticket}')
+            return await communicator.connect()
+        self.assertEqual(async_to_sync(run)(), (False, 4403))
+
+    def test_other_users_sessions_are_forbidden(self):
+        _, [frame] = self.run_socket(1, [{'command': 'subscribe', 'sessionIds': ['mine', 'theirs', 'new']}])
+
+        self.assertEqual(frame['session_ids'], ['mine', 'new'])
+        self.assertEqual(frame['forbidden'], ['theirs'])
+        self.assertNotIn('theirs', frame['states'])
+
+    def test_states_hide_internal_fields(self):
+        _, [frame] = self.run_socket(1, [{'command': 'subscribe', 'sessionIds': ['mine']}])
+
+        state = frame['states']['mine']
+        self.assertEqual(state['status'], 'running')
+        for field in ('owner', 'target_id', 'cdp_endpoint'):
+            self.assertNotIn(field, state)
+
+    def test_only_the_owner_may_pause(self):
+        # An unstarted session can be watched, but not controlled, by anyone
+        _, [_, error] = self.run_socket(2, [
+            {'command': 'subscribe', 'sessionIds': ['new']},
+            {'command': 'pause', 'sessionId': 'new'},
+        ])
+        self.assertEqual(error['type'], 'error')
+
+        _, [_, error] = self.run_socket(2, [
+            {'command': 'subscribe', 'sessionIds': ['theirs']},
+            {'command': 'pause', 'sessionId': 'mine'},
+        ])
+        self.assertEqual(error['message'], 'Not subscribed to session: mine')
+        self.assertFalse(self.store.get_state('mine').get('is_paused'))
+
+
+class CompiledPlanCacheTests(TestCase):
+
+    def setUp(self):
+        self.plan = AutomationPlan.objects.create(name='cached', steps=[{'type': 'wait', 'ms': 10}])
+        plans._compiled_cache.pop('cached', None)
+
+    def test_cache_hit_reads_only_the_version(self):
+        with self.assertNumQueries(2):
+            compiled = plans.get_compiled_plan('cached')
+        with self.assertNumQueries(1):
+            self.assertIs(plans.get_compiled_plan('cached'), compiled)
+
+    def test_changed_plan_is_recompiled(self):
+        compiled = plans.get_compiled_plan('cached')
+        self.plan.steps = [{'type': 'wait', 'ms': 20}]
+        self.plan.save()
+
+        recompiled = plans.get_compiled_plan('cached')
+        self.assertIsNot(recompiled, compiled)
+        self.assertEqual(recompiled.steps[0].ms, 20)
+
+
+class AsyncRunnerTests(SessionStoreTestCase):
+
+    def test_critical_failure_records_an_error(self):
+        runner = AsyncAutomationRunner()
+        runner._active = 1
+        with mock.patch('system.async_automation.AsyncAutomationEngine', side_effect=RuntimeError('boom')), \
+                mock.patch('system.status_emitter.get_channel_layer', return_value=FakeChannelLayer()):
+            async_to_sync(runner._run)('session1', None, plan=object())
+
+        state = self.store.get_state('session1')
+        self.assertEqual(state['status'], 'error')
+        self.assertEqual(state['message'], 'Critical automation error: boom')
+        self.assertIsNotNone(state.get('finished_at'))
+        self.assertEqual(runner.stats()['running'], 0)
+
+
+class FakeSelectorPage:
+    """Page whose visibility script returns ``in_page``; the Playwright engine sees ``engine_visible``."""
+
+    url = 'https://example.com/form'
+
+    def __init__(self, in_page, engine_visible=()):
+        self.in_page = in_page
+        self.engine_visible = set(engine_visible)
+        self.evaluations = 0
+        self.engine_checks = []
+
+    def evaluate(self, script, selectors):
+        self.evaluations += 1
+        return self.in_page
+
+    def locator(self, selector):
+        page = self
+
+        class Locator:
+            first = None
+
+            def is_visible(self):
+                page.engine_checks.append(selector)
+                return selector in page.engine_visible
+
+        locator = Locator()
+        locator.first = locator
+        return locator
+
+
+class ResolveSelectorTests(SimpleTestCase):
+
+    selectors = ['text=Add Route', 'button:has-text("Add Route")', '#add']
+
+    def resolve(self, page, index=1):
+        step = Step(index, 'click', selectors=self.selectors)
+        selector_cache.remember(selector_cache.step_key(page.url, 'tests', index), None)
+        return resolve_selector(page, step, 'tests')[0]
+
+    def test_text_selectors_are_resolved_in_one_page_round_trip(self):
+        page = FakeSelectorPage([False, True, True])
+
+        self.assertEqual(self.resolve(page), 'button:has-text("Add Route")')
+        self.assertEqual(page.evaluations, 1)
+        self.assertEqual(page.engine_checks, [])
+
+    def test_unsupported_syntax_is_checked_by_the_engine_in_order(self):
+        page = FakeSelectorPage([None, True, True], engine_visible=['text=Add Route'])
+
+        self.assertEqual(self.resolve(page, index=2), 'text=Add Route')
+        self.assertEqual(page.engine_checks, ['text=Add Route'])
+
+    def test_engine_confirms_text_misses_when_nothing_matched_in_page(self):
+        page = FakeSelectorPage([False, False, False], engine_visible=['button:has-text("Add Route")'])
+
+        self.assertEqual(self.resolve(page, index=3), 'button:has-text("Add Route")')
+        self.assertEqual(page.engine_checks, ['text=Add Route', 'button:has-text("Add Route")'])
+
+
+class ScreenshotStepTests(SimpleTestCase):
+
+    def test_screenshot_step_is_compiled(self):
+        plan = compile_plan({'steps': [{'type': 'screenshot', 'name': 'result', 'full_page': True}]})
+        self.assertEqual((plan.steps[0].name, plan.steps[0].full_page), ('result', True))
+
+    def test_screenshot_names_must_be_safe_and_unique(self):
+        for steps in (
+            [{'type': 'screenshot', 'name': '../result'}],
+            [{'type': 'screenshot', 'name': 'a'}, {'type': 'screenshot', 'name': 'a'}],
+        ):
+            with self.assertRaises(PlanValidationError):
+                compile_plan({'steps': steps})
+
+
+class SessionArtifactTests(SessionStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        presigned_url_cache.clear()
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_url.side_effect = lambda **kwargs: f"signed:{kwargs['Params']['Key']}"
+        settings = {'public_base': '', 'bucket_name': 'bucket', 'presign_expires': 3600}
+        patcher = mock.patch('core.utils.get_s3_client', return_value=(self.s3, settings))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_screenshots_are_uploaded_in_one_batch_and_listed_in_the_status(self):
+        with mock.patch('system.artifacts.upload_many_to_minio_and_get_urls') as upload_many:
+            upload_session_artifacts('session1', [('before', b'png1'), ('after', b'png2')])
+
+        [(payloads,), _] = upload_many.call_args
+        self.assertEqual([key for _, _, key in payloads],
+                         ['automation/session1/before.png', 'automation/session1/after.png'])
+        artifacts = serialize_session_state('session1', self.store.get_state('session1'))['artifacts']
+        self.assertEqual(artifacts, {'screenshots': {
+            'before': 'signed:automation/session1/before.png',
+            'after': 'signed:automation/session1/after.png',
+        }})
+
+    def test_repeated_status_reads_reuse_presigned_urls(self):
+        with mock.patch('system.artifacts.upload_many_to_minio_and_get_urls'):
+            upload_session_artifacts('session1', [('result', b'png')])
+
+        for _ in range(3):
+            serialize_session_state('session1', self.store.get_state('session1'))
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 1)
+
+    def test_failed_upload_records_nothing(self):
+        with mock.patch('system.artifacts.upload_many_to_minio_and_get_urls', side_effect=OSError('down')):
+            self.assertEqual(upload_session_artifacts('session1', [('result', b'png')]), {})
+
+        self.assertIsNone(serialize_session_state('session1', self.store.get_state('session1'))['artifacts'])
+
+    def trace_file(self):
+        path = new_trace_path('session1')
+        with open(path, 'wb') as trace:
+            trace.write(b'trace')
+        return path
+
+    def test_trace_is_streamed_from_its_file_and_removed(self):
+        path = self.trace_file()
+        streamed = []
+
+        def upload_stream(source, content_type, object_key=None, **kwargs):
+            streamed.append((source.read(), content_type, object_key))
+
+        with mock.patch('system.artifacts.upload_stream_to_minio_and_get_url', side_effect=upload_stream):
+            upload_session_artifacts('session1', [], trace_path=path)
+
+        self.assertEqual(streamed, [(b'trace', 'application/zip', 'automation/session1/trace.zip')])
+        self.assertFalse(os.path.exists(path))
+        artifacts = serialize_session_state('session1', self.store.get_state('session1'))['artifacts']
+        self.assertEqual(artifacts, {'trace': 'signed:automation/session1/trace.zip'})
+
+    def test_failed_trace_upload_keeps_the_screenshots_and_removes_the_file(self):
+        path = self.trace_file()
+        with mock.patch('system.artifacts.upload_many_to_minio_and_get_urls'), \
+                mock.patch('system.artifacts.upload_stream_to_minio_and_get_url', side_effect=OSError('down')):
+            artifacts = upload_session_artifacts('session1', [('result', b'png')], trace_path=path)
+
+        self.assertEqual(list(artifacts), ['screenshots'])
+        self.assertFalse(os.path.exists(path))
@@ -8,6 +8,13 @@ from .views import (
     StartAutomationView,
     StopAutomationView, 
     AutomationStatusView,
+    AutomationStatusStreamView,
+    SessionTicketView,
+    MultiplexTicketView,
+    BulkAutomationStatusView,
+    AutomationSchedulerStatsView,
+    SelectorCacheStatsView,
+    StepLatencyView,
     BrowserHealthView,
     TestBrowserConnectionView
 )
@@ -16,7 +23,16 @@ urlpatterns = [
     # Automation control endpoints
     path('automations/start/', StartAutomationView.as_view(), name='start-automation'),
     path('automations/stop/', StopAutomationView.as_view(), name='stop-automation'),
+    path('automations/ticket/', MultiplexTicketView.as_view(), name='automation-multiplex-ticket'),
+    path('automations/status/', BulkAutomationStatusView.as_view(), name='automation-status-bulk'),
     path('automations/status/<str:session_id>/', AutomationStatusView.as_view(), name='automation-status'),
+    path('automations/status/<str:session_id>/stream/', AutomationStatusStreamView.as_view(),
+         name='automation-status-stream'),
+    path('automations/status/<str:session_id>/ticket/', SessionTicketView.as_view(),
+         name='automation-session-ticket'),
+    path('automations/scheduler/', AutomationSchedulerStatsView.as_view(), name='automation-scheduler'),
+    path('automations/selectors/', SelectorCacheStatsView.as_view(), name='automation-selectors'),
+    path('automations/steps/', StepLatencyView.as_view(), name='automation-steps'),
     
     # Browser health and testing endpoints
     path('browser/health/', BrowserHealthView.as_view(), name='browser-health'),
@@ -3,30 +3,55 @@ API Views for Interactive Browser Automation.
 Provides endpoints for starting, stopping, and monitoring automation sessions.
 """
 
-import threading
 import logging
+from datetime import datetime
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.http import JsonResponse
-from .automation import run_automation_script, test_browser_connection, get_browser_status
-from .consumers import get_pause_flag, set_pause_flag, clear_session
+from rest_framework.settings import api_settings
+from django.http import JsonResponse, StreamingHttpResponse
+from config.renderers import SSERenderer
+from .artifacts import artifact_urls
+from .authentication import (
+    MULTIPLEX_TICKET_SESSION, TICKET_TTL, SessionTicketAuthentication, issue_session_ticket
+)
+from .automation import submit_automation, get_automation_stats, test_browser_connection, get_browser_status
+from .consumers import clear_session, get_session_states, reset_session_state
+from .plans import PlanNotFound, PlanValidationError, get_compiled_plan
+from .scheduler import SchedulerFull, UserConcurrencyLimit
+from .selector_cache import selector_cache
+from .status_stream import stream_session_status
+from .step_timing import step_latency_summary
 
 logger = logging.getLogger(__name__)
 
 
+def session_owned_by_other(session_id: str, user) -> bool:
+    """True when the session was started by a different user."""
+    owner = get_session_states([session_id])[session_id].get('owner')
+    return owner is not None and owner != str(user.pk)
+
+
+def session_forbidden_response() -> Response:
+    return Response(
+        {"error": "This automation session belongs to another user."},
+        status=status.HTTP_403_FORBIDDEN
+    )
+
+
 class StartAutomationView(APIView):
     """
     Start a new interactive browser automation session.
     
     POST /api/system/automations/start/
-    Body: {"sessionId": "unique_session_id"}
+    Body: {"sessionId": "unique_session_id", "plan": "optional_plan_name"}
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
         session_id = request.data.get('sessionId')
+        plan_name = request.data.get('plan')
         
         if not session_id:
             return Response(
@@ -35,25 +60,51 @@ class StartAutomationView(APIView):
             )
         
         try:
+            # Validate and compile the plan up front; compiled plans are cached
+            plan = get_compiled_plan(plan_name)
+        except (PlanNotFound, PlanValidationError) as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            if session_owned_by_other(session_id, request.user):
+                return session_forbidden_response()
+
             # Clear any existing session data
             clear_session(session_id)
+            reset_session_state(
+                session_id,
+                owner=str(request.user.pk),
+                status='queued',
+                message='Automation task initiated.',
+                plan=plan.name,
+                queued_at=datetime.now().isoformat()
+            )
             
-            # Run the automation script in a background thread to avoid blocking the request
-            thread = threading.Thread(
-                target=run_automation_script, 
-                args=(session_id,),
-                daemon=True  # Thread will die when main thread dies
+            # Queue the automation script on a pooled worker to avoid blocking the request
+            queue_position = submit_automation(
+                session_id, user_key=request.user.pk, plan_name=plan_name, plan=plan
             )
-            thread.start()
             
-            logger.info(f"Automation started for session: {session_id}")
+            logger.info(f"Automation queued for session: {session_id} at position {queue_position}")
             
             return Response({
                 "status": "success",
                 "message": "Automation task initiated.",
-                "sessionId": session_id
+                "sessionId": session_id,
+                "queuePosition": queue_position
             })
             
+        except (SchedulerFull, UserConcurrencyLimit) as e:
+            logger.warning(f"Automation rejected for {session_id}: {str(e)}")
+            return Response(
+                {"error": str(e), "scheduler": get_automation_stats()},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": "5"}
+            )
+            
         except Exception as e:
             logger.error(f"Failed to start automation for {session_id}: {str(e)}")
             return Response(
@@ -81,6 +132,9 @@ class StopAutomationView(APIView):
             )
         
         try:
+            if session_owned_by_other(session_id, request.user):
+                return session_forbidden_response()
+
             # Clear session to stop automation
             clear_session(session_id)
             
@@ -100,6 +154,26 @@ class StopAutomationView(APIView):
             )
 
 
+def serialize_session_state(session_id: str, state: dict) -> dict:
+    """API representation of a stored session state."""
+    is_paused = state.get('is_paused', False)
+    return {
+        "sessionId": session_id,
+        "isPaused": is_paused,
+        "status": "paused" if is_paused else state.get('status', 'unknown'),
+        "message": state.get('message'),
+        "plan": state.get('plan'),
+        "currentStep": state.get('current_step'),
+        "stepType": state.get('step_type'),
+        "totalSteps": state.get('total_steps'),
+        "queuedAt": state.get('queued_at'),
+        "startedAt": state.get('started_at'),
+        "updatedAt": state.get('updated_at'),
+        "finishedAt": state.get('finished_at'),
+        "artifacts": artifact_urls(state),
+    }
+
+
 class AutomationStatusView(APIView):
     """
     Get the current status of an automation session.
@@ -110,18 +184,169 @@ class AutomationStatusView(APIView):
 
     def get(self, request, session_id, *args, **kwargs):
         try:
-            is_paused = get_pause_flag(session_id)
+            state = get_session_states([session_id])[session_id]
+            return Response(serialize_session_state(session_id, state))
             
+        except Exception as e:
+            logger.error(f"Failed to get status for {session_id}: {str(e)}")
+            return Response(
+                {"error": f"Failed to get status: {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SessionTicketView(APIView):
+    """
+    Issue a short-lived ticket for watching one automation session.
+    
+    POST /api/system/automations/status/{session_id}/ticket/
+    EventSource and WebSocket clients can't send an Authorization header;
+    they pass the ticket as ?ticket= instead. Tickets expire after
+    AUTOMATION_SESSION_TICKET_TTL seconds, so a client whose stream fails to
+    reconnect fetches a new one.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id, *args, **kwargs):
+        if session_owned_by_other(session_id, request.user):
+            return session_forbidden_response()
+        return Response({
+            "ticket": issue_session_ticket(request.user, session_id),
+            "expiresIn": TICKET_TTL
+        })
+
+
+class MultiplexTicketView(APIView):
+    """
+    Issue a short-lived ticket for the multiplexed status socket.
+    
+    POST /api/system/automations/ticket/
+    Pass it as ws/automations/?ticket=...; sessions are checked for ownership
+    as they are subscribed, not when the ticket is issued.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        return Response({
+            "ticket": issue_session_ticket(request.user, MULTIPLEX_TICKET_SESSION),
+            "expiresIn": TICKET_TTL
+        })
+
+
+class AutomationStatusStreamView(APIView):
+    """
+    Stream status updates of an automation session as Server-Sent Events.
+    
+    GET /api/system/automations/status/{session_id}/stream/?ticket=...
+    Authenticates with a ticket from SessionTicketView (or the Authorization
+    header for non-browser clients); only the session's owner may watch it.
+    Resumes after the Last-Event-ID header (or ?lastEventId=) when given.
+    """
+    authentication_classes = [SessionTicketAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [SSERenderer]
+
+    def get(self, request, session_id, *args, **kwargs):
+        # Tickets are only issued to the owner; header-authenticated clients are checked here
+        if session_owned_by_other(session_id, request.user):
+            return session_forbidden_response()
+
+        last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('lastEventId')
+        try:
+            last_seq = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_seq = None
+        
+        response = StreamingHttpResponse(
+            stream_session_status(session_id, last_seq, serialize_state=serialize_session_state),
+            content_type=SSERenderer.media_type
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class BulkAutomationStatusView(APIView):
+    """
+    Get the current status of many automation sessions in one request.
+    
+    POST /api/system/automations/status/
+    Body: {"sessionIds": ["session_a", "session_b", ...]}
+    """
+    permission_classes = [IsAuthenticated]
+    max_sessions = 500
+
+    def post(self, request, *args, **kwargs):
+        session_ids = request.data.get('sessionIds')
+        
+        if not isinstance(session_ids, list) or not all(isinstance(s, str) for s in session_ids):
+            return Response(
+                {"error": "sessionIds must be a list of strings"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(session_ids) > self.max_sessions:
+            return Response(
+                {"error": f"At most {self.max_sessions} sessionIds per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            session_ids = list(dict.fromkeys(session_ids))
+            states = get_session_states(session_ids)
             return Response({
-                "sessionId": session_id,
-                "isPaused": is_paused,
-                "status": "paused" if is_paused else "running"
+                "sessions": [serialize_session_state(session_id, states[session_id]) for session_id in session_ids]
             })
             
         except Exception as e:
-            logger.error(f"Failed to get status for {session_id}: {str(e)}")
+            logger.error(f"Failed to get bulk status: {str(e)}")
             return Response(
-                {"error": f"Failed to get status: {str(e)}"}, 
+                {"error": f"Failed to get status: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AutomationSchedulerStatsView(APIView):
+    """
+    Report automation scheduler queue depth, wait times and throughput.
+    
+    GET /api/system/automations/scheduler/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_automation_stats())
+
+
+class SelectorCacheStatsView(APIView):
+    """
+    Report learned selector hit rates and time saved per site, plan and step.
+    
+    GET /api/system/automations/selectors/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(selector_cache.stats())
+
+
+class StepLatencyView(APIView):
+    """
+    Report step duration percentiles across runs, slowest steps first.
+    
+    GET /api/system/automations/steps/?plan=<plan_name>&step=<index|connect>
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            steps = step_latency_summary(request.query_params.get('plan'), request.query_params.get('step'))
+            return Response({"steps": steps})
+            
+        except Exception as e:
+            logger.error(f"Failed to get step latencies: {str(e)}")
+            return Response(
+                {"error": f"Failed to get step latencies: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 